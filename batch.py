@@ -0,0 +1,177 @@
+from teenytiny import compileFile
+from cache import *
+from diagnostics import CompileError
+import argparse
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+import time
+
+#Compiles many Teeny Tiny files at once, spread over all the CPU cores with a pool of worker processes
+#Each file gets its own output (next to the source, or in --out-dir), so separate builds never fight over out.c
+#With --cache, both the C code & the executables are kept in a CompileCache, so unchanged sources skip the compile & the C compiler
+#   python3 batch.py [-j N] [-O level] [--out-dir DIR] [--cc gcc | --c-only] [--cache DIR] [--json] files or directories...
+
+sourceExtensions = (".tiny", ".teeny")
+
+#What happened to one file
+class CompileResult:
+    def __init__(self, source, output, binary):
+        self.source = source
+        self.output = output #the C file
+        self.binary = binary #the executable, or None if the C compiler isn't run
+        self.status = "ok" #"ok", "error" (the Teeny Tiny compiler failed) or "cc-error" (the C compiler failed)
+        self.errors = [] #error messages
+        self.compileTime = 0.0 #seconds spent compiling to C
+        self.ccTime = 0.0 #seconds spent in the C compiler
+        self.cacheHits = 0 #lookups in the compile cache that found an entry
+        self.cacheMisses = 0
+    
+    def asDict (self):
+        return {
+            "source": self.source, "output": self.output, "binary": self.binary, "status": self.status,
+            "errors": self.errors, "compileTime": self.compileTime, "ccTime": self.ccTime,
+            "cacheHits": self.cacheHits, "cacheMisses": self.cacheMisses,
+        }
+
+#Compiles one file to C and then (if cc is set) to an executable. This runs in a worker process
+def compileOne (source, output, binary, optimize, cc, cacheDir = None, cacheBytes = None):
+    result = CompileResult (source, output, binary)
+    cache = None
+    if cacheDir is not None:
+        cache = CompileCache (cacheDir, cacheBytes)
+    
+    start = time.perf_counter()
+    try:
+        compileFile (source, output, optimize, cache = cache)
+    except CompileError as error:
+        result.status = "error"
+        result.errors.extend (error.report (source))
+    except (OSError, ValueError) as error: #eg. a source that can't be read, or isn't UTF-8 text (a UnicodeDecodeError is a ValueError)
+        result.status = "error"
+        result.errors.append (str (error))
+    except Exception as error: #anything else only fails this file, so the rest of the batch still gets its results
+        result.status = "error"
+        result.errors.append ("internal compiler error: " + type (error).__name__ + ": " + str (error))
+    result.compileTime = time.perf_counter() - start
+    
+    if result.status == "ok" and cc:
+        start = time.perf_counter()
+        binaryKey = None
+        if cache is not None:
+            binaryKey = cache.key (source, (optimize, False, ccFingerprint (cc)))
+        if binaryKey is None or not cache.fetch (binaryKey, ".bin", binary):
+            try:
+                ccRun = subprocess.run ([cc, "-o", binary, output], capture_output = True, text = True)
+            except OSError as error: #eg. the C compiler isn't installed
+                result.status = "cc-error"
+                result.errors.append (str (error))
+            else:
+                if ccRun.returncode != 0:
+                    result.status = "cc-error"
+                    result.errors.append (ccRun.stderr.strip())
+                elif binaryKey is not None:
+                    cache.put (binaryKey, ".bin", binary)
+        result.ccTime = time.perf_counter() - start
+    
+    if cache is not None:
+        result.cacheHits = cache.hits
+        result.cacheMisses = cache.misses
+    return result
+
+#The C compiler's name & version, so that a different C compiler doesn't reuse cached executables
+ccFingerprints = {}
+
+def ccFingerprint (cc):
+    if cc not in ccFingerprints:
+        try:
+            version = subprocess.run ([cc, "--version"], capture_output = True, text = True).stdout
+        except OSError:
+            version = ""
+        ccFingerprints [cc] = cc + "\0" + version
+    return ccFingerprints [cc]
+
+#Every source file named on the command line, with directories replaced by the source files in them
+def findSources (paths):
+    sources = []
+    for path in paths:
+        if os.path.isdir (path):
+            for name in sorted (os.listdir (path)):
+                if name.endswith (sourceExtensions):
+                    sources.append (os.path.join (path, name))
+        else:
+            sources.append (path)
+    return sources
+
+#Compiles all the sources in parallel & returns their CompileResults, in the same order as the sources
+#Raises ValueError if two of the sources would be compiled to the same output, or an output would overwrite one of the sources
+#(eg. the executable for a source with no extension is the source's own path, and the C code for foo.c is foo.c)
+def compileMany (sources, outDir = None, optimize = 0, cc = "gcc", jobs = None, cacheDir = None, cacheBytes = 256 * 1024 * 1024):
+    jobList = []
+    inputs = {os.path.realpath (source) for source in sources}
+    outputs = set()
+    for source in sources:
+        base = os.path.splitext (source)[0]
+        if outDir is not None:
+            base = os.path.join (outDir, os.path.basename (base))
+        for path in [base + ".c", base] if cc else [base + ".c"]:
+            fullPath = os.path.realpath (path)
+            if fullPath in inputs:
+                raise ValueError ("compiling " + source + " would overwrite the source " + path)
+            if fullPath in outputs:
+                raise ValueError ("more than one source would be compiled to " + path)
+            outputs.add (fullPath)
+        jobList.append ((source, base + ".c", base if cc else None))
+    
+    if outDir is not None:
+        os.makedirs (outDir, exist_ok = True)
+    
+    #Note to self: a ProcessPoolExecutor runs the function in separate processes, so the compiles really do run at the same time on different cores
+    with concurrent.futures.ProcessPoolExecutor (max_workers = jobs) as pool:
+        futures = [pool.submit (compileOne, source, output, binary, optimize, cc, cacheDir, cacheBytes) for source, output, binary in jobList]
+        return [future.result() for future in futures]
+
+def main ():
+    argParser = argparse.ArgumentParser (description = "Compile many Teeny Tiny programs in parallel")
+    argParser.add_argument ("paths", nargs = "+", help = "source files, or directories of .tiny/.teeny files")
+    argParser.add_argument ("-j", "--jobs", type = int, default = None, help = "number of worker processes (default: one per core)")
+    argParser.add_argument ("-O", dest = "optimize", type = int, default = 0, choices = range (4), help = "optimization level, as for teenytiny.py")
+    argParser.add_argument ("--out-dir", help = "write the outputs here instead of next to each source")
+    argParser.add_argument ("--cc", default = "gcc", help = "the C compiler to build executables with (default: gcc)")
+    argParser.add_argument ("--c-only", action = "store_true", help = "only generate the C code, don't run the C compiler")
+    argParser.add_argument ("--cache", metavar = "DIR", help = "reuse C code & executables from earlier compiles, kept in this directory")
+    argParser.add_argument ("--cache-size", type = int, default = 256, metavar = "MB", help = "how big the cache can grow before old entries are deleted (default: 256)")
+    argParser.add_argument ("--json", action = "store_true", help = "print the results as JSON")
+    args = argParser.parse_args()
+    
+    sources = findSources (args.paths)
+    start = time.perf_counter()
+    try:
+        results = compileMany (sources, args.out_dir, args.optimize, None if args.c_only else args.cc, args.jobs, args.cache, args.cache_size * 1024 * 1024)
+    except ValueError as error:
+        sys.exit ("Error: " + str (error))
+    elapsed = time.perf_counter() - start
+    
+    #the hits & misses of all the workers added together
+    cacheHits = sum (result.cacheHits for result in results)
+    cacheMisses = sum (result.cacheMisses for result in results)
+    
+    if args.json:
+        print (json.dumps ({"results": [result.asDict() for result in results], "seconds": elapsed, "cacheHits": cacheHits, "cacheMisses": cacheMisses}, indent = 2))
+    else:
+        for result in results:
+            print ("%-8s %s (%.3fs + %.3fs cc)" % (result.status, result.source, result.compileTime, result.ccTime))
+            for error in result.errors:
+                print ("    " + error.replace ("\n", "\n    "))
+        failed = sum (1 for result in results if result.status != "ok")
+        print ("%d compiled, %d failed in %.3fs" % (len (results) - failed, failed, elapsed))
+        if args.cache:
+            print ("cache: %d hits, %d misses" % (cacheHits, cacheMisses))
+    
+    if any (result.status != "ok" for result in results):
+        sys.exit (1)
+
+if __name__ == "__main__":
+    main()
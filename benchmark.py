@@ -0,0 +1,847 @@
+from lex import *
+from emit import *
+from parse import *
+from cgen import *
+from cache import *
+from teenytiny import compileFile, runFile
+from incremental import IncrementalCompiler
+from vm import BytecodeCompiler
+from generate import programLines, nestedLines, shapes, makeShape
+import client
+import pyjit
+import argparse
+import concurrent.futures
+import io
+import json
+import lex
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+#Benchmarks for the compiler. Run it with no arguments to use a generated program, or pass the path to a .tiny file
+#   python3 benchmark.py [file.tiny] [--lines N] [--memory | --ast | --cache | --vm | --incremental | --server]
+#   python3 benchmark.py --suite [--lines N] [--save results.json] [--compare old.json]
+#   python3 benchmark.py --depth [N ...]
+#   python3 benchmark.py [file.tiny] --integers
+#   python3 benchmark.py [file.tiny] --fast-io
+#   python3 benchmark.py [file.tiny] --llvm
+#   python3 benchmark.py [file.tiny] --loops
+#   python3 benchmark.py [file.tiny] --jit
+
+#the mixed program from generate.py, which has a bit of everything the lexer has to deal with
+def makeProgram (lines):
+    return "\n".join (programLines (lines)) + "\n"
+
+#an identifier-heavy program, where most tokens go through the keyword lookup
+def makeIdentifierProgram (lines):
+    out = ["LET x0 = 1"]
+    for i in range (1, lines):
+        out.append ("LET x{0} = x{1} + x{1} * x{1} - x{1} / x{1}".format (i, i - 1))
+    return "\n".join (out) + "\n"
+
+#lexes the whole source & returns the list of (kind, text) pairs up to and including the EOF
+def tokenStream (lexerClass, source):
+    lexer = lexerClass (source)
+    tokens = []
+    while True:
+        token = lexer.getToken()
+        tokens.append ((token.kind, token.text, token.line, token.col))
+        if token.kind == TokenType.EOF:
+            return tokens
+
+#returns the best time (in seconds) out of a few runs, to smooth out noise
+def bestOf (function, repeat = 3):
+    best = None
+    for _ in range (repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+#checks that FastLexer produces the same token stream as Lexer, then reports the tokens/sec of both
+def benchLexer (source):
+    expected = tokenStream (Lexer, source)
+    if tokenStream (FastLexer, source) != expected:
+        sys.exit ("FastLexer token stream differs from Lexer")
+    if tokenStream (lambda text: StreamLexer (io.StringIO (text)), source) != expected:
+        sys.exit ("StreamLexer token stream differs from Lexer")
+    print ("Token streams match (" + str (len (expected)) + " tokens)")
+    
+    for lexerClass in (Lexer, FastLexer):
+        seconds = bestOf (lambda: tokenStream (lexerClass, source))
+        print ("%-10s %10.0f tokens/sec" % (lexerClass.__name__, len (expected) / seconds))
+
+#Token & keyword lookup as they were before __slots__ & the keywordKinds index, kept here so that the savings can be measured
+class DictToken:
+    def __init__(self, tokenText, tokenKind, line = 0, col = 0):
+        self.text = tokenText
+        self.kind = tokenKind
+        self.line = line
+        self.col = col
+
+class EnumScan:
+    @staticmethod
+    def get (tokenText):
+        for kind in TokenType:
+            if kind.name == tokenText and kind.value >= 100 and kind.value < 200:
+                return kind
+        return None
+
+#lexes the source into a list of tokens
+def collectTokens (source):
+    lexer = FastLexer (source)
+    tokens = []
+    token = lexer.getToken()
+    while token.kind != TokenType.EOF:
+        tokens.append (token)
+        token = lexer.getToken()
+    return tokens
+
+#returns the time it takes to lex the source, the bytes allocated per token & the token count
+#the allocations are traced in a separate run, since tracemalloc slows everything down
+def lexAll (source):
+    elapsed = bestOf (lambda: collectTokens (source))
+    tracemalloc.start()
+    tokens = collectTokens (source)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, allocated / len (tokens), len (tokens)
+
+#compares the old dict-backed Token + enum scan against the __slots__ Token + keyword index on an identifier-heavy program
+def benchTokens (source):
+    savedToken, savedIndex = lex.Token, lex.keywordKinds
+    lex.Token, lex.keywordKinds = DictToken, EnumScan
+    try:
+        oldTime, oldBytes, count = lexAll (source)
+    finally:
+        lex.Token, lex.keywordKinds = savedToken, savedIndex
+    newTime, newBytes, count = lexAll (source)
+    
+    print ("Identifier-heavy program (" + str (count) + " tokens)")
+    print ("%-22s %10.0f tokens/sec %8.1f bytes/token" % ("dict Token + enum scan", count / oldTime, oldBytes))
+    print ("%-22s %10.0f tokens/sec %8.1f bytes/token" % ("slots Token + index", count / newTime, newBytes))
+
+#compiles the file in a child process & returns its peak resident memory in KB
+def peakMemory (arguments, directory):
+    child = subprocess.Popen ([sys.executable, os.path.abspath ("teenytiny.py")] + arguments, cwd = directory, stdout = subprocess.DEVNULL)
+    _, status, usage = os.wait4 (child.pid, 0) #Note to self: wait4 gives back the resource usage of just this child
+    if status != 0:
+        sys.exit ("Compiling failed: " + " ".join (arguments))
+    return usage.ru_maxrss #in KB on Linux
+
+#compiles programs of growing size with & without --stream, showing how the peak memory grows with the size of the input
+def benchMemory (lines):
+    print ("%10s %12s %12s %14s" % ("lines", "source KB", "peak KB", "--stream KB"))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join (directory, "big.tiny")
+        for scale in (1, 2, 4, 8):
+            #the program is written a line at a time: a child's peak memory includes what it inherited from this process before it started
+            with open (path, 'w') as outputFile:
+                outputFile.writelines (line + "\n" for line in programLines (lines * scale))
+            whole = peakMemory ([path], directory)
+            streamed = peakMemory (["--stream", path], directory)
+            print ("%10d %12d %12d %14d" % (lines * scale, os.path.getsize (path) // 1024, whole, streamed))
+
+#builds the whole syntax tree, then generates C from it
+def compileWhole (source):
+    program = Parser (FastLexer (source)).program()
+    CGenerator (Emitter (io.StringIO())).program (program)
+
+#generates C for each top level statement as soon as it's parsed, so there's never more than one statement's tree at a time
+def compileStatements (source):
+    generator = CGenerator (Emitter (io.StringIO()))
+    generator.begin()
+    for statement in Parser (FastLexer (source)).statements():
+        generator.statement (statement)
+    generator.end()
+
+#returns the peak memory (in bytes) traced while running the function
+def tracedPeak (function):
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+#times parsing & code generation separately, and compares the memory of building the whole tree against one statement at a time
+def benchAst (source):
+    parseTime = bestOf (lambda: Parser (FastLexer (source)).program())
+    program = Parser (FastLexer (source)).program()
+    generateTime = bestOf (lambda: CGenerator (Emitter (io.StringIO())).program (program))
+    print ("parse %.3fs, codegen %.3fs for %d top level statements" % (parseTime, generateTime, len (program.statements)))
+    
+    for name, function in (("whole tree", compileWhole), ("statement at a time", compileStatements)):
+        seconds = bestOf (lambda: function (source))
+        print ("%-20s %8.3fs %10.0f KB peak" % (name, seconds, tracedPeak (lambda: function (source)) / 1024))
+
+#times a compile with an empty cache (a miss) against compiling the same source again (a hit)
+def benchCache (source):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join (directory, "program.tiny")
+        with open (path, 'w') as outputFile:
+            outputFile.write (source)
+        output = os.path.join (directory, "program.c")
+        cacheDir = os.path.join (directory, "cache")
+        
+        uncached = bestOf (lambda: compileFile (path, output))
+        cache = CompileCache (cacheDir)
+        start = time.perf_counter()
+        compileFile (path, output, cache = cache)
+        miss = time.perf_counter() - start
+        hit = bestOf (lambda: compileFile (path, output, cache = cache))
+    print ("no cache %.4fs, miss %.4fs, hit %.4fs (%.0fx faster)" % (uncached, miss, hit, uncached / hit))
+    print (cache.report())
+
+#a small program that loops the given number of times, for timing how fast programs run rather than how fast they compile
+def makeLoopProgram (iterations):
+    return "\n".join ([
+        "PRINT \"counting\"",
+        "INPUT step",
+        "LET i = 0",
+        "LET total = 0",
+        "WHILE i < " + str (iterations) + " REPEAT",
+        "    LET total = total + i * step - 1",
+        "    IF total > 1000000 THEN",
+        "        LET total = total / 2",
+        "    ENDIF",
+        "    LET i = i + 1",
+        "ENDWHILE",
+        "PRINT total",
+    ]) + "\n"
+
+#a loop where the work is done with whole numbers, so --integers makes n & x long long (hits is a sum, which it can't put a limit on)
+#Note to self: the inner loop keeps x small by subtracting (there's no remainder operator), which also stops gcc from working out the
+#whole loop at compile time. The IF around x * 7 is always true, but it's what shows infer.py that x can't overflow
+def makeCountingProgram (iterations):
+    return "\n".join ([
+        "LET n = 0",
+        "LET x = 1",
+        "LET hits = 0",
+        "WHILE n < " + str (iterations) + " REPEAT",
+        "    IF x <= 1000 THEN",
+        "        LET x = x * 7 + n",
+        "    ENDIF",
+        "    WHILE x > 1000 REPEAT",
+        "        LET x = x - 997",
+        "    ENDWHILE",
+        "    IF x < 500 THEN",
+        "        LET hits = hits + 1",
+        "    ENDIF",
+        "    LET n = n + 1",
+        "ENDWHILE",
+        "PRINT hits",
+        "PRINT x",
+    ]) + "\n"
+
+#a loop that prints a lot: a few strings in a row (which --fast-io joins into one fwrite) & numbers of every size
+def makePrintingProgram (iterations):
+    return "\n".join ([
+        "LET n = 0",
+        "LET x = 0.5",
+        "WHILE n < " + str (iterations) + " REPEAT",
+        "    PRINT \"line\"",
+        "    PRINT \"of output\"",
+        "    PRINT n",
+        "    PRINT x",
+        "    PRINT 0 - x / 3",
+        "    LET x = x * 1.37",
+        "    IF x > 100000000 THEN",
+        "        LET x = x / 100000000",
+        "    ENDIF",
+        "    LET n = n + 1",
+        "ENDWHILE",
+    ]) + "\n"
+
+#a loop that reads a number & prints it, until it's read the given number of them
+def makeEchoProgram (iterations):
+    return "\n".join ([
+        "LET n = 0",
+        "LET total = 0",
+        "WHILE n < " + str (iterations) + " REPEAT",
+        "    INPUT x",
+        "    PRINT x",
+        "    LET total = total + x",
+        "    LET n = n + 1",
+        "ENDWHILE",
+        "PRINT total",
+    ]) + "\n"
+
+#a numeric loop like the ones -O3 is for: the outer loop's condition has an invariant part (size * step / 3), two of its LETs are the
+#same every time round & the inner loop always goes round 4 times
+def makeNumericProgram (iterations):
+    return "\n".join ([
+        "INPUT step",
+        "LET size = " + str (iterations),
+        "LET i = 0",
+        "LET total = 0",
+        "WHILE i < size * step / 3 REPEAT",
+        "    LET scale = step * 0.5 + 1",
+        "    LET offset = scale * scale - step",
+        "    LET j = 0",
+        "    WHILE j < 4 REPEAT",
+        "        LET total = total + scale * j - offset",
+        "        LET j = j + 1",
+        "    ENDWHILE",
+        "    IF total > 1000000 THEN",
+        "        LET total = total / 2",
+        "    ENDIF",
+        "    LET i = i + 1",
+        "ENDWHILE",
+        "PRINT total",
+        "PRINT scale",
+    ]) + "\n"
+
+#runs the program in the VM (the way "teenytiny.py --run" does) & returns the time it took & what it printed
+def runInVM (path, inputText, optimize = 0):
+    output = io.StringIO()
+    start = time.perf_counter()
+    runFile (path, optimize, io.StringIO (inputText), output)
+    return time.perf_counter() - start, output.getvalue()
+
+#goes through the whole edit-compile-run cycle with gcc: Teeny Tiny to C, C to an executable, then running it
+#returns the time taken by each step & what the program printed
+def runWithGcc (path, inputText, directory):
+    cFile = os.path.join (directory, "program.c")
+    binary = os.path.join (directory, "program")
+    start = time.perf_counter()
+    compileFile (path, cFile)
+    compiled = time.perf_counter()
+    subprocess.run (["gcc", "-w", "-o", binary, cFile], check = True)
+    built = time.perf_counter()
+    run = subprocess.run ([binary], input = inputText, capture_output = True, text = True)
+    finished = time.perf_counter()
+    return compiled - start, built - compiled, finished - built, run.stdout
+
+#compares running programs in the bytecode VM against compiling them with gcc & then running them
+#short programs are done in the VM before gcc has even started up, while gcc wins once a program runs for long enough
+def benchVM (source):
+    programs = [("input program" if source else "generated program", source or makeProgram (200))]
+    for iterations in (100, 10000, 1000000):
+        programs.append (("loop x" + str (iterations), makeLoopProgram (iterations)))
+    inputText = "3\n" * 100
+    
+    print ("%-20s %10s %10s %10s %10s %10s" % ("program", "VM", "tiny->C", "gcc", "run", "gcc total"))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join (directory, "program.tiny")
+        for name, text in programs:
+            with open (path, 'w') as outputFile:
+                outputFile.write (text)
+            vmTime, vmOutput = runInVM (path, inputText)
+            toC, cc, run, gccOutput = runWithGcc (path, inputText, directory)
+            if vmOutput != gccOutput:
+                sys.exit ("The VM and gcc printed different output for " + name)
+            print ("%-20s %9.3fs %9.3fs %9.3fs %9.3fs %9.3fs" % (name, vmTime, toC, cc, run, toC + cc + run))
+
+#compiles the program with gcc -O2 (or another gcc level), with or without --integers & --fast-io (& at the given -O level),
+#& returns the best time it took to run & what it printed
+def runOptimized (path, inputText, directory, integers = False, fastIO = False, optimize = 0, gccLevel = "-O2"):
+    cFile = os.path.join (directory, "program.c")
+    binary = os.path.join (directory, "program")
+    compileFile (path, cFile, optimize, integers = integers, fastIO = fastIO)
+    subprocess.run (["gcc", "-w", gccLevel, "-o", binary, cFile], check = True)
+    printed = []
+    def run ():
+        printed.append (subprocess.run ([binary], input = inputText, capture_output = True, text = True).stdout)
+    return bestOf (run), printed [0]
+
+#compares how fast the C code runs with every variable a float against --integers, on loop-heavy programs
+#The output can differ where a float couldn't hold the exact value (anything over 2^24), which is what --integers fixes
+def benchIntegers (source):
+    programs = []
+    if source:
+        programs.append (("input program", source))
+    for iterations in (10000, 100000, 1000000):
+        programs.append (("counting x" + str (iterations), makeCountingProgram (iterations)))
+        programs.append (("loop x" + str (iterations), makeLoopProgram (iterations)))
+    inputText = "3\n" * 100
+    
+    print ("%-20s %10s %10s %8s  %s" % ("program", "float", "integers", "speedup", "output"))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join (directory, "program.tiny")
+        for name, text in programs:
+            with open (path, 'w') as outputFile:
+                outputFile.write (text)
+            floatTime, floatOutput = runOptimized (path, inputText, directory, False)
+            integerTime, integerOutput = runOptimized (path, inputText, directory, True)
+            same = "same" if floatOutput == integerOutput else "float printed " + floatOutput.split()[-1] + ", integers " + integerOutput.split()[-1]
+            print ("%-20s %9.3fs %9.3fs %7.1fx  %s" % (name, floatTime, integerTime, floatTime / integerTime, same))
+
+#compares how fast the C code prints & reads numbers with printf & scanf against the --fast-io runtime
+#The output has to be exactly the same, so the benchmark stops if it isn't
+def benchFastIO (source):
+    programs = []
+    if source:
+        programs.append (("input program", source, "3\n" * 100))
+    for iterations in (10000, 100000, 1000000):
+        numbers = "".join ("%d.%d\n" % (i * 7919 % 100003, i % 10) for i in range (iterations))
+        programs.append (("printing x" + str (iterations), makePrintingProgram (iterations), ""))
+        programs.append (("echo x" + str (iterations), makeEchoProgram (iterations), numbers))
+    
+    print ("%-20s %10s %10s %8s %10s" % ("program", "stdio", "fast-io", "speedup", "output"))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join (directory, "program.tiny")
+        for name, text, inputText in programs:
+            with open (path, 'w') as outputFile:
+                outputFile.write (text)
+            stdioTime, stdioOutput = runOptimized (path, inputText, directory)
+            fastTime, fastOutput = runOptimized (path, inputText, directory, fastIO = True)
+            if stdioOutput != fastOutput:
+                sys.exit ("--fast-io printed different output for " + name)
+            print ("%-20s %9.3fs %9.3fs %7.1fx %9dB" % (name, stdioTime, fastTime, stdioTime / fastTime, len (stdioOutput)))
+
+#compares how fast programs run at -O2 against -O3 (which adds the loop optimizations, see loops.py), built with gcc -O0 (like
+#build.sh does), with gcc -O2 & in the VM. What -O3 did to each program's loops is printed under it
+#The output has to be exactly the same, so the benchmark stops if it isn't
+def benchLoops (source):
+    programs = []
+    if source:
+        programs.append (("input program", source))
+    for iterations in (10000, 100000, 1000000):
+        programs.append (("numeric x" + str (iterations), makeNumericProgram (iterations)))
+        programs.append (("loop x" + str (iterations), makeLoopProgram (iterations)))
+    inputText = "3\n" * 100
+    
+    runners = [
+        ("gcc -O0", lambda path, optimize: runOptimized (path, inputText, directory, optimize = optimize, gccLevel = "-O0")),
+        ("gcc -O2", lambda path, optimize: runOptimized (path, inputText, directory, optimize = optimize)),
+        ("VM", lambda path, optimize: runInVM (path, inputText, optimize)),
+    ]
+    
+    print ("%-20s %-8s %10s %10s %8s" % ("program", "run with", "-O2", "-O3", "speedup"))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join (directory, "program.tiny")
+        for name, text in programs:
+            with open (path, 'w') as outputFile:
+                outputFile.write (text)
+            for runner, run in runners:
+                before, beforeOutput = run (path, 2)
+                after, afterOutput = run (path, 3)
+                if beforeOutput != afterOutput:
+                    sys.exit ("-O3 printed different output for " + name + " (" + runner + ")")
+                print ("%-20s %-8s %9.3fs %9.3fs %7.1fx" % (name, runner, before, after, before / after))
+                name = ""
+            for line in compileFile (path, io.StringIO(), 3):
+                if line.startswith ("loop optimization") or line.startswith ("    "):
+                    print (line)
+
+#compares running programs with the Python JIT (see pyjit.py) against the VM & against compiling them to C & running them
+#"JIT first" is a run that has to compile the program first, "JIT cached" one that finds it in the cache
+#The output has to be exactly the same, so the benchmark stops if it isn't
+def benchJit (source):
+    programs = []
+    if source:
+        programs.append (("input program", source))
+    programs.append (("gotos", makeShape ("gotos", 2000)))
+    for iterations in (1000, 10000, 100000):
+        programs.append (("numeric x" + str (iterations), makeNumericProgram (iterations)))
+        programs.append (("counting x" + str (iterations), makeCountingProgram (iterations)))
+    inputText = "3\n" * 100
+    
+    print ("%-20s %10s %10s %10s %10s %10s %13s" % ("program", "VM", "JIT first", "JIT cached", "C run", "C total", "cached vs VM"))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join (directory, "program.tiny")
+        for name, text in programs:
+            with open (path, 'w') as outputFile:
+                outputFile.write (text)
+            vmTime, vmOutput = runInVM (path, inputText)
+            toC, cc, run, gccOutput = runWithGcc (path, inputText, directory)
+            pyjit.cache.clear()
+            start = time.perf_counter()
+            jitOutput = "".join (line + "\n" for line in pyjit.run (text, inputText))
+            first = time.perf_counter() - start
+            cached = bestOf (lambda: pyjit.run (text, inputText))
+            if jitOutput != vmOutput or jitOutput != gccOutput:
+                sys.exit ("The JIT printed different output for " + name)
+            print ("%-20s %9.3fs %9.3fs %9.3fs %9.3fs %9.3fs %12.1fx" % (name, vmTime, first, cached, run, toC + cc + run, vmTime / cached))
+
+#the llc command. LLVM 14 only reads the opaque pointers ("ptr") in the IR with -opaque-pointers, which later versions don't need
+def llcCommand ():
+    version = subprocess.run (["llc", "--version"], capture_output = True, text = True).stdout
+    found = re.search (r"LLVM version (\d+)", version)
+    if found and int (found.group (1)) < 15:
+        return ["llc", "-opaque-pointers"]
+    return ["llc"]
+
+#runs a command & returns how long it took
+def timed (command):
+    start = time.perf_counter()
+    subprocess.run (command, check = True)
+    return time.perf_counter() - start
+
+#compares the two backends on big programs: Teeny Tiny to C & gcc, against Teeny Tiny to LLVM IR (--target llvm) & llc,
+#each at -O0 & -O2. The programs built from the C code & from the IR have to print exactly the same thing
+def benchLLVM (source):
+    programs = []
+    if source:
+        programs.append (("input program", source))
+    for lines in (5000, 20000, 50000):
+        programs.append (("mixed x" + str (lines), makeShape ("mixed", lines)))
+    llc = llcCommand()
+    
+    print ("%-16s %8s %9s %9s %9s %9s %9s %9s" % ("program", "lines", "tiny->C", "gcc -O0", "gcc -O2", "tiny->IR", "llc -O0", "llc -O2"))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join (directory, "program.tiny")
+        cFile = os.path.join (directory, "program.c")
+        irFile = os.path.join (directory, "program.ll")
+        for name, text in programs:
+            with open (path, 'w') as outputFile:
+                outputFile.write (text)
+            toC = bestOf (lambda: compileFile (path, cFile))
+            toIR = bestOf (lambda: compileFile (path, irFile, target = "llvm"))
+            times = []
+            printed = []
+            for level in ("-O0", "-O2"):
+                cObject = os.path.join (directory, "c" + level + ".o")
+                irObject = os.path.join (directory, "ir" + level + ".o")
+                times.append (timed (["gcc", "-w", level, "-c", "-o", cObject, cFile]))
+                times.append (timed (llc + [level, "-filetype=obj", "-relocation-model=pic", "-o", irObject, irFile]))
+                for objectFile in (cObject, irObject):
+                    binary = objectFile [:-2]
+                    subprocess.run (["gcc", "-o", binary, objectFile], check = True)
+                    printed.append (subprocess.run ([binary], input = "3\n" * 100, capture_output = True, text = True).stdout)
+            if printed [0] != printed [1]:
+                sys.exit ("The C code & the LLVM IR printed different output for " + name)
+            print ("%-16s %8d %8.3fs %8.3fs %8.3fs %8.3fs %8.3fs %8.3fs" % (name, text.count ("\n"), toC, times [0], times [2], toIR, times [1], times [3]))
+
+#C code for the whole program from a full compile, to check the incremental compiler's output against
+def fullCompile (source):
+    output = io.StringIO()
+    emitter = Emitter (output)
+    CGenerator (emitter).program (Parser (FastLexer (source)).program())
+    emitter.writeFile()
+    return output.getvalue()
+
+#times recompiling after small edits with the incremental compiler (see incremental.py), against compiling the whole program again,
+#then checks it against a full compile after lots of random edits (see checkIncremental)
+def benchIncremental (source):
+    start = time.perf_counter()
+    compiler = IncrementalCompiler()
+    compiler.update (source)
+    print ("initial build %.4fs, full compile %.4fs (%d statements)" % (time.perf_counter() - start, bestOf (lambda: fullCompile (source), 1), len (compiler.chunks)))
+    
+    #each edit is (description, text to find near the middle of the program, what to replace it with)
+    middle = len (source) // 2
+    edits = [
+        ("change a constant", "* 2 - 1", "* 3 - 1"),
+        ("insert a line", "\nLET total", "\nPRINT total\nLET total"),
+        ("delete a line", "    PRINT \"still going\"\n", ""),
+        ("add a WHILE", "\nLET total", "\nWHILE total < 0 REPEAT\nPRINT 1\nENDWHILE\nLET total"),
+    ]
+    for description, find, replacement in edits:
+        position = source.index (find, middle)
+        edited = source [:position] + replacement + source [position + len (find):]
+        
+        start = time.perf_counter()
+        compiler.update (edited)
+        updated = time.perf_counter() - start
+        output = io.StringIO()
+        start = time.perf_counter()
+        compiler.writeFile (output)
+        written = time.perf_counter() - start
+        if output.getvalue() != fullCompile (edited):
+            sys.exit ("incremental output differs from a full compile after: " + description)
+        print ("%-18s update %.2fms (%d statements re-parsed), write %.2fms" % (description, updated * 1000, compiler.reparsed, written * 1000))
+        source = edited
+    checkIncremental()
+
+#bits of programs for checkIncremental to type in, including ones that break the program or change its block structure
+editPieces = ["PRINT a\n", "LET a = 1\n", "LET b = a * 2\n", "INPUT b\n", "LABEL L2\n", "GOTO L2\n", "IF a > 1 THEN\n", "ENDIF\n",
+    "WHILE b < 3 REPEAT\n", "ENDWHILE\n", "PRINT \"hi\"\n", "x", "a", "1", " + ", "\n", "\n\n", "# a comment\n", ""]
+
+#makes random edits to a small program one after another & checks the incremental compiler against a full compile after each one:
+#both have to reject the same edits with the same errors, and give exactly the same C code for the others. Stops at the first difference
+#Note to self: most edits break the program, so after one that does it usually goes back to the last version that compiled (the
+#way someone fixes a typo), or the program would soon be broken for good & every edit after that would be rejected by both
+def checkIncremental (steps = 2000, seed = 0):
+    generator = random.Random (seed)
+    source = "LET a = 1\nLABEL L1\nWHILE a < 5 REPEAT\nLET a = a + 1\nIF a > 2 THEN\nPRINT a\nENDIF\nENDWHILE\nGOTO L1\n"
+    good = source
+    accepted = 0
+    compiler = IncrementalCompiler()
+    compiler.update (source)
+    for step in range (steps):
+        start = generator.randrange (len (source) + 1)
+        end = min (start + generator.choice ([0, 0, 1, 2, 5, 10]), len (source))
+        edited = source [:start] + generator.choice (editPieces) + source [end:]
+        try:
+            expected = fullCompile (edited)
+            failed = False
+        except CompileError as error:
+            expected = str (error)
+            failed = True
+        try:
+            compiler.update (edited)
+            output = io.StringIO()
+            compiler.writeFile (output)
+            got = output.getvalue()
+        except CompileError as error:
+            got = str (error)
+        if got != expected:
+            sys.exit ("incremental output differs from a full compile after random edit %d (seed %d), from:\n%s\nto:\n%s" % (step, seed, source, edited))
+        if not failed:
+            good = edited
+            accepted += 1
+        source = edited if not failed or generator.random() < 0.2 else good
+    print ("%d random edits (%d of them compiled): the incremental compiler matched a full compile after every one" % (steps, accepted))
+
+#the median time a function takes over a number of runs
+def medianOf (function, repeat):
+    times = []
+    for _ in range (repeat):
+        start = time.perf_counter()
+        function()
+        times.append (time.perf_counter() - start)
+    return statistics.median (times)
+
+#compares the latency of one compile through the compile server (see server.py) against starting python3 teenytiny.py from cold
+#the server is also sent the same requests from many clients at once, to see how many it can get through in a second
+def benchServer (source, repeat = 20, clients = 16):
+    here = os.path.dirname (os.path.abspath (__file__))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join (directory, "program.tiny")
+        with open (path, 'w') as outputFile:
+            outputFile.write (source)
+        output = os.path.join (directory, "program.c")
+        socketPath = os.path.join (directory, "server.sock")
+        
+        server = subprocess.Popen ([sys.executable, os.path.join (here, "server.py"), "--socket", socketPath], stdout = subprocess.PIPE, text = True)
+        try:
+            server.stdout.readline() #the server says it's listening once it's ready
+            message = {"path": path, "output": output, "optimize": 0}
+            
+            #Note to self: the cold compile writes to stdout, so that rewriting the same output file over & over (which the server avoids) isn't part of its time
+            cold = medianOf (lambda: subprocess.run ([sys.executable, os.path.join (here, "teenytiny.py"), path, "-o", "-"], check = True, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL), repeat)
+            thinClient = medianOf (lambda: subprocess.run ([sys.executable, os.path.join (here, "client.py"), path, "-o", output, "--socket", socketPath], check = True, stdout = subprocess.DEVNULL), repeat)
+            direct = medianOf (lambda: client.request (message, socketPath), repeat * 10)
+            
+            requests = repeat * clients
+            start = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor (max_workers = clients) as pool:
+                responses = list (pool.map (lambda _: client.request (message, socketPath), range (requests)))
+            together = time.perf_counter() - start
+            if any (response ["status"] != "ok" for response in responses):
+                sys.exit ("the compile server failed a request: " + str (responses [0]))
+        finally:
+            server.terminate()
+            server.wait()
+    
+    print ("per request (median): cold python3 teenytiny.py %.1fms, client.py %.1fms (%.1fx faster), socket request %.2fms (%.0fx faster)" % (cold * 1000, thinClient * 1000, cold / thinClient, direct * 1000, cold / direct))
+    print ("%d clients at once: %d requests in %.3fs (%.0f requests/s)" % (clients, requests, together, requests / together))
+
+#hands the parser tokens that were lexed beforehand, so that parsing can be timed without the lexing
+class ReplayLexer:
+    def __init__(self, tokens):
+        self.tokens = iter (tokens)
+        self.eof = Token ("", TokenType.EOF)
+    
+    def getToken (self):
+        return next (self.tokens, self.eof)
+
+#how many statements there are, including the ones in the bodies of IFs & WHILEs
+def countStatements (statements):
+    count = 0
+    pending = [statements]
+    while pending:
+        for statement in pending.pop():
+            count += 1
+            if type (statement) is If or type (statement) is While:
+                pending.append (statement.body)
+    return count
+
+#writes the C code to a new file (see copyOut in cache.py for why the old one is removed rather than overwritten)
+def writeFresh (emitter, path):
+    if os.path.exists (path):
+        os.remove (path)
+    emitter.writeFile()
+
+#times each stage of the compiler on its own over one program, and the whole compile of it from a file
+def measureStages (source, directory):
+    path = os.path.join (directory, "program.tiny")
+    with open (path, 'w') as outputFile:
+        outputFile.write (source)
+    output = os.path.join (directory, "program.c")
+    
+    tokens = collectTokens (source)
+    program = Parser (ReplayLexer (tokens)).program()
+    emitter = Emitter (output)
+    CGenerator (emitter).program (program)
+    seconds = {
+        "lex": bestOf (lambda: collectTokens (source)),
+        "parse": bestOf (lambda: Parser (ReplayLexer (tokens)).program()),
+        "codegen": bestOf (lambda: CGenerator (Emitter (None)).program (program)),
+        "write": bestOf (lambda: writeFresh (emitter, output)),
+    }
+    
+    def compileAll ():
+        if os.path.exists (output):
+            os.remove (output)
+        compileFile (path, output)
+    seconds ["total"] = bestOf (compileAll)
+    
+    statements = countStatements (program.statements)
+    outputBytes = os.path.getsize (output)
+    return {
+        "lines": source.count ("\n"), "tokens": len (tokens), "statements": statements, "outputBytes": outputBytes,
+        "seconds": seconds,
+        "tokensPerSec": len (tokens) / seconds ["lex"],
+        "statementsPerSec": statements / seconds ["parse"],
+        "peakKB": tracedPeak (lambda: compileFile (path, io.StringIO())) / 1024,
+    }
+
+#runs every shape from generate.py through measureStages & prints a table of the results, which are also returned (for --save)
+def benchSuite (lines):
+    results = {}
+    print ("%-12s %8s %9s %9s %12s %12s %10s %10s %10s %10s" % ("shape", "lines", "tokens", "stmts", "lex tok/s", "parse stm/s", "codegen", "write", "total", "peak KB"))
+    with tempfile.TemporaryDirectory() as directory:
+        for shape in shapes:
+            result = measureStages (makeShape (shape, lines), directory)
+            results [shape] = result
+            seconds = result ["seconds"]
+            print ("%-12s %8d %9d %9d %12.0f %12.0f %9.3fs %9.3fs %9.3fs %10.0f" % (shape, result ["lines"], result ["tokens"], result ["statements"],
+                result ["tokensPerSec"], result ["statementsPerSec"], seconds ["codegen"], seconds ["write"], seconds ["total"], result ["peakKB"]))
+    return {"lines": lines, "python": platform.python_version(), "date": time.strftime ("%Y-%m-%d %H:%M:%S"), "results": results}
+
+#compares a run against an earlier one (both as saved by --save), stage by stage. Returns how many of them got slower (or bigger) by more than threshold
+def compareSuite (old, new, threshold):
+    regressions = 0
+    print ("compared with the run from " + old ["date"] + ":")
+    for shape, result in new ["results"].items():
+        before = old ["results"].get (shape)
+        if before is None:
+            continue
+        measures = [(stage, before ["seconds"][stage], result ["seconds"][stage], "%9.4fs") for stage in result ["seconds"] if stage in before ["seconds"]]
+        measures.append (("peak", before ["peakKB"], result ["peakKB"], "%7.0fKB"))
+        for name, was, now, form in measures:
+            change = now / was - 1 if was else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  <-- slower" if name != "peak" else "  <-- bigger"
+                regressions += 1
+            print ("%-12s %-8s " % (shape, name) + form % was + " -> " + form % now + " %+7.1f%%%s" % (change * 100, flag))
+    print ("%d regressions over %.0f%%" % (regressions, threshold * 100))
+    return regressions
+
+#WHILEs & IFs nested depth levels deep (see nestedLines in generate.py), without the indentation
+def makeNested (depth):
+    return "\n".join (nestedLines (1, depth, "")) + "\n"
+
+#times each stage on programs nested more & more deeply. The time per level should stay about the same as the depth grows,
+#and none of the stages should run out of stack (see Parser.statement)
+def benchDepth (depths):
+    print ("%8s %8s %10s %10s %10s %10s %10s %12s" % ("depth", "lines", "parse", "codegen", "bytecode", "total", "total -O2", "us/level"))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join (directory, "nested.tiny")
+        for depth in depths:
+            source = makeNested (depth)
+            with open (path, 'w') as outputFile:
+                outputFile.write (source)
+            tokens = collectTokens (source)
+            program = Parser (ReplayLexer (tokens)).program()
+            parse = bestOf (lambda: Parser (ReplayLexer (tokens)).program())
+            codegen = bestOf (lambda: CGenerator (Emitter (None)).program (program))
+            bytecode = bestOf (lambda: BytecodeCompiler().program (program))
+            total = bestOf (lambda: compileFile (path, io.StringIO()))
+            optimized = bestOf (lambda: compileFile (path, io.StringIO(), 2))
+            print ("%8d %8d %9.3fs %9.3fs %9.3fs %9.3fs %9.3fs %12.1f" % (depth, source.count ("\n"), parse, codegen, bytecode, total, optimized, total / depth * 1e6))
+
+def main ():
+    argParser = argparse.ArgumentParser (description = "Benchmark the Teeny Tiny compiler")
+    argParser.add_argument ("source", nargs = "?", help = "a Teeny Tiny source file to benchmark the lexer on (a program is generated otherwise)")
+    argParser.add_argument ("--lines", type = int, default = 20000, help = "size of the generated programs")
+    argParser.add_argument ("--memory", action = "store_true", help = "measure peak memory of whole-file vs --stream compiles as the input grows")
+    argParser.add_argument ("--ast", action = "store_true", help = "time parsing & code generation, and the memory taken by the syntax tree")
+    argParser.add_argument ("--cache", action = "store_true", help = "time a compile that misses the compile cache against one that hits it")
+    argParser.add_argument ("--vm", action = "store_true", help = "compare running programs in the bytecode VM against compiling & running them with gcc")
+    argParser.add_argument ("--incremental", action = "store_true", help = "time recompiling after small edits with the incremental compiler, against a full compile, & check it after random edits")
+    argParser.add_argument ("--suite", action = "store_true", help = "time each stage of the compiler on every shape of program from generate.py")
+    argParser.add_argument ("--save", metavar = "FILE", help = "with --suite, save the results as JSON")
+    argParser.add_argument ("--compare", metavar = "FILE", help = "with --suite, compare the results against ones saved earlier & exit with 1 if anything got slower")
+    argParser.add_argument ("--threshold", type = float, default = 10, metavar = "PERCENT", help = "how much slower a stage can get before --compare calls it a regression (default: 10)")
+    argParser.add_argument ("--server", action = "store_true", help = "compare the latency of compiling through the compile server against starting teenytiny.py from cold")
+    argParser.add_argument ("--integers", action = "store_true", help = "compare how fast the C code runs with all-float variables against --integers, on loop-heavy programs")
+    argParser.add_argument ("--fast-io", action = "store_true", help = "compare how fast the C code prints & reads with printf & scanf against --fast-io, on I/O-heavy programs")
+    argParser.add_argument ("--llvm", action = "store_true", help = "compare compiling to C & building with gcc against compiling to LLVM IR (--target llvm) & building with llc")
+    argParser.add_argument ("--loops", action = "store_true", help = "compare how fast the C code runs at -O2 against -O3 (the loop optimizations), on loop-heavy programs")
+    argParser.add_argument ("--jit", action = "store_true", help = "compare running programs with the Python JIT against the VM & against compiling them to C")
+    argParser.add_argument ("--depth", type = int, nargs = "*", metavar = "N", help = "time each stage on programs nested N levels deep (default: 100 1000 10000 50000)")
+    args = argParser.parse_args()
+    
+    if args.memory:
+        benchMemory (args.lines)
+        return
+    
+    if args.depth is not None:
+        benchDepth (args.depth or [100, 1000, 10000, 50000])
+        return
+    
+    if args.suite:
+        results = benchSuite (args.lines)
+        if args.save:
+            with open (args.save, 'w') as outputFile:
+                json.dump (results, outputFile, indent = 2)
+        if args.compare:
+            with open (args.compare, 'r') as inputFile:
+                old = json.load (inputFile)
+            if compareSuite (old, results, args.threshold / 100):
+                sys.exit (1)
+        return
+    
+    if args.vm or args.integers or args.fast_io or args.llvm or args.loops or args.jit:
+        source = None
+        if args.source:
+            with open (args.source, 'r') as inputFile:
+                source = inputFile.read()
+        if args.vm:
+            benchVM (source)
+        elif args.integers:
+            benchIntegers (source)
+        elif args.fast_io:
+            benchFastIO (source)
+        elif args.loops:
+            benchLoops (source)
+        elif args.jit:
+            benchJit (source)
+        else:
+            benchLLVM (source)
+        return
+    
+    #the server is for the many small compiles of a build, so it's timed on a small program unless it's given one
+    if args.server:
+        source = makeProgram (100)
+        if args.source:
+            with open (args.source, 'r') as inputFile:
+                source = inputFile.read()
+        benchServer (source)
+        return
+    
+    if args.source:
+        with open (args.source, 'r') as inputFile:
+            source = inputFile.read()
+    else:
+        source = makeProgram (args.lines)
+    
+    if args.ast:
+        benchAst (source)
+        return
+    
+    if args.cache:
+        benchCache (source)
+        return
+    
+    if args.incremental:
+        benchIncremental (source)
+        return
+    
+    benchLexer (source)
+    benchTokens (makeIdentifierProgram (args.lines))
+
+main()
@@ -4,11 +4,10 @@ CC="gcc"
 
 function comp {
     BN=$(basename -s .teeny $1)
-    TTOUTPUT=$(${PYTHON} ${COMPILER} $1 2>&1)
+    TTOUTPUT=$(${PYTHON} ${COMPILER} $1 -o ${BN}.c 2>&1)
     if [ $? -ne 0 ]; then
         echo "${TTOUTPUT}"
     else
-        mv out.c ${BN}.c
         CCOUTPUT=$(${CC} -o ${BN} ${BN}.c)
         if [ $? -ne 0 ]; then
             echo "${CCOUTPUT}"
@@ -19,9 +18,8 @@ function comp {
 }
 
 if [ $# -eq 0 ]; then
-    for i in $(ls examples/*.teeny); do
-        comp $i
-    done
+    #compile every example at once, in parallel
+    ${PYTHON} batch.py --cc ${CC} examples
 else
     comp $1
 fi
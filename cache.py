@@ -0,0 +1,122 @@
+import contextlib
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+
+#CompileCache keeps the output of earlier compiles on disk, so that compiling a source that hasn't changed (with the same compiler
+#& the same options) just copies the old output instead of running the Lexer & Parser again
+#
+#Entries are named by a hash of everything that can change the output (content addressing), so a changed source or a new version
+#of the compiler simply looks up a different name. Entries are written to a temporary file & then renamed into place, which is atomic,
+#so builds running at the same time never see half written entries. When the cache grows past maxBytes, the least recently used
+#entries are deleted (a hit touches the entry's modification time)
+
+class CompileCache:
+    def __init__(self, directory, maxBytes = 256 * 1024 * 1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs (directory, exist_ok = True)
+    
+    #The cache key for a source file: a hash of the compiler's own code, the options & the bytes of the source
+    def key (self, sourcePath, options):
+        digest = hashlib.sha256()
+        digest.update (compilerFingerprint().encode())
+        digest.update (repr (options).encode())
+        digest.update (b"\0")
+        with open (sourcePath, 'rb') as sourceFile:
+            for chunk in iter (lambda: sourceFile.read (65536), b""): #read in chunks, so a huge source is never all in memory
+                digest.update (chunk)
+        return digest.hexdigest()
+    
+    def path (self, key, suffix):
+        return os.path.join (self.directory, key + suffix)
+    
+    #Copies the cached entry to output (a path or a file-like object). Returns False (a miss) if there's no entry
+    def fetch (self, key, suffix, output):
+        path = self.path (key, suffix)
+        try:
+            copyOut (path, output)
+            os.utime (path) #mark it as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+    
+    #Adds the file at path to the cache under key
+    def put (self, key, suffix, path):
+        with self.store (key, suffix) as temporary:
+            shutil.copyfile (path, temporary)
+            shutil.copymode (path, temporary)
+    
+    #Gives a temporary path to write a new entry to. Once the with block finishes without an error, the entry is moved into place
+    @contextlib.contextmanager
+    def store (self, key, suffix):
+        handle, temporary = tempfile.mkstemp (dir = self.directory, suffix = ".tmp")
+        os.close (handle)
+        try:
+            yield temporary
+            os.replace (temporary, self.path (key, suffix)) #Note to self: os.replace is an atomic rename, even if the entry already exists
+        except BaseException:
+            os.remove (temporary)
+            raise
+        self.evict()
+    
+    #Deletes the least recently used entries until the cache fits in maxBytes
+    def evict (self):
+        entries = []
+        total = 0
+        for entry in os.scandir (self.directory):
+            if entry.name.endswith (".tmp"):
+                continue #another build is still writing it
+            try:
+                info = entry.stat()
+            except FileNotFoundError:
+                continue #another build just evicted it
+            entries.append ((info.st_mtime, info.st_size, entry.path))
+            total += info.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            with contextlib.suppress (FileNotFoundError):
+                os.remove (path)
+            total -= size
+    
+    #A line reporting the hits & misses so far
+    def report (self):
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return "cache: %d hits, %d misses (%.0f%% hit rate)" % (self.hits, self.misses, rate)
+
+#Copies a file to output, which is either a path or a file-like object (eg. sys.stdout)
+def copyOut (path, output):
+    with open (path, 'rb') as entry: #Note to self: an open file can still be read even if another build deletes it meanwhile
+        if hasattr (output, 'write'):
+            output.flush()
+            shutil.copyfileobj (entry, getattr (output, 'buffer', output)) #a text stream like sys.stdout has the raw bytes in .buffer
+            return
+        #Note to self: the old output is deleted rather than overwritten. Truncating a file that was only just written makes
+        #ext4 flush it to disk first, which costs far more than the copy
+        with contextlib.suppress (FileNotFoundError):
+            os.remove (output)
+        with open (output, 'wb') as outputFile:
+            shutil.copyfileobj (entry, outputFile)
+    shutil.copymode (path, output) #keeps an executable executable
+
+#A hash of the compiler's source code, so that changing the compiler never reuses output from the old version
+fingerprint = None
+
+def compilerFingerprint ():
+    global fingerprint
+    if fingerprint is None:
+        digest = hashlib.sha256()
+        for path in sorted (glob.glob (os.path.join (os.path.dirname (os.path.abspath (__file__)), "*.py"))):
+            with open (path, 'rb') as sourceFile:
+                digest.update (os.path.basename (path).encode() + b"\0" + sourceFile.read())
+        fingerprint = digest.hexdigest()
+    return fingerprint
@@ -0,0 +1,209 @@
+from tree import *
+from cmodel import *
+from runtime import fastIOPrelude
+
+#CGenerator walks the abstract syntax tree built by the Parser & emits the equivalent C code through an Emitter
+#The code it produces is the same, character for character, as what the parser used to emit while it was parsing
+
+class CGenerator:
+    def __init__(self, emitter, integers = (), fastIO = False):
+        self.emitter = emitter
+        self.declared = set() #variables that already have a declaration in the header
+        self.integers = integers #variables that are declared as long long instead of float (see infer.py)
+        self.kinds = {} #node -> its types (see kindsOf), once they've been worked out
+        self.fastIO = fastIO #PRINT & INPUT use the runtime in runtime.py instead of printf & scanf
+        self.strings = [] #with fastIO, the strings that have been printed but not written out yet (see flushStrings)
+        
+        #which method handles each kind of statement
+        self.statementMethods = {
+            PrintString: self.printString,
+            Print: self.printExpression,
+            If: self.ifStatement,
+            While: self.whileStatement,
+            Label: self.label,
+            Goto: self.goto,
+            Let: self.let,
+            Input: self.input,
+        }
+    
+    #Generates the whole program
+    def program (self, program):
+        self.begin()
+        #declaring every variable up front (in the order they were declared) keeps the declarations in the same order, even if a later pass drops statements
+        for name in program.variables:
+            self.declare (name)
+        for statement in program.statements:
+            self.statement (statement)
+        self.end()
+    
+    #the start of the C code
+    def begin (self):
+        self.emitter.headerLine("#include <stdio.h>")
+        if self.fastIO:
+            for line in fastIOPrelude.splitlines():
+                self.emitter.headerLine (line)
+        self.emitter.headerLine("int main(void){")
+        if self.fastIO:
+            self.emitter.emitLine ("tt_setup();")
+    
+    #at the end of the C code
+    def end (self):
+        self.flushStrings()
+        self.emitter.emitLine ("return 0;")
+        self.emitter.emitLine ("}")
+    
+    #every variable is a float declared at the top of main (unless it's been found to only hold integers)
+    def declare (self, name):
+        if name not in self.declared:
+            self.declared.add (name)
+            if name in self.integers:
+                self.emitter.headerLine ("long long " + name + ";")
+            else:
+                self.emitter.headerLine ("float " + name + ";")
+    
+    #The method for an IF or WHILE only emits its first line & returns the body, which is walked here with a stack of what's left to do
+    #(the statements still to come & the "}" at the end of each block), so deeply nested code doesn't need a call for each level
+    def statement (self, node):
+        work = [node]
+        while work:
+            node = work.pop()
+            if self.strings and type (node) is not PrintString:
+                self.flushStrings()
+            if node is None:
+                self.emitter.emitLine ("}")
+                continue
+            body = self.statementMethods [type (node)] (node)
+            if body is not None:
+                work.append (None)
+                work.extend (reversed (body))
+    
+    # "PRINT" string - simple string, so just print it
+    def printString (self, node):
+        if self.fastIO:
+            self.strings.append (node.text)
+        else:
+            self.emitter.emitLine ("printf (\"" + node.text + "\\n\");")
+    
+    #Writes out the strings that have been printed one after another as one fwrite (sizeof counts the bytes of the text, plus the \0 at the end)
+    #Note to self: a string can't have a \ or % in it (see the lexer), so the text needs no escaping & printf would have printed it as it is
+    def flushStrings (self):
+        if self.strings:
+            text = "\"" + "".join (string + "\\n" for string in self.strings) + "\""
+            self.emitter.emitLine ("fwrite (" + text + ", 1, sizeof " + text + " - 1, stdout);")
+            self.strings = []
+    
+    # "PRINT" expression - print the result as a float
+    #An integer variable makes the expression an integer, which is printed exactly (as a float it could be rounded), but the same way
+    def printExpression (self, node):
+        if self.integers and self.isIntegerPrint (node.expression):
+            if self.fastIO:
+                self.emitter.emitLine ("tt_printInteger (" + self.expression (node.expression) + ");")
+            else:
+                self.emitter.emitLine ("printf (\"%" + "lld.00\\n\", (long long)(" + self.expression (node.expression) + "));")
+        elif self.fastIO:
+            self.emitter.emitLine ("tt_printFloat ((float)(" + self.expression (node.expression) + "));")
+        else:
+            self.emitter.emitLine ("printf (\"%" + ".2f\\n\", (float)(" + self.expression (node.expression) + "));")
+    
+    # "IF" comparision "THEN" {statement} "ENDIF"
+    def ifStatement (self, node):
+        self.emitter.emitLine ("if(" + self.expression (node.condition) + "){")
+        return node.body
+    
+    # "WHILE" comparision "REPEAT" {statement} "ENDWHILE"
+    def whileStatement (self, node):
+        self.emitter.emitLine ("while(" + self.expression (node.condition) + "){")
+        return node.body
+    
+    # "LABEL" ident
+    def label (self, node):
+        self.emitter.emitLine (node.name + ":")
+    
+    # "GOTO" ident
+    def goto (self, node):
+        self.emitter.emitLine ("goto " + node.name + ";")
+    
+    # "LET" ident "=" expression
+    def let (self, node):
+        self.declare (node.name)
+        self.emitter.emitLine (node.name + " = " + self.expression (node.expression) + ";")
+    
+    # "INPUT" ident
+    #Emit scanf but also validate the input. If it's invalid, then set the variable to 0 and clear the input (tt_readFloat does the same)
+    def input (self, node):
+        self.declare (node.name)
+        if self.fastIO:
+            self.emitter.emitLine ("tt_readFloat (&" + node.name + ");")
+        else:
+            self.emitter.emitLine ("if(0 == scanf(\"%" + "f\", &" + node.name + ")) {")
+            self.emitter.emitLine (node.name + " = 0;")
+            self.emitter.emit ("scanf(\"%")
+            self.emitter.emitLine ("*s\");")
+            self.emitter.emitLine ("}")
+    
+    #Returns the C text for an expression. Brackets are only added where C's precedence would otherwise group it differently,
+    #so a tree straight from the parser comes out exactly as it was written
+    def expression (self, node):
+        if type (node) is Binary:
+            level = precedence [node.operator]
+            cast = self.integers and node.operator == "/" and self.isFloatDivision (node)
+            left = self.expression (node.left)
+            if type (node.left) is Binary and (precedence [node.left.operator] < level or cast):
+                left = "(" + left + ")"
+            if cast:
+                left = "(float)" + left
+            right = self.expression (node.right)
+            if type (node.right) is Binary and precedence [node.right.operator] <= level:
+                right = "(" + right + ")"
+            elif right [0] == node.operator:
+                right = " " + right #a - -1 must not come out as a--1, which C reads as a decrement
+            return left + node.operator + right
+        if type (node) is Number:
+            return node.text
+        if type (node) is Variable:
+            return node.name
+        #Unary
+        operand = self.expression (node.operand)
+        if type (node.operand) is Binary:
+            operand = "(" + operand + ")"
+        return node.operator + operand
+    
+    #The C type of an expression in the generated code, and the type it would have if every variable were a float (like typeOf in cmodel.py)
+    #Note to self: they're kept for each node, because isFloatDivision asks about the same nodes again on the way up a long expression
+    def kindsOf (self, node):
+        kinds = self.kinds.get (node)
+        if kinds is not None:
+            return kinds
+        if type (node) is Number:
+            kinds = (literalType (node.text), literalType (node.text))
+        elif type (node) is Variable:
+            kinds = (LONG if node.name in self.integers else FLOAT, FLOAT)
+        elif type (node) is Unary:
+            kinds = self.kindsOf (node.operand)
+        elif node.operator in comparisons:
+            kinds = (INT, INT)
+        else:
+            left = self.kindsOf (node.left)
+            right = self.kindsOf (node.right)
+            if None in left or None in right:
+                kinds = (None, None)
+            elif node.operator == "/" and self.isFloatDivision (node):
+                kinds = (FLOAT, FLOAT)
+            else:
+                kinds = (max (left [0], right [0]), max (left [1], right [1]))
+        self.kinds [node] = kinds
+        return kinds
+    
+    #True if a division has integers on both sides only because of integer variables. With floats it was a float division, and C would
+    #make it an integer division that throws the fraction away, so one side is cast back to a float
+    def isFloatDivision (self, node):
+        left = self.kindsOf (node.left)
+        right = self.kindsOf (node.right)
+        if None in left or None in right:
+            return False
+        return max (left [0], right [0]) <= LONG and max (left [1], right [1]) > LONG
+    
+    #True if a PRINT's expression is an integer that would have been a float
+    def isIntegerPrint (self, node):
+        kind, floatKind = self.kindsOf (node)
+        return kind is not None and kind <= LONG and floatKind > LONG
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+
+#Thin client for the compile server (server.py). It doesn't import any of the compiler, so it starts as fast as Python itself does
+#The arguments are the same as teenytiny.py's, and so is the output
+#   python3 client.py file.tiny [-o out.c] [-O level] [--socket PATH]
+#
+#The protocol is one line of JSON per request, answered with one line of JSON (so a build system can also talk to the socket directly):
+#   request   {"path": "/abs/file.tiny"} or {"source": "PRINT 1\n"}, plus optionally "optimize": 0-3 and "output": "/abs/out.c"
+#   response  {"status": "ok", "report": [...]} with "code": "..." when the request had no "output",
+#             or {"status": "error", "errors": ["file.tiny:3:7: Error! ..."]} with "diagnostics": [{"message", "line", "col", "endCol"}, ...]
+#             when the errors are in the program (rather than eg. a file that can't be read)
+
+#Where the server listens unless told otherwise. It has the user id in it, so different users on one machine get different servers
+def defaultSocket ():
+    return os.path.join (tempfile.gettempdir(), "teenytiny-%d.sock" % os.getuid())
+
+#Sends one request (a dict) to the server & returns its response (a dict)
+#Note to self: makefile() wraps the socket in a file object, so the response can be read a whole line at a time
+def request (message, socketPath = None):
+    with socket.socket (socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect (socketPath or defaultSocket())
+        connection.sendall (json.dumps (message).encode() + b"\n")
+        with connection.makefile ('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError ("the compile server closed the connection without answering")
+    return json.loads (line)
+
+def main ():
+    argParser = argparse.ArgumentParser (description = "Compile a Teeny Tiny program to C with a running compile server (see server.py)")
+    argParser.add_argument ("source", help = "the Teeny Tiny source file (- to read it from stdin)")
+    argParser.add_argument ("-o", "--output", default = "out.c", help = "where to write the C code (default: out.c, use - for stdout)")
+    argParser.add_argument ("-O", dest = "optimize", type = int, default = 0, choices = range (4), help = "optimization level, as for teenytiny.py")
+    argParser.add_argument ("--socket", help = "the server's socket (default: " + defaultSocket() + ")")
+    args = argParser.parse_args()
+    
+    #paths are sent as absolute paths, because the server's working directory isn't ours
+    message = {"optimize": args.optimize}
+    if args.source == "-":
+        message ["source"] = sys.stdin.read()
+    else:
+        message ["path"] = os.path.abspath (args.source)
+    if args.output == "-":
+        log = sys.stderr
+    else:
+        message ["output"] = os.path.abspath (args.output)
+        log = sys.stdout
+    print ("Teeny Tiny Compiler", file = log)
+    
+    try:
+        response = request (message, args.socket)
+    except OSError as error: #Note to self: ConnectionError (eg. connection refused) is a kind of OSError
+        sys.exit ("Error! Can't reach the compile server (start it with: python3 server.py): " + str (error))
+    
+    if response ["status"] != "ok":
+        if "diagnostics" in response: #errors in the program are shown with the file's name as it was typed, like teenytiny.py does
+            name = "<stdin>" if args.source == "-" else args.source
+            sys.exit ("\n".join ("%s:%d:%d: %s" % (name, diagnostic ["line"], diagnostic ["col"], diagnostic ["message"]) for diagnostic in response ["diagnostics"]))
+        sys.exit ("\n".join (response ["errors"]))
+    if args.output == "-":
+        sys.stdout.write (response ["code"])
+    for line in response ["report"]:
+        print (line, file = log)
+    print ("Compiling completed.", file = log)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+from tree import *
+import math
+import struct
+
+#A model of how C evaluates Teeny Tiny expressions in the generated code, for the parts of the compiler that need to know
+#the value an expression would have at runtime without going through gcc (eg. constant folding)
+#
+#In the generated C every variable is a float, a number without a decimal point is an int (or a long if it's too big for an int)
+#and a number with a decimal point is a double. C converts both sides of an operator to the "bigger" of the two types first,
+#which is why the types are numbered in this order (Note to self: these are C's "usual arithmetic conversions")
+INT = 0
+LONG = 1
+FLOAT = 2
+DOUBLE = 3
+
+INT_MIN, INT_MAX = -2**31, 2**31 - 1
+LONG_MIN, LONG_MAX = -2**63, 2**63 - 1
+
+comparisons = ("==", "!=", "<", "<=", ">", ">=")
+
+#The comparison that means the same with its sides swapped (eg. 10 > i is i < 10)
+swapped = {"==": "==", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+#the type C gives a number literal, or None for integers that are too big for a long
+def literalType (text):
+    if "." in text:
+        return DOUBLE
+    value = int (text)
+    if value <= INT_MAX:
+        return INT
+    if value <= LONG_MAX:
+        return LONG
+    return None
+
+#the value of a number literal, as a Python int or float
+def literalValue (text):
+    if "." in text:
+        return float (text)
+    return int (text)
+
+#rounds a double to the nearest float (single precision), the way C does when it stores into a float variable
+def f32 (value):
+    try:
+        return struct.unpack ('f', struct.pack ('f', value))[0]
+    except OverflowError:
+        return math.copysign (math.inf, value) #too big for a float
+    
+#converts a value to the given type
+def convert (value, kind):
+    if kind == FLOAT:
+        return f32 (value)
+    if kind == DOUBLE:
+        return float (value)
+    return value
+
+#floating point division, which gives inf or nan instead of an error when dividing by zero (like C does)
+#Note to self: the nan that x86 makes for 0/0 has its sign bit set, which is why printf shows it as "-nan"
+def divide (left, right):
+    if right == 0:
+        if math.isnan (left):
+            return left
+        if left == 0:
+            return -math.nan
+        return math.copysign (math.inf, left) * math.copysign (1.0, right)
+    return left / right
+
+#Works out "left operator right" the way C would, once both sides have been converted to kind
+#Returns None when C leaves the result undefined (integer overflow or division by zero), so there's no value to use
+def arithmetic (operator, left, right, kind):
+    left = convert (left, kind)
+    right = convert (right, kind)
+    
+    if operator in comparisons:
+        if operator == "==": result = left == right
+        elif operator == "!=": result = left != right
+        elif operator == "<": result = left < right
+        elif operator == "<=": result = left <= right
+        elif operator == ">": result = left > right
+        else: result = left >= right
+        return int (result) #a comparison is an int (1 or 0) in C
+    
+    if kind == INT or kind == LONG:
+        if operator == "+": result = left + right
+        elif operator == "-": result = left - right
+        elif operator == "*": result = left * right
+        else:
+            if right == 0:
+                return None
+            result = abs (left) // abs (right) #C's integer division rounds towards zero
+            if (left < 0) != (right < 0):
+                result = -result
+        low, high = (INT_MIN, INT_MAX) if kind == INT else (LONG_MIN, LONG_MAX)
+        if result < low or result > high:
+            return None
+        return result
+    
+    if operator == "+": result = left + right
+    elif operator == "-": result = left - right
+    elif operator == "*": result = left * right
+    else: result = divide (left, right)
+    return convert (result, kind) #a float operation is rounded back to a float
+
+#The type of an expression's result in the generated C, or None if it can't be worked out
+def typeOf (node):
+    if type (node) is Number:
+        return literalType (node.text)
+    if type (node) is Variable:
+        return FLOAT
+    if type (node) is Unary:
+        return typeOf (node.operand)
+    if node.operator in comparisons:
+        return INT
+    left = typeOf (node.left)
+    right = typeOf (node.right)
+    if left is None or right is None:
+        return None
+    return max (left, right)
+
+#The (type, value) of a constant - a number, or a negative number - or None if the expression isn't a constant
+def constant (node):
+    if type (node) is Unary and type (node.operand) is Number and node.operator == "-":
+        kind = literalType (node.operand.text)
+        if kind is None:
+            return None
+        return kind, -literalValue (node.operand.text)
+    if type (node) is Number:
+        kind = literalType (node.text)
+        if kind is None:
+            return None
+        return kind, literalValue (node.text)
+    return None
+
+#Every part of an expression, with the parts of each one before it (so a part's operands are always dealt with first)
+def partsInOrder (node):
+    parts = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        parts.append (node)
+        if type (node) is Binary:
+            stack.append (node.left)
+            stack.append (node.right)
+        elif type (node) is Unary:
+            stack.append (node.operand)
+    parts.reverse()
+    return parts
+
+#The type of each part of an expression (see typeOf), as part -> type
+def expressionTypes (node):
+    types = {}
+    for part in partsInOrder (node):
+        kind = type (part)
+        if kind is Number:
+            types [part] = literalType (part.text)
+        elif kind is Variable:
+            types [part] = FLOAT
+        elif kind is Unary:
+            types [part] = types [part.operand]
+        elif part.operator in comparisons:
+            types [part] = INT
+        else:
+            left, right = types [part.left], types [part.right]
+            types [part] = None if left is None or right is None else max (left, right)
+    return types
+
+#True if an expression has an integer division, which crashes the program if it divides by zero
+#(a division with a variable in it is always a float division, see CGenerator.isFloatDivision)
+def canTrap (node):
+    types = expressionTypes (node)
+    return any (type (part) is Binary and part.operator == "/" and types [part.left] in (INT, LONG) and types [part.right] in (INT, LONG) for part in types)
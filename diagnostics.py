@@ -0,0 +1,29 @@
+#The errors the lexer & parser report. Instead of exiting on the first mistake, the parser collects a Diagnostic for every error in
+#the program (see Parser.statement) & raises them all together in a CompileError, so one compile tells you about every mistake
+#Both are exceptions, so a program that uses the compiler (eg. batch.py or server.py) can carry on after a source that doesn't compile
+
+#One error, with where it is in the source. line & col start at 1, and endCol is the column just after the text the error is about
+class Diagnostic(Exception):
+    def __init__(self, message, line, col, endCol):
+        Exception.__init__(self, message)
+        self.message = message
+        self.line = line
+        self.col = col
+        self.endCol = endCol
+    
+    #Note to self: "line:col: message" is the way gcc reports errors, which editors know how to jump to
+    def __str__ (self):
+        return "%d:%d: %s" % (self.line, self.col, self.message)
+    
+    def asDict (self):
+        return {"message": self.message, "line": self.line, "col": self.col, "endCol": self.endCol}
+
+#Every error found in a program, in the order they appear in the source
+class CompileError(Exception):
+    def __init__(self, diagnostics):
+        self.diagnostics = sorted (diagnostics, key = lambda diagnostic: (diagnostic.line, diagnostic.col))
+        Exception.__init__(self, "\n".join (str (diagnostic) for diagnostic in self.diagnostics))
+    
+    #One line per error, with the source file's name in front (eg. "fib.tiny:3:7: Error! ...")
+    def report (self, sourcePath):
+        return [sourcePath + ":" + str (diagnostic) for diagnostic in self.diagnostics]
@@ -1,29 +1,64 @@
 #Enitter object will keep track of the generated code & outputs it
 
-#'code' is the string containing the C code that is emitted 
-#'header' contains things that will be prepended to the code
-#'fullPath' is the path to write the file containing the C code
+#'code' is the list of fragments of C code that are emitted 
+#'header' is the list of lines that will be prepended to the code
+#'fullPath' is the path to write the file containing the C code, or a file-like object (eg. sys.stdout) to write it to
+#Note to self: appending to a list & writing it out with writelines() avoids copying the whole program every time a fragment is added (which "+=" on a string does)
 
+import contextlib
+import shutil
+import tempfile
 
 class Emitter:
     def __init__(self, fullPath):
         self.fullPath = fullPath
-        self.header = ""
-        self.code = ""
+        self.header = []
+        self.code = []
     
     #adds a fragment of C code 
     def emit (self, code):
-        self.code += code
+        self.code.append(code)
     
     #adds a fragment that ends a line
     def emitLine (self, code):
-        self.code += code + '\n'
+        self.code.append(code + '\n')
     
     #adds a line of C code to the top of the C code file (ie. library header, main function, variable declarations)
     def headerLine (self, code):
-        self.header += code + '\n'
+        self.header.append(code + '\n')
     
-    #writes the C code to a file
+    #opens the output for writing. A file-like object is written to as it is & left open for whoever passed it in
+    def openOutput (self):
+        if hasattr (self.fullPath, 'write'):
+            return contextlib.nullcontext(self.fullPath)
+        return open (self.fullPath, 'w')
+    
+    #writes the C code to a file, fragment by fragment, without joining it into one big string first
+    def writeFile (self):
+        with self.openOutput() as outputFile:
+            outputFile.writelines(self.header)
+            outputFile.writelines(self.code)
+
+
+#StreamEmitter writes the C code to a temporary spool file as soon as it is emitted, instead of keeping it all in memory
+#The header (variable declarations) isn't complete until the whole program has been parsed, so it is still kept in memory and written first
+class StreamEmitter(Emitter):
+    def __init__(self, fullPath):
+        Emitter.__init__(self, fullPath)
+        self.spool = tempfile.TemporaryFile ('w+') #Note to self: a TemporaryFile is deleted automatically once it's closed
+    
+    #adds a fragment of C code 
+    def emit (self, code):
+        self.spool.write(code)
+    
+    #adds a fragment that ends a line
+    def emitLine (self, code):
+        self.spool.write(code + '\n')
+    
+    #writes the header, then copies the spooled code after it in chunks
     def writeFile (self):
-        with open (self.fullPath, 'w') as outputFile:
-            outputFile.write(self.header + self.code)
\ No newline at end of file
+        with self.openOutput() as outputFile:
+            outputFile.writelines(self.header)
+            self.spool.seek(0)
+            shutil.copyfileobj(self.spool, outputFile)
+        self.spool.close()
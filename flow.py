@@ -0,0 +1,147 @@
+from tree import *
+from cmodel import *
+
+#Control flow analysis of a whole program, used by the optimizer to throw away code that can never run or never matters
+#The control flow graph (CFG) has one node per statement. An edge goes from a statement to each statement that can run right after it:
+#the next statement, the first statement of an IF/WHILE body, back to the WHILE at the end of its body, or the LABEL a GOTO jumps to
+#None stands for the end of the program
+
+class ControlFlowGraph:
+    def __init__(self, program):
+        self.program = program
+        self.successors = {} #statement -> list of the statements (or None) that can run next
+        
+        labels = {}
+        for statement in allStatements (program.statements):
+            if type (statement) is Label:
+                labels [statement.name] = statement
+        
+        #Note to self: a list used as a stack (instead of recursion) means deeply nested programs can't hit Python's recursion limit
+        stack = [(program.statements, None)]
+        while stack:
+            block, follow = stack.pop()
+            for index, statement in enumerate (block):
+                after = block [index + 1] if index + 1 < len (block) else follow
+                kind = type (statement)
+                
+                if kind is Goto:
+                    self.successors [statement] = [labels [statement.name]]
+                elif kind is If:
+                    first = statement.body [0] if statement.body else after
+                    self.successors [statement] = self.branch (statement.condition, first, after)
+                    stack.append ((statement.body, after))
+                elif kind is While:
+                    first = statement.body [0] if statement.body else statement
+                    self.successors [statement] = self.branch (statement.condition, first, after)
+                    stack.append ((statement.body, statement)) #the end of the body goes back to the condition
+                else:
+                    self.successors [statement] = [after]
+    
+    #The statements an IF or WHILE can go to next. A constant condition (eg. after constant folding) only ever goes one way
+    def branch (self, condition, whenTrue, whenFalse):
+        value = constant (condition)
+        if value is None:
+            return [whenTrue, whenFalse]
+        if value [1] != 0:
+            return [whenTrue]
+        return [whenFalse]
+    
+    #Every statement that can be reached from the start of the program
+    def reachable (self):
+        statements = self.program.statements
+        if not statements:
+            return set()
+        seen = {statements [0]}
+        work = [statements [0]]
+        while work:
+            for successor in self.successors [work.pop()]:
+                if successor is not None and successor not in seen:
+                    seen.add (successor)
+                    work.append (successor)
+        return seen
+
+#Every statement in a list of statements, including the ones nested in IF/WHILE bodies
+def allStatements (statements):
+    stack = [statements]
+    while stack:
+        for statement in stack.pop():
+            yield statement
+            if type (statement) is If or type (statement) is While:
+                stack.append (statement.body)
+
+#Keeps only the statements that keep(statement) is True for. An IF/WHILE that is dropped still keeps any statements
+#in its body that have to stay (eg. a LABEL that a GOTO jumps into)
+#The bodies are filtered from the innermost out (allStatements() hands out every IF/WHILE before the ones in its body), so whether
+#a block still has anything in it is known by the time the block itself is filtered, without recursing into each body
+def filterStatements (statements, keep):
+    blocks = [statement for statement in allStatements (statements) if type (statement) is If or type (statement) is While]
+    for block in reversed (blocks):
+        block.body = keptStatements (block.body, keep)
+    return keptStatements (statements, keep)
+
+def keptStatements (statements, keep):
+    return [statement for statement in statements if keep (statement) or ((type (statement) is If or type (statement) is While) and statement.body)]
+
+#Runs a pass that removes statements & returns how many it removed
+def countRemoved (program, removePass):
+    before = sum (1 for statement in allStatements (program.statements))
+    removePass (program)
+    return before - sum (1 for statement in allStatements (program.statements))
+
+#Removes the statements that can never run, eg. anything straight after a GOTO that no other GOTO jumps to
+#An IF/WHILE whose condition is always false goes too, unless a GOTO jumps into its body
+def removeUnreachable (program):
+    reachable = ControlFlowGraph (program).reachable()
+    program.statements = filterStatements (program.statements, lambda statement: statement in reachable and not neverTaken (statement))
+
+#True for an IF/WHILE whose condition is a constant 0
+def neverTaken (statement):
+    if type (statement) is not If and type (statement) is not While:
+        return False
+    value = constant (statement.condition)
+    return value is not None and value [1] == 0
+
+#Removes the labels that no GOTO jumps to
+def removeUnusedLabels (program):
+    targets = {statement.name for statement in allStatements (program.statements) if type (statement) is Goto}
+    program.statements = filterStatements (program.statements, lambda statement: type (statement) is not Label or statement.name in targets)
+
+#Removes the LETs of variables that are never read. Removing one can make another variable unread, so it repeats until nothing changes
+#INPUT is always kept, since it still has to consume the input, and so is a LET with an integer division (see canTrap in cmodel.py),
+#since a division by zero has to stop the program just like it would without the optimizations
+def removeDeadStores (program):
+    while True:
+        read = variablesRead (program.statements)
+        isDead = lambda statement: type (statement) is Let and statement.name not in read and not canTrap (statement.expression)
+        if not any (isDead (statement) for statement in allStatements (program.statements)):
+            break
+        program.statements = filterStatements (program.statements, lambda statement: not isDead (statement))
+    
+    #variables that don't appear anywhere anymore don't need declaring either
+    used = variablesRead (program.statements)
+    for statement in allStatements (program.statements):
+        if type (statement) is Let or type (statement) is Input:
+            used.add (statement.name)
+    program.variables = [name for name in program.variables if name in used]
+
+#The names of all the variables read by the statements' expressions
+def variablesRead (statements):
+    read = set()
+    for statement in allStatements (statements):
+        kind = type (statement)
+        if kind is Print or kind is Let:
+            stack = [statement.expression]
+        elif kind is If or kind is While:
+            stack = [statement.condition]
+        else:
+            continue
+        while stack:
+            node = stack.pop()
+            if type (node) is Variable:
+                read.add (node.name)
+            elif type (node) is Binary:
+                stack.append (node.left)
+                stack.append (node.right)
+            elif type (node) is Unary:
+                stack.append (node.operand)
+    return read
@@ -0,0 +1,138 @@
+import argparse
+import sys
+
+#Generates synthetic Teeny Tiny programs of any size, in a few shapes that each stress a different part of the compiler
+#   mixed        a bit of everything the lexer has to deal with (keywords, identifiers, numbers, strings, comments, operators)
+#   nested       WHILEs & IFs nested inside each other, size levels deep
+#   expressions  LETs with long expressions, size operands each
+#   variables    a new variable on every line, so the symbol table & the declarations keep growing
+#   gotos        lots of LABELs & GOTOs
+#Every shape is a valid program that runs to the end, and the generators are generators (they use yield), so a huge program
+#can be written to a file without ever being held in memory
+#   python3 generate.py shape [--lines N] [--size N] [-o file.tiny]
+
+#the variables are reused every 100 blocks, so bigger programs don't need a bigger symbol table
+def programLines (lines, size = None):
+    block = [
+        "# counting down",
+        "LET counter{0} = {0}.5 * 2 - 1",
+        "WHILE counter{0} >= 0 REPEAT",
+        "    PRINT \"still going\"",
+        "    IF counter{0} != 3 THEN",
+        "        PRINT counter{0} / 2 + total",
+        "    ENDIF",
+        "    LET counter{0} = counter{0} - 1",
+        "ENDWHILE",
+        "LET total = total + counter{0}",
+    ]
+    yield "LET total = 0"
+    count = 1
+    i = 0
+    while count < lines:
+        for line in block:
+            yield line.format (i % 100)
+        count += len (block)
+        i += 1
+
+#each level is a WHILE that runs once or an IF that's true, alternately, with its own counter
+#Note to self: the indentation grows with the square of the depth, so a program thousands of levels deep is better made with indent = ""
+def nestedLines (lines, size = 100, indent = "    "):
+    count = 0
+    while count < lines:
+        opening = []
+        closing = []
+        for level in range (size):
+            spaces = indent * level
+            opening.append (spaces + "LET n{0} = 0".format (level))
+            if level % 2 == 0:
+                opening.append (spaces + "WHILE n{0} < 1 REPEAT".format (level))
+                closing.append (spaces + "ENDWHILE")
+                closing.append (spaces + indent + "LET n{0} = n{0} + 1".format (level))
+            else:
+                opening.append (spaces + "IF n{0} == 0 THEN".format (level))
+                closing.append (spaces + "ENDIF")
+        yield from opening
+        yield indent * size + "PRINT n0"
+        yield from reversed (closing)
+        count += len (opening) + len (closing) + 1
+
+#every operator at every precedence level, with variables, numbers & unary minus as operands
+def expressionLines (lines, size = 20):
+    operators = [" + ", " * ", " - ", " / "]
+    operands = ["a", "2", "b", "- 3.5", "c", "7"]
+    yield "LET a = 1"
+    yield "LET b = 2"
+    yield "LET c = 3"
+    count = 3
+    i = 0
+    while count < lines:
+        terms = [operands [(i + j) % len (operands)] for j in range (size)]
+        text = terms [0]
+        for j in range (1, size):
+            text += operators [(i + j) % len (operators)] + terms [j]
+        yield "LET e{0} = {1}".format (i % 1000, text)
+        if i % 10 == 9:
+            yield "PRINT e{0}".format (i % 1000)
+            count += 1
+        count += 1
+        i += 1
+
+#each variable is declared from the one before it, so every name in the program is different
+def variableLines (lines, size = None):
+    yield "LET v0 = 1"
+    for i in range (1, lines):
+        yield "LET v{0} = v{1} + {0}".format (i, i - 1)
+        if i % 100 == 0:
+            yield "PRINT v{0}".format (i)
+
+#a chain of labels, with a GOTO forward to the next one & a GOTO back that's never taken
+def gotoLines (lines, size = None):
+    yield "LET x = 0"
+    count = 1
+    i = 0
+    while count < lines:
+        yield "LABEL L{0}".format (i)
+        yield "LET x = x + 1"
+        yield "IF x < 0 THEN"
+        yield "    GOTO L{0}".format (i)
+        yield "ENDIF"
+        yield "PRINT x"
+        yield "GOTO L{0}".format (i + 1)
+        count += 7
+        i += 1
+    yield "LABEL L{0}".format (i)
+
+#shape name -> the generator that makes it
+shapes = {
+    "mixed": programLines,
+    "nested": nestedLines,
+    "expressions": expressionLines,
+    "variables": variableLines,
+    "gotos": gotoLines,
+}
+
+#the whole program as one string. size is the nesting depth or expression length (the shape's own default if it's None)
+def makeShape (shape, lines, size = None):
+    generator = shapes [shape]
+    if size is None:
+        return "\n".join (generator (lines)) + "\n"
+    return "\n".join (generator (lines, size)) + "\n"
+
+def main ():
+    argParser = argparse.ArgumentParser (description = "Generate a synthetic Teeny Tiny program")
+    argParser.add_argument ("shape", choices = sorted (shapes), help = "what kind of program to generate")
+    argParser.add_argument ("--lines", type = int, default = 10000, help = "roughly how many lines to generate (default: 10000)")
+    argParser.add_argument ("--size", type = int, default = None, help = "nesting depth for nested, operands per expression for expressions")
+    argParser.add_argument ("-o", "--output", default = "-", help = "where to write the program (default: stdout)")
+    args = argParser.parse_args()
+    
+    generator = shapes [args.shape]
+    lines = generator (args.lines) if args.size is None else generator (args.lines, args.size)
+    if args.output == "-":
+        sys.stdout.writelines (line + "\n" for line in lines)
+    else:
+        with open (args.output, 'w') as outputFile:
+            outputFile.writelines (line + "\n" for line in lines)
+
+if __name__ == "__main__":
+    main()
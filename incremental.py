@@ -0,0 +1,371 @@
+from lex import *
+from emit import *
+from parse import *
+from cgen import *
+from optimize import *
+import bisect
+import collections
+import itertools
+
+#IncrementalCompiler keeps what it compiled last time, so that after an edit only the statements that changed go through the
+#lexer, parser & code generator again. This is what makes recompiling a huge file after a small edit quick
+#
+#The source is split into chunks, one per top level statement (an IF or WHILE chunk includes its whole body). A chunk starts at the
+#start of its statement's line & runs up to the next chunk, so it also holds any blank lines & comments after its statement.
+#For each chunk we keep its syntax tree, its C code & the variables & labels it declares & uses. After an edit, lexing &
+#parsing start again at the chunk the edit begins in, and stop as soon as the parser is back at the start of a chunk that's
+#past the edit (so an edit that changes the block structure, like deleting an ENDWHILE, just re-parses further). The C code is
+#then the kept code of the chunks with the new chunks' code patched in
+#
+#The checks the Parser makes across statements (no variable used before it's declared, no label declared twice, no GOTO to a
+#missing label) are kept up to date with a list per name of the chunks that declare & use it, so an edit only needs to look
+#at the names the changed chunks mention. Chunks are ordered by a key (a number) that's kept in the same order as the chunks,
+#so that those lists can tell which chunk comes first without counting chunks. New chunks get keys in the gap between their
+#neighbours' keys, and when a gap runs out every key is handed out again
+#Note to self: only -O0 & -O1 are supported, since the -O2 passes look at the whole program at once
+
+keySpacing = 1 << 32 #the gap between the keys of neighbouring chunks when they're handed out
+
+#One top level statement & what's kept about it
+class Chunk:
+    __slots__ = ("key", "statement", "declares", "needs", "labels", "gotos")
+    
+    def __init__(self, statement):
+        self.key = 0
+        self.statement = statement #None for a chunk of only blank lines & comments
+        self.declares = [] #variables declared by LET or INPUT, in the order they're declared
+        self.needs = [] #variables used before this chunk declares them, which must be declared by an earlier chunk
+        self.labels = []
+        self.gotos = []
+
+class IncrementalCompiler:
+    def __init__(self, optimize = 0):
+        if optimize > 1:
+            raise ValueError ("incremental compiles only support -O0 and -O1")
+        self.optimizer = Optimizer (optimize)
+        self.generator = CGenerator (Emitter (None))
+        
+        self.source = ""
+        #the chunks in order, and their line count, character count & C code in lists of their own
+        #Note to self: lists of ints & strings can be summed up, sliced & joined by Python's C code, which is far quicker than a loop over the chunks
+        self.chunks = []
+        self.lineCounts = []
+        self.charCounts = []
+        self.codes = []
+        
+        #variable -> sorted list of (key, position in the chunk's list) for each chunk that declares it, and for each chunk that needs it
+        self.declarers = {}
+        self.needers = {}
+        self.labelers = {} #label -> sorted list of the keys of the chunks that declare it
+        self.gotoCounts = collections.Counter() #label -> how many chunks GOTO it
+        self.reparsed = 0 #how many statements the last update parsed
+    
+    #Compiles the new version of the whole source, re-parsing only the part that differs from the last version
+    def update (self, source):
+        old = self.source
+        #the length of the text that's the same at the start, and then at the end, of both versions
+        start = commonPrefix (old, source)
+        end = commonSuffix (old, source, min (len (old), len (source)) - start)
+        self.replace (start, len (old) - end, source [start:len (source) - end])
+    
+    #Replaces the characters from start up to end of the current source with text, and recompiles what that changed
+    #If the new source doesn't compile, a CompileError is raised & the compiler is left as it was before the edit
+    def replace (self, start, end, text):
+        old = self.source
+        source = old [:start] + text + old [end:]
+        charDelta = len (text) - (end - start)
+        lineDelta = text.count ('\n') - old.count ('\n', start, end)
+        
+        charStarts = list (itertools.accumulate (self.charCounts, initial = 0))
+        lineStarts = list (itertools.accumulate (self.lineCounts, initial = 0))
+        count = len (self.chunks)
+        
+        #the first chunk to re-parse is the one the edit starts in, and the parse can stop at the start of any chunk past the edit
+        #Note to self: a chunk that starts right where the edit ends isn't past it, since the edit can run on into its first line
+        #(eg. "1\n" replaced by "3\nx" in front of "PRINT 2" makes it "xPRINT 2")
+        first = max (min (bisect.bisect_right (charStarts, start) - 1, count - 1), 0)
+        last = max (bisect.bisect_right (charStarts, end), first + 1)
+        
+        #the variables & labels declared before the first chunk, which the re-parsed statements can use (or clash with)
+        symbols = set()
+        labels = set()
+        if first < count:
+            firstKey = self.chunks [first].key
+            for name, declarations in self.declarers.items():
+                if declarations [0][0] < firstKey:
+                    symbols.add (name)
+            for label, keys in self.labelers.items():
+                if keys [0] < firstKey:
+                    labels.add (label)
+        
+        #start lexing at the first chunk, with the line numbers carrying on from there
+        lexer = FastLexer (source)
+        lexer.curPos = charStarts [first]
+        lexer.curChar = lexer.source [lexer.curPos]
+        lexer.line = lineStarts [first] + 1
+        lexer.lineStart = lexer.curPos
+        parser = Parser (lexer)
+        parser.symbols = symbols
+        parser.labelsDeclared = labels
+        
+        #parse statements until the parser reaches the start of a chunk past the edit (or the end of the file)
+        newChunks = []
+        newStarts = [lineStarts [first]]
+        while parser.checkToken (TokenType.NEWLINE):
+            parser.skipToken()
+        while not parser.checkToken (TokenType.EOF):
+            statement = parser.statement()
+            newChunks.append (Chunk (None) if statement is None else self.chunk (statement)) #None when the statement has an error
+            nextLine = parser.curToken.line - 1
+            if parser.checkToken (TokenType.EOF):
+                break
+            while last < count and lineStarts [last] + lineDelta < nextLine:
+                last += 1
+            if last < count and lineStarts [last] + lineDelta == nextLine:
+                break
+            newStarts.append (nextLine)
+        if parser.checkToken (TokenType.EOF):
+            last = count
+        
+        #the lines & characters each new chunk takes up
+        regionStart = charStarts [first]
+        if last < count:
+            regionEnd = charStarts [last] + charDelta
+            regionLines = lineStarts [last] + lineDelta
+        else:
+            regionEnd = len (source)
+            regionLines = lineStarts [first] + source.count ('\n', regionStart)
+        if not newChunks and regionEnd > regionStart:
+            newChunks.append (Chunk (None)) #only blank lines & comments
+        newStarts.append (regionLines)
+        newLineCounts = [newStarts [i + 1] - newStarts [i] for i in range (len (newChunks))]
+        newCharCounts = []
+        position = regionStart
+        for lineCount in newLineCounts:
+            chunkStart = position
+            for _ in range (lineCount):
+                position = source.index ('\n', position) + 1
+            newCharCounts.append (position - chunkStart)
+        if newCharCounts:
+            newCharCounts [-1] += regionEnd - position #a last line with no newline at the end
+        
+        #Note to self: errors don't happen often, so a full parse is used to report exactly what's wrong & where, just as a full compile would
+        #(the re-parsed statements' errors on their own would leave out the ones the edit causes elsewhere, eg. a GOTO to a label it deleted)
+        if parser.errors:
+            Parser (FastLexer (source)).program()
+            raise CompileError (parser.errors)
+        self.assignKeys (first, last, newChunks)
+        if not self.check (first, last, newChunks):
+            #the edit broke something outside the statements that were re-parsed (eg. it deleted a LET that a later statement needs)
+            Parser (FastLexer (source)).program()
+        
+        #everything checks out, so the new chunks replace the old ones
+        for chunk in self.chunks [first:last]:
+            self.forget (chunk)
+        for chunk in newChunks:
+            self.remember (chunk)
+        self.chunks [first:last] = newChunks
+        self.lineCounts [first:last] = newLineCounts
+        self.charCounts [first:last] = newCharCounts
+        self.codes [first:last] = [self.generate (chunk) for chunk in newChunks]
+        self.source = source
+        self.reparsed = len (newChunks)
+    
+    #Makes a chunk for a statement, noting which variables & labels it declares & uses
+    def chunk (self, statement):
+        chunk = Chunk (statement)
+        declared = set()
+        for node in statementsInOrder ([statement]):
+            kind = type (node)
+            if kind is Let or kind is Input:
+                if node.name not in declared:
+                    declared.add (node.name)
+                    chunk.declares.append (node.name)
+            elif kind is Label:
+                chunk.labels.append (node.name)
+            elif kind is Goto:
+                chunk.gotos.append (node.name)
+            
+            #LET declares its variable before the expression is parsed, so LET x = x doesn't need an earlier x
+            if kind is Let or kind is Print:
+                expression = node.expression
+            elif kind is If or kind is While:
+                expression = node.condition
+            else:
+                continue
+            for name in variablesIn (expression):
+                if name not in declared and name not in chunk.needs:
+                    chunk.needs.append (name)
+        return chunk
+    
+    #the C code for a chunk
+    def generate (self, chunk):
+        if chunk.statement is None:
+            return ""
+        self.generator.emitter = Emitter (None)
+        self.generator.statement (self.optimizer.statement (chunk.statement))
+        return "".join (self.generator.emitter.code)
+    
+    #Gives the new chunks keys in the gap between the chunks before & after them
+    def assignKeys (self, first, last, newChunks):
+        low = self.chunks [first - 1].key if first > 0 else 0
+        if last < len (self.chunks):
+            gap = (self.chunks [last].key - low) // (len (newChunks) + 1)
+            if gap == 0:
+                self.renumber()
+                low = self.chunks [first - 1].key if first > 0 else 0
+                gap = (self.chunks [last].key - low) // (len (newChunks) + 1)
+        else:
+            gap = keySpacing
+        for i, chunk in enumerate (newChunks):
+            chunk.key = low + gap * (i + 1)
+    
+    #Hands out every chunk a new key, spaced out again, & rebuilds the lists that use them
+    def renumber (self):
+        for chunk in self.chunks:
+            self.forget (chunk)
+        for i, chunk in enumerate (self.chunks):
+            chunk.key = (i + 1) * keySpacing
+            self.remember (chunk)
+    
+    #Checks that replacing the chunks from first up to last with newChunks leaves every variable declared before it's used,
+    #no label declared twice & no GOTO to a missing label
+    def check (self, first, last, newChunks):
+        oldChunks = self.chunks [first:last]
+        low = oldChunks [0].key if oldChunks else 0
+        high = self.chunks [last].key if last < len (self.chunks) else None
+        
+        #the first chunk to declare & to need each variable the old or new chunks mention, as (key, position)
+        names = set()
+        for chunk in oldChunks + newChunks:
+            names.update (chunk.declares)
+            names.update (chunk.needs)
+        for name in names:
+            declared = firstOutside (self.declarers.get (name, []), low, high)
+            needed = firstOutside (self.needers.get (name, []), low, high)
+            for chunk in newChunks:
+                if name in chunk.declares and (declared is None or chunk.key < declared [0]):
+                    declared = (chunk.key, chunk.declares.index (name))
+                if name in chunk.needs and (needed is None or chunk.key < needed [0]):
+                    needed = (chunk.key, chunk.needs.index (name))
+            #a chunk only needs the variables it uses before declaring them, so a need in the same chunk as the first declaration is too early
+            if needed is not None and (declared is None or needed [0] <= declared [0]):
+                return False
+        
+        #how the edit changes the number of chunks that declare & GOTO each label
+        labelCounts = collections.Counter()
+        gotoCounts = collections.Counter()
+        for chunk in oldChunks:
+            labelCounts.subtract (chunk.labels)
+            gotoCounts.subtract (chunk.gotos)
+        for chunk in newChunks:
+            labelCounts.update (chunk.labels)
+            gotoCounts.update (chunk.gotos)
+        for label in labelCounts:
+            if len (self.labelers.get (label, [])) + labelCounts [label] > 1:
+                return False
+        for label in set (labelCounts) | set (gotoCounts): #Note to self: adding Counters would drop the labels whose count went down
+            if self.gotoCounts [label] + gotoCounts [label] > 0 and len (self.labelers.get (label, [])) + labelCounts [label] == 0:
+                return False
+        return True
+    
+    #adds a chunk to the lists of who declares & uses each name
+    def remember (self, chunk):
+        for position, name in enumerate (chunk.declares):
+            bisect.insort (self.declarers.setdefault (name, []), (chunk.key, position))
+        for position, name in enumerate (chunk.needs):
+            bisect.insort (self.needers.setdefault (name, []), (chunk.key, position))
+        for label in chunk.labels:
+            bisect.insort (self.labelers.setdefault (label, []), chunk.key)
+        self.gotoCounts.update (chunk.gotos)
+    
+    #takes a chunk back out of those lists
+    def forget (self, chunk):
+        for position, name in enumerate (chunk.declares):
+            removeSorted (self.declarers, name, (chunk.key, position))
+        for position, name in enumerate (chunk.needs):
+            removeSorted (self.needers, name, (chunk.key, position))
+        for label in chunk.labels:
+            removeSorted (self.labelers, label, chunk.key)
+        self.gotoCounts.subtract (chunk.gotos)
+    
+    #every variable in the order it's first declared, which is the order the C code declares them in
+    def variables (self):
+        return sorted (self.declarers, key = lambda name: self.declarers [name][0])
+    
+    #Writes the C code for the whole program to output (a path or a file-like object)
+    def writeFile (self, output):
+        emitter = Emitter (output)
+        generator = CGenerator (emitter)
+        generator.begin()
+        for name in self.variables():
+            generator.declare (name)
+        emitter.code = self.codes + [] #a copy, since end() adds to it
+        generator.end()
+        emitter.writeFile()
+
+#The statements in the order they're written, including the ones in the bodies of IFs & WHILEs
+def statementsInOrder (statements):
+    stack = [iter (statements)]
+    while stack:
+        statement = next (stack [-1], None)
+        if statement is None:
+            stack.pop()
+            continue
+        yield statement
+        if type (statement) is If or type (statement) is While:
+            stack.append (iter (statement.body))
+
+#The names of the variables an expression reads, from left to right
+def variablesIn (expression):
+    stack = [expression]
+    while stack:
+        node = stack.pop()
+        if type (node) is Variable:
+            yield node.name
+        elif type (node) is Binary:
+            stack.append (node.right)
+            stack.append (node.left)
+        elif type (node) is Unary:
+            stack.append (node.operand)
+
+#Removes an entry from the sorted list kept for name, and the list itself once it's empty
+#Note to self: a name like a loop counter can be declared by thousands of chunks, so the entry is found with bisect rather than list.remove()
+def removeSorted (lists, name, entry):
+    entries = lists [name]
+    del entries [bisect.bisect_left (entries, entry)]
+    if not entries:
+        del lists [name]
+
+#The first (key, position) in a sorted list with a key that isn't from low up to (but not including) high, or None
+#high is None for "to the end"
+def firstOutside (entries, low, high):
+    if entries and entries [0][0] < low:
+        return entries [0]
+    if high is None:
+        return None
+    i = bisect.bisect_left (entries, (high,))
+    return entries [i] if i < len (entries) else None
+
+#How many characters at the start of a & b are the same
+#Note to self: comparing slices is done by Python's C code, so halving the range each time is much quicker than a loop over the characters
+def commonPrefix (a, b):
+    low, high = 0, min (len (a), len (b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a [low:middle] == b [low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+#How many characters at the end of a & b are the same, up to limit
+def commonSuffix (a, b, limit):
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a [len (a) - middle:len (a) - low] == b [len (b) - middle:len (b) - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
@@ -0,0 +1,358 @@
+from tree import *
+from cmodel import *
+from bisect import bisect_right
+import math
+
+#Type inference for --integers (see teenytiny.py): works out which variables only ever hold whole numbers, so that the C code can
+#declare them as long long instead of float. Integer maths is faster than float maths, and a whole number stays exact instead of
+#being rounded to a float once it's bigger than 2^24 (eg. a loop counter that goes past 16777216 would stop counting)
+#
+#A variable is an integer when it's never INPUT & every LET of it is an integer expression: integer literals & integer variables with
+#+ - * between them. Division is left out, since dividing in Teeny Tiny gives a fraction (the code generator makes sure it still does
+#when both sides are integers, see CGenerator.isFloatDivision)
+#
+#Apart from the rounding, a long long only prints the same as a float when two things are proven, for every expression in the program
+#that's worked out with long longs:
+#   it stays inside a long long. Past 2^63 it overflows (which C leaves undefined), where a float would have carried on
+#   it can't be -0. A float can (eg. - x or x * -1 when x is 0), & then prints "-0.00" or makes 1 / x -inf, but a long long can't
+#Both are proven with the range of values each variable can have (see variableRanges). A variable that can't be proven safe everywhere
+#it's read stays a float
+#Note to self: + and - on integers never make a -0 (as floats, x + y is only -0 when both are -0 & x - y when x is -0 & y is 0)
+
+maxGrowth = 3 #how many times a variable's range can grow before it's widened to have no limit (see variableRanges)
+maxGuards = 8 #the most IFs & WHILEs around a statement whose conditions are used to narrow the ranges there
+
+empty = (math.inf, -math.inf) #the range of a variable that's never been set
+
+#Returns the set of variables in the program that can be integers
+def integerVariables (program):
+    places, assignments = expressionPlaces (program)
+    lets = {} #variable -> the expressions of the LETs that set it
+    inputs = set()
+    for statement in allStatementsInOrder (program.statements):
+        if type (statement) is Let:
+            lets.setdefault (statement.name, []).append (statement.expression)
+        elif type (statement) is Input:
+            inputs.add (statement.name)
+    
+    #which variables each variable's value is worked out from. A variable whose LETs read one that turns out not to be an integer has to be checked again
+    readers = {}
+    for name, expressions in lets.items():
+        for expression in expressions:
+            for read in expressionVariables (expression):
+                readers.setdefault (read, set()).add (name)
+    
+    #Every variable starts off as an integer & is crossed off once one of its LETs isn't an integer expression. Starting from all of
+    #them (rather than none) is what lets a loop counter like LET i = i + 1 be an integer, since it's only worked out from itself
+    #Then the ranges are checked, & the variables that can't be proven safe are crossed off too, which can cross off more (& change the ranges)
+    integers = {name for name in lets if name not in inputs}
+    pending = list (integers)
+    while True:
+        while pending:
+            name = pending.pop()
+            if name in integers and not all (isIntegerExpression (expression, integers) for expression in lets [name]):
+                integers.discard (name)
+                pending.extend (readers.get (name, ()))
+        
+        ranges = variableRanges (assignments, integers)
+        unproven = set()
+        for expression, guards in places:
+            evaluate (expression, integers, ranges, unproven, narrowed (guards, integers, ranges))
+        if not unproven:
+            return integers
+        integers -= unproven
+        pending = [reader for name in unproven for reader in readers.get (name, ())]
+
+#True if the expression only has integer literals & integer variables, with + - * between them
+def isIntegerExpression (expression, integers):
+    stack = [expression]
+    while stack:
+        node = stack.pop()
+        if type (node) is Number:
+            if literalType (node.text) != INT and literalType (node.text) != LONG:
+                return False
+        elif type (node) is Variable:
+            if node.name not in integers:
+                return False
+        elif type (node) is Unary:
+            stack.append (node.operand)
+        elif node.operator == "/":
+            return False
+        else:
+            stack.append (node.left)
+            stack.append (node.right)
+    return True
+
+#Every statement in the order it's written, with the body of each IF & WHILE where it is
+#Note to self: flow.allStatements() is quicker, but it hands out a body after the statements that follow its block
+def allStatementsInOrder (statements):
+    work = list (reversed (statements))
+    while work:
+        statement = work.pop()
+        yield statement
+        if type (statement) is If or type (statement) is While:
+            work.extend (reversed (statement.body))
+
+#Finds every expression in the program & the conditions that are true whenever it's worked out. Returns a list of (expression, guards)
+#for all of them, & a list of (variable, expression, guards) for the LETs. guards is a list of (condition, variable) pairs: an IF or
+#WHILE that the statement is in, whose condition still holds for that variable there because nothing can have changed it since the
+#condition was checked. That's not the case if the variable is set before the statement in the body (or anywhere in a loop around the
+#statement, inside the IF or WHILE), or if there's a LABEL there, which a GOTO could jump to without checking the condition
+def expressionPlaces (program):
+    order = list (allStatementsInOrder (program.statements))
+    ends = {} #IF/WHILE -> the position just after the last statement in its body
+    setAt = {} #variable -> the positions of the LETs & INPUTs that set it, in order
+    labels = [] #the positions of the LABELs, in order
+    unfinished = [] #the IFs & WHILEs whose bodies haven't ended yet, with how many of their statements are still to come
+    for position, statement in enumerate (order):
+        kind = type (statement)
+        if kind is Let or kind is Input:
+            setAt.setdefault (statement.name, []).append (position)
+        elif kind is Label:
+            labels.append (position)
+        while unfinished and unfinished [-1][1] == 0:
+            ends [unfinished.pop()[0]] = position
+        if unfinished:
+            unfinished [-1][1] -= 1
+        if kind is If or kind is While:
+            unfinished.append ([statement, len (statement.body)])
+    while unfinished:
+        ends [unfinished.pop()[0]] = len (order)
+    
+    places = []
+    assignments = []
+    active = [] #the IFs & WHILEs around the statement, outermost first, as (statement, position)
+    for position, statement in enumerate (order):
+        while active and ends [active [-1][0]] <= position:
+            active.pop()
+        kind = type (statement)
+        if kind is While:
+            #the condition is checked again after each time round, so what the body sets counts for the conditions outside it
+            active.append ((statement, position))
+            places.append ((statement.condition, guardsAt (active, position, ends, setAt, labels, statement)))
+        elif kind is If:
+            places.append ((statement.condition, guardsAt (active, position, ends, setAt, labels)))
+            active.append ((statement, position))
+        elif kind is Let:
+            guards = guardsAt (active, position, ends, setAt, labels)
+            places.append ((statement.expression, guards))
+            assignments.append ((statement.name, statement.expression, guards))
+        elif kind is Print:
+            places.append ((statement.expression, guardsAt (active, position, ends, setAt, labels)))
+    return places, assignments
+
+#The guards (see expressionPlaces) for the statement at position, from the innermost maxGuards of the IFs & WHILEs around it
+#loop is a WHILE whose own condition is being worked out, which is around the statement but doesn't guard it
+def guardsAt (active, position, ends, setAt, labels, loop = None):
+    guards = []
+    end = position #anything set from just after the IF or WHILE up to here could have changed the variable
+    for statement, start in reversed (active [-maxGuards:]):
+        label = bisect_right (labels, start)
+        if label < len (labels) and labels [label] < end:
+            break #a GOTO could jump in without checking this condition (or the ones outside it)
+        condition = statement.condition
+        if statement is not loop and type (condition) is Binary and condition.operator in comparisons:
+            for side in (condition.left, condition.right):
+                if type (side) is Variable:
+                    positions = setAt.get (side.name, ())
+                    changed = bisect_right (positions, start)
+                    if changed == len (positions) or positions [changed] >= end:
+                        guards.append ((condition, side.name))
+        if type (statement) is While:
+            end = max (end, ends [statement])
+    return guards
+
+#The ranges the guards' conditions narrow the integer variables down to (eg. i < 10 narrows i to at most 9), as variable -> (lowest, highest)
+def narrowed (guards, integers, ranges):
+    result = {}
+    for condition, name in guards:
+        if name not in integers:
+            continue
+        if type (condition.left) is Variable and condition.left.name == name:
+            operator, other = condition.operator, condition.right
+        else:
+            operator, other = swapped [condition.operator], condition.left
+        value = evaluate (other, integers, ranges)
+        if value is None or operator == "!=":
+            continue
+        low, high = result.get (name, ranges.get (name, empty))
+        if value [0] > value [1]:
+            low, high = empty
+        elif operator == "<":
+            high = min (high, value [1] - 1)
+        elif operator == "<=":
+            high = min (high, value [1])
+        elif operator == ">":
+            low = max (low, value [0] + 1)
+        elif operator == ">=":
+            low = max (low, value [0])
+        else:
+            low, high = max (low, value [0]), min (high, value [1])
+        result [name] = (low, high)
+    return result
+
+#The range of values each integer variable can have, as variable -> (lowest, highest), found by going over the LETs until the ranges
+#stop growing. A range that keeps growing (eg. a loop counter) is widened to have no limit on the side that grew, & is then narrowed
+#back down by working every range out again from the LETs & the conditions around them (so LET i = i + 1 in WHILE i < 10 gives 0 to 10)
+#Note to self: a variable that's read before it's set has no value to speak of in C, so the ranges only cover the values it's set to
+def variableRanges (assignments, integers):
+    assignments = [assignment for assignment in assignments if assignment [0] in integers]
+    ranges = {}
+    growth = {} #variable -> how many times its range has grown
+    changed = True
+    while changed:
+        changed = False
+        for name, expression, guards in assignments:
+            low, high = assignedRange (name, expression, guards, integers, ranges)
+            old = ranges.get (name, empty)
+            if low >= old [0] and high <= old [1]:
+                continue
+            growth [name] = growth.get (name, 0) + 1
+            if growth [name] > maxGrowth:
+                low = -math.inf if low < old [0] else old [0]
+                high = math.inf if high > old [1] else old [1]
+            ranges [name] = (min (low, old [0]), max (high, old [1]))
+            changed = True
+    
+    #each time round uses the ranges from the time before, so they can only get smaller & still hold every value
+    for i in range (maxGrowth):
+        smaller = {}
+        for name, expression, guards in assignments:
+            low, high = assignedRange (name, expression, guards, integers, ranges)
+            old = smaller.get (name, empty)
+            smaller [name] = (min (low, old [0]), max (high, old [1]))
+        if smaller == ranges:
+            break
+        ranges = smaller
+    return ranges
+
+#The range of values a LET can set its variable to, as far as the variable's range goes. A LET that can only make the variable smaller
+#(eg. LET x = x - 997) never sets it higher than a value it already had, so it's left out of the highest value (& the other way round
+#for one that can only make it bigger). That's what gives x a range in WHILE x > 1000 REPEAT LET x = x - 997 ENDWHILE
+def assignedRange (name, expression, guards, integers, ranges):
+    narrowing = narrowed (guards, integers, ranges)
+    value = evaluate (expression, integers, ranges, narrowing = narrowing)
+    if value is None:
+        return -math.inf, math.inf
+    low, high = value [0], value [1]
+    step = None
+    if type (expression) is Binary and expression.operator in ("+", "-"):
+        if type (expression.left) is Variable and expression.left.name == name:
+            step = evaluate (expression.right, integers, ranges, narrowing = narrowing)
+            if step is not None and expression.operator == "-":
+                step = (-step [1], -step [0])
+        elif type (expression.right) is Variable and expression.right.name == name and expression.operator == "+":
+            step = evaluate (expression.left, integers, ranges, narrowing = narrowing)
+    if step is not None and step [0] <= step [1]:
+        if step [1] <= 0:
+            high = -math.inf
+        if step [0] >= 0:
+            low = math.inf
+    return low, high
+
+#Works out the range of values an expression can have as (lowest, highest, type), with the type being INT or LONG for a constant
+#(which C works out the same way either way) & None otherwise, or None if it isn't worked out with integers in the C code (eg. it has
+#a float in it or is a division). narrowing has the narrower ranges of the variables the conditions around the expression have narrowed
+#When it's checking (unproven isn't None), a part that can go past a long long or be -0 adds the integer variables to blame for it to
+#unproven & is treated as a float from there on
+def evaluate (expression, integers, ranges, unproven = None, narrowing = {}):
+    values = {}
+    stack = [(expression, False)]
+    while stack:
+        node, ready = stack.pop()
+        kind = type (node)
+        if kind is Binary and not ready:
+            stack.append ((node, True))
+            stack.append ((node.right, False))
+            stack.append ((node.left, False))
+            continue
+        if kind is Unary and not ready:
+            stack.append ((node, True))
+            stack.append ((node.operand, False))
+            continue
+        
+        wrong = False
+        if kind is Number:
+            numberKind = literalType (node.text)
+            value = None
+            if numberKind == INT or numberKind == LONG:
+                value = (int (node.text), int (node.text), numberKind)
+        elif kind is Variable:
+            value = None
+            if node.name in integers:
+                value = narrowing.get (node.name, ranges.get (node.name, empty)) + (None,)
+        elif kind is Unary:
+            value = unaryRange (node.operator, values.pop (node.operand))
+            wrong = goesWrong (value) or (node.operator == "-" and canBeZero (value))
+        else:
+            left, right = values.pop (node.left), values.pop (node.right)
+            value = binaryRange (node.operator, left, right)
+            #x * y is -0 as a float when one side is 0 & the other is negative
+            wrong = goesWrong (value) or (node.operator == "*" and canBeZero (value) and (left [0] <= 0 <= left [1] and right [0] < 0 or right [0] <= 0 <= right [1] and left [0] < 0))
+        if wrong and unproven is not None:
+            #a variable with no limit on its range (eg. a sum that's never checked) is the one to blame, otherwise it's all of them
+            read = expressionVariables (node) & integers
+            unproven |= {name for name in read if math.inf in map (abs, ranges.get (name, empty))} or read
+            value = None
+        values [node] = value
+    return values [expression]
+
+#The range of "operator operand" (see evaluate)
+def unaryRange (operator, operand):
+    if operand is None or operator == "+":
+        return operand
+    low, high, kind = operand
+    if kind is not None:
+        return -low, -low, kind
+    return -high, -low, None
+
+#The range of "left operator right" (see evaluate)
+def binaryRange (operator, left, right):
+    if operator in comparisons:
+        return 0, 1, None #a comparison is 1 or 0 in C, whatever it compares
+    if left is None or right is None:
+        return None
+    if left [2] is not None and right [2] is not None:
+        kind = max (left [2], right [2])
+        value = arithmetic (operator, left [0], right [0], kind)
+        return None if value is None else (value, value, kind)
+    if operator == "/":
+        return None #a float division (see CGenerator.isFloatDivision)
+    if left [0] > left [1] or right [0] > right [1]:
+        return empty + (None,)
+    
+    if operator == "+":
+        return left [0] + right [0], left [1] + right [1], None
+    if operator == "-":
+        return left [0] - right [1], left [1] - right [0], None
+    products = [multiply (a, b) for a in left [:2] for b in right [:2]]
+    return min (products), max (products), None
+
+#True if a part of an expression that isn't a constant can go past a long long
+def goesWrong (value):
+    return value is not None and value [2] is None and value [0] <= value [1] and (value [0] < LONG_MIN or value [1] > LONG_MAX)
+
+#True if a range that isn't a constant has 0 in it (a constant is worked out as an int either way, so it can't be -0)
+def canBeZero (value):
+    return value is not None and value [2] is None and value [0] <= 0 <= value [1]
+
+#a * b where a side with no limit (inf) times 0 is 0, which is what it is for any number the range could have
+def multiply (a, b):
+    if a == 0 or b == 0:
+        return 0
+    return a * b
+
+#The names of the variables an expression reads
+def expressionVariables (node):
+    read = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if type (node) is Variable:
+            read.add (node.name)
+        elif type (node) is Binary:
+            stack.append (node.left)
+            stack.append (node.right)
+        elif type (node) is Unary:
+            stack.append (node.operand)
+    return read
@@ -1,4 +1,6 @@
+from diagnostics import *
 import enum
+import re
 import sys
 
 #Note to self: init stands for initialization & is a constructor (therefore is used in OOP to create & initialze an object, ie. instance of a class)
@@ -18,6 +20,8 @@ class Lexer:
         self.source = source + '\n' #this adds the source code to the lexer as a string, and a newline character is appended in order to simpify lexing/parsing the last token/statement
         self.curChar = "" #current character in the string 
         self.curPos = -1 #current position in the string 
+        self.line = 1 #line number of the current position, used to give every token its source position
+        self.lineStart = 0 #position in the string where the current line starts
         self.nextChar() #VERY IMPORTANT note to self: the _init_ method is called automatically when the class of the object is created, therefore it will also call on the nextChar() method
         
     #Processing the next character
@@ -34,9 +38,13 @@ class Lexer:
             return '\0'
         return self.source [self.curPos + 1]
             
-    #If an invalid token is found, then print an error message and exit 
-    def abort (self, message):
-        sys.exit ("Lexing error. "+message) #Note to self: As a part of the sys module, you can terminate a program using sys.exit([status])
+    #If an invalid token is found, raise an error that says where it is (from start, the position the token began at, up to the current character)
+    #The rest of the line is skipped first, so that the parser can carry on lexing from the next line & find any other errors too
+    def abort (self, message, start):
+        error = Diagnostic ("Lexing error. " + message, self.line, start - self.lineStart + 1, self.curPos - self.lineStart + 2)
+        while self.curChar != '\n' and self.curChar != '\0':
+            self.nextChar()
+        raise error
     
     #Skip whitespaces except newlines, which will be used to indicate the end of a sentence 
     def skipWhitespace (self):
@@ -60,6 +68,7 @@ class Lexer:
         #skip everytime you encounter a comment 
         self.skipComment()
         
+        tokenStart = self.curPos #remember where the token begins so that we can record its line & column
         token = None #Note to self: none is used to define a null value in Python
         
         #checking the first character of the token to see if we can decide what it is 
@@ -105,7 +114,7 @@ class Lexer:
                 self.nextChar()
                 token = Token (lastChar + self.curChar, TokenType.NOTEQ)
             else:
-                self.abort("Expected !=, got !" + self.peek())
+                self.abort("Expected !=, got !" + self.peek(), tokenStart)
         
         #supports printing a string - which starts with a double quotation mark up until the 2nd double quotation mark
         elif self.curChar == '\"':
@@ -118,7 +127,7 @@ class Lexer:
                 #No special characters are allowed in the string, including no escape characters, newlines, tabs or %
                 #we're using C's printf on this sting
                 if self.curChar == '\r' or self.curChar == '\n' or self.curChar == '\t' or self.curChar == '\\' or self.curChar == '%':
-                    self.abort ("Illegal character in the string")
+                    self.abort ("Illegal character in the string", tokenStart)
                 self.nextChar()
             tokText = self.source [startPos:self.curPos] #this slices the source string from the beginning of the " to the end of " (start and end of string)"
             token = Token (tokText, TokenType.STRING)
@@ -136,7 +145,7 @@ class Lexer:
                 #ensure that you have atleast one digit after the decimal to be valid
                 if not self.peek().isdigit():
                     #you get an error if it's not a digit 
-                    self.abort("Illegal character in number.")
+                    self.abort("Illegal character in number.", tokenStart)
                 while self.peek().isdigit():
                     self.nextChar()
             tokText = self.source [startPos:self.curPos + 1] #Note to self: remember string slicing goes up to the value before itself
@@ -152,7 +161,7 @@ class Lexer:
             tokText = self.source [startPos : self.curPos + 1] #getting the substring of text
             keyword = Token.checkIfKeyword(tokText)
             if keyword == None: #This means it's an identifier
-                token = Token (tokText, TokenType.IDENT)  
+                token = Token (sys.intern (tokText), TokenType.IDENT) #Note to self: sys.intern() keeps one shared copy of each identifier's text
             else:
                 token = Token (tokText, keyword)
                                                             
@@ -162,25 +171,37 @@ class Lexer:
             token = Token ("", TokenType.EOF)
         else:
             #unknown token!
-            self.abort ("Unknown token: " + self.curChar)
+            self.abort ("Unknown token: " + self.curChar, tokenStart)
+        token.line = self.line
+        token.col = tokenStart - self.lineStart + 1
+        if token.kind == TokenType.NEWLINE:
+            self.line += 1
+            self.lineStart = self.curPos + 1
         self.nextChar()
         return token
 
 class Token:
-    """This is a token class that keeps track of what type of token it is & the exact text from the code"""
+    """This is a token class that keeps track of what type of token it is, the exact text from the code & where it was found"""
+    
+    #Note to self: __slots__ gives every Token a fixed set of fields instead of a per-instance __dict__, so each token takes a lot less memory
+    __slots__ = ("text", "kind", "line", "col")
     
-    def __init__(self, tokenText, tokenKind):
+    def __init__(self, tokenText, tokenKind, line = 0, col = 0):
         self.text = tokenText #the token's actual text. Used for identifiers, strings & numbers 
         self.kind = tokenKind #the "type" of token that this will be identified as
+        self.line = line #line (starting at 1) where the token begins
+        self.col = col #column (starting at 1) where the token begins
         
+    #the column just after the token, for showing which part of a line an error is about (a string's text doesn't include its quotes)
+    def endCol (self):
+        if self.kind == TokenType.STRING:
+            return self.col + len (self.text) + 2
+        return self.col + max (len (self.text), 1)
+    
     @staticmethod #method that belongs to a class rather than an instance of a class (doesn't take self as a parameter) 
     #it's used when the method logic is related to the class but does not need access to the instance or class attributes
     def checkIfKeyword(tokenText):
-        for kind in TokenType:
-            #relies on all enumvalues being 1xx
-            if kind.name == tokenText and kind.value >= 100 and kind.value < 200:
-                return kind
-        return None
+        return keywordKinds.get (tokenText) #None if it isn't a keyword
 
 #TokenType is our enum for all types of tokens
 #Note to self: we've imported the entire enum module, hence need to use "enum.Enum" in order to access the Enum class
@@ -214,11 +235,104 @@ class TokenType(enum.Enum):
         LTEQ = 209
         GT = 210
         GTEQ = 211
+
+#Index of every keyword by its text, built once when the module is imported so that looking up a keyword doesn't have to scan the whole enum
+#relies on all keyword enum values being 1xx
+keywordKinds = {kind.name: kind for kind in TokenType if kind.value >= 100 and kind.value < 200}
+
+
+#FastLexer is a drop-in replacement for Lexer that hands back exactly the same tokens, but instead of walking through the
+#source one character at a time with nextChar() & peek(), it matches a whole token (plus the whitespace & comment in front of it) in one step
+#Anything the master regex can't match (errors, EOF, identifiers & numbers with non-ASCII characters) falls back to Lexer.getToken
+class FastLexer(Lexer):
+    
+    """This class lexes the same language as Lexer using one compiled master regex instead of an if/elif chain."""
+    
+    #Note to self: re.VERBOSE lets the pattern be spread over several lines (whitespace outside of [] is ignored, hence the escaped \#)
+    #The lookaheads stop a number or identifier from being cut short, eg. "1." must still reach Lexer so that it reports the illegal number
+    tokenRegex = re.compile (r"""[ \t\r]*(?:\#[^\n]*)?(?:
+          (?P<NUMBER>[0-9]+\.[0-9]+(?![0-9]|[^\x00-\x7f])|[0-9]+(?![.0-9]|[^\x00-\x7f]))
+        | (?P<IDENT>[A-Za-z][A-Za-z0-9]*(?![A-Za-z0-9]|[^\x00-\x7f]))
+        | "(?P<STRING>[^"\r\n\t\\%]*)"
+        | (?P<OP>[=<>!]=|[-+*/=<>\n])
+    )""", re.VERBOSE)
+    
+    #the regex group name (or the operator text) tells us the token type directly, without going through the if/elif chain
+    operatorKinds = {
+        "+": TokenType.PLUS, "-": TokenType.MINUS, "*": TokenType.ASTERISK, "/": TokenType.SLASH,
+        "=": TokenType.EQ, "==": TokenType.EQEQ, "!=": TokenType.NOTEQ,
+        "<": TokenType.LT, "<=": TokenType.LTEQ, ">": TokenType.GT, ">=": TokenType.GTEQ,
+        "\n": TokenType.NEWLINE,
+    }
+    
+    # Return the next token
+    def getToken (self):
+        match = self.tokenRegex.match (self.source, self.curPos)
+        if match is None:
+            return Lexer.getToken (self) #the slow path knows how to report errors & the EOF
         
+        group = match.lastgroup
+        tokText = match.group (group)
+        tokenStart = match.start (group)
+        col = tokenStart - self.lineStart + 1
+        if group == "IDENT":
+            keyword = keywordKinds.get (tokText)
+            if keyword is None:
+                token = Token (sys.intern (tokText), TokenType.IDENT, self.line, col)
+            else:
+                token = Token (keyword.name, keyword, self.line, col) #keyword names are already interned by the enum
+        elif group == "OP":
+            kind = self.operatorKinds [tokText]
+            token = Token (tokText, kind, self.line, col)
+            if kind == TokenType.NEWLINE:
+                self.line += 1
+                self.lineStart = tokenStart + 1
+        elif group == "STRING":
+            token = Token (tokText, TokenType.STRING, self.line, col - 1) #the token starts at the opening quote
+        else:
+            token = Token (tokText, TokenType.NUMBER, self.line, col)
         
-        
-        
+        #move past the token, keeping curChar up to date in case the next token needs the slow path
+        self.curPos = match.end()
+        self.curChar = self.source [self.curPos] if self.curPos < len (self.source) else '\0'
+        return token
+
+
+#StreamLexer lexes a file a line at a time instead of reading the whole thing into one string first, so memory stays bounded however big the program is
+#This works because no Teeny Tiny token can span more than one line (strings & comments both stop at a newline)
+class StreamLexer(FastLexer):
     
+    """This class hands out the same tokens as FastLexer while reading the source from a file object one line at a time."""
     
-
-    
\ No newline at end of file
+    def __init__ (self, inputFile):
+        self.lines = iter (inputFile) #Note to self: iterating over a file object reads it in buffered chunks & gives back one line at a time
+        self.needsFinalNewline = True #Lexer appends a newline to the source, so we add one extra line once the file runs out
+        self.source = ""
+        self.curChar = '\0'
+        self.curPos = 0
+        self.line = 1
+        self.lineStart = 0
+    
+    #Loads the next line of the file as the source to lex, returns False once there are no lines left
+    def nextLine (self):
+        line = next (self.lines, None)
+        if line is None:
+            if not self.needsFinalNewline:
+                return False
+            line = '\n'
+            self.needsFinalNewline = False
+        elif not line.endswith ('\n'):
+            line += '\n' #only the last line of a file can be missing its newline, and that one newline is all Lexer would add
+            self.needsFinalNewline = False
+        self.source = line
+        self.curPos = 0
+        self.curChar = line [0]
+        self.lineStart = 0
+        return True
+    
+    # Return the next token
+    def getToken (self):
+        while self.curPos >= len (self.source):
+            if not self.nextLine():
+                return Token ("", TokenType.EOF, self.line, 1)
+        return FastLexer.getToken (self)
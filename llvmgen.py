@@ -0,0 +1,295 @@
+from tree import *
+from cmodel import *
+from cgen import CGenerator
+from vm import fold, wrap
+import struct
+
+#LLVMGenerator walks the abstract syntax tree like CGenerator does, but emits LLVM IR (a .ll file) through the Emitter instead of C
+#(see --target in teenytiny.py). llc turns the IR straight into assembly or an object file, without a C compiler having to parse a
+#big program's C code first, or lli runs it straight away:
+#   python3 teenytiny.py program.tiny --target llvm -o program.ll
+#   llc -O2 -relocation-model=pic program.ll -o program.s && gcc program.s -o program
+#
+#The program does exactly what the C code does: numbers, variables & operators have the same C types (see cmodel.py), with the same
+#conversions between them, and PRINT & INPUT call the same printf & scanf. Every variable is an alloca at the top of main, each
+#LABEL starts a basic block that GOTO branches to, and IFs & WHILEs are branches between blocks
+#The one thing that can come out differently is the sign of a nan: LLVM doesn't keep track of it (it can work out inf - inf while
+#compiling, or swap the sides of a * when both are nans), so where the C program prints "-nan" this one can print "nan"
+#Note to self: the IR uses opaque pointers ("ptr"), which LLVM 15 & later read by default. LLVM 14 needs llc -opaque-pointers
+
+#the LLVM type for each C type
+types = {INT: "i32", LONG: "i64", FLOAT: "float", DOUBLE: "double"}
+
+#the instructions for each operator, on integers & on floating point numbers
+integerInstructions = {"+": "add", "-": "sub", "*": "mul", "/": "sdiv"}
+floatInstructions = {"+": "fadd", "-": "fsub", "*": "fmul", "/": "fdiv"}
+integerComparisons = {"==": "eq", "!=": "ne", "<": "slt", "<=": "sle", ">": "sgt", ">=": "sge"}
+#Note to self: the ordered comparisons are false when either side is a nan, like C's, except != (une) which is true
+floatComparisons = {"==": "oeq", "!=": "une", "<": "olt", "<=": "ole", ">": "ogt", ">=": "oge"}
+
+#the text of a constant of the given type. LLVM wants floats & doubles written as the bits of a double (in hex), so they're exact
+def constantText (kind, value):
+    if kind == INT or kind == LONG:
+        return str (value)
+    return "0x%016X" % struct.unpack ('<Q', struct.pack ('<d', value))[0]
+
+#an LLVM array constant holding the text, with the \0 at the end that C strings have
+def stringConstant (text):
+    data = text.encode() + b"\0"
+    escaped = "".join (chr (byte) if 32 <= byte < 127 and byte != 34 and byte != 92 else "\\%02X" % byte for byte in data)
+    return "[%d x i8] c\"%s\"" % (len (data), escaped)
+
+class LLVMGenerator(CGenerator):
+    def __init__(self, emitter, integers = ()):
+        CGenerator.__init__(self, emitter, integers)
+        self.values = 0 #how many %t values there are. Each one is only ever assigned once, as LLVM needs
+        self.blocks = 0 #how many %b blocks there are
+        self.open = True #False after a branch, until the next block starts, since a branch has to be the last thing in a block
+        self.constants = {} #the name of each string's constant, which are written after main
+    
+    #the start of the module: the C library functions that are called, their format strings & the start of main
+    def begin (self):
+        self.emitter.headerLine ("declare i32 @printf(ptr, ...)")
+        self.emitter.headerLine ("declare i32 @scanf(ptr, ...)")
+        self.emitter.headerLine ("declare i32 @puts(ptr)")
+        self.emitter.headerLine ("declare void @llvm.trap()")
+        self.emitter.headerLine ("@.float = private unnamed_addr constant " + stringConstant ("%.2f\n"))
+        self.emitter.headerLine ("@.integer = private unnamed_addr constant " + stringConstant ("%lld.00\n"))
+        self.emitter.headerLine ("@.read = private unnamed_addr constant " + stringConstant ("%f"))
+        self.emitter.headerLine ("@.skip = private unnamed_addr constant " + stringConstant ("%*s"))
+        self.emitter.headerLine ("define i32 @main() {")
+        self.emitter.headerLine ("entry:")
+    
+    #the end of main, then the strings that PRINT uses (a module's constants can come after the functions that use them)
+    def end (self):
+        if self.open:
+            self.emitter.emitLine ("  ret i32 0")
+        self.emitter.emitLine ("}")
+        for text, name in self.constants.items():
+            self.emitter.emitLine (name + " = private unnamed_addr constant " + stringConstant (text))
+    
+    #every variable is an alloca at the top of main, which starts off as 0
+    def declare (self, name):
+        if name not in self.declared:
+            self.declared.add (name)
+            kind = self.variableKind (name)
+            self.emitter.headerLine ("  %v." + name + " = alloca " + types [kind])
+            self.emitter.headerLine ("  store " + types [kind] + " " + constantText (kind, 0) + ", ptr %v." + name)
+    
+    def variableKind (self, name):
+        return LONG if name in self.integers else FLOAT
+    
+    #The method for an IF or WHILE emits what comes before its body, and returns the body with a function that finishes the block
+    #once the body's been emitted. They're walked here with a stack instead of by recursion, like BytecodeCompiler.statement
+    def statement (self, node):
+        work = [node]
+        while work:
+            node = work.pop()
+            if callable (node):
+                node()
+                continue
+            block = self.statementMethods [type (node)] (node)
+            if block is not None:
+                body, finish = block
+                work.append (finish)
+                work.extend (reversed (body))
+    
+    #emits an instruction. Anything after a branch can't be reached, but it still has to be in a block of its own
+    def instruction (self, text):
+        if not self.open:
+            self.startBlock (self.newBlock())
+        self.emitter.emitLine ("  " + text)
+    
+    #emits an instruction that gives a value & returns the value's name
+    def value (self, text):
+        self.values += 1
+        name = "%t" + str (self.values)
+        self.instruction (name + " = " + text)
+        return name
+    
+    def newBlock (self):
+        self.blocks += 1
+        return "b" + str (self.blocks)
+    
+    #branches to a block, unless the block before has already ended with a branch
+    def jump (self, block):
+        if self.open:
+            self.emitter.emitLine ("  br label %" + block)
+        self.open = False
+    
+    #starts a block, which the block before it falls through to
+    def startBlock (self, block):
+        self.jump (block)
+        self.emitter.emitLine (block + ":")
+        self.open = True
+    
+    # "PRINT" string - puts adds the newline itself
+    def printString (self, node):
+        if node.text not in self.constants:
+            self.constants [node.text] = "@.str" + str (len (self.constants))
+        self.instruction ("call i32 @puts(ptr " + self.constants [node.text] + ")")
+    
+    # "PRINT" expression - the value is rounded to a float & printed with printf, like the C code does
+    def printExpression (self, node):
+        if self.integers and self.isIntegerPrint (node.expression):
+            value = self.operand (node.expression, LONG)
+            self.instruction ("call i32 (ptr, ...) @printf(ptr @.integer, i64 " + value + ")")
+        else:
+            value = self.value ("fpext float " + self.operand (node.expression, FLOAT) + " to double")
+            self.instruction ("call i32 (ptr, ...) @printf(ptr @.float, double " + value + ")")
+    
+    # "IF" comparision "THEN" {statement} "ENDIF"
+    def ifStatement (self, node):
+        then = self.newBlock()
+        after = self.newBlock()
+        self.branch (node.condition, then, after)
+        self.startBlock (then)
+        def finish ():
+            self.startBlock (after)
+        return node.body, finish
+    
+    # "WHILE" comparision "REPEAT" {statement} "ENDWHILE"
+    def whileStatement (self, node):
+        test = self.newBlock()
+        loop = self.newBlock()
+        after = self.newBlock()
+        self.startBlock (test)
+        self.branch (node.condition, loop, after)
+        self.startBlock (loop)
+        def finish ():
+            self.jump (test)
+            self.startBlock (after)
+        return node.body, finish
+    
+    # "LABEL" ident
+    def label (self, node):
+        self.startBlock ("l." + node.name)
+    
+    # "GOTO" ident
+    def goto (self, node):
+        if not self.open:
+            self.startBlock (self.newBlock())
+        self.jump ("l." + node.name)
+    
+    # "LET" ident "=" expression - the value is converted to the variable's type as it's stored
+    def let (self, node):
+        self.declare (node.name)
+        kind = self.variableKind (node.name)
+        self.instruction ("store " + types [kind] + " " + self.operand (node.expression, kind) + ", ptr %v." + node.name)
+    
+    # "INPUT" ident - like the C code, scanf reads the number & when it isn't one the variable is set to 0 & the word is skipped
+    def input (self, node):
+        self.declare (node.name)
+        result = self.value ("call i32 (ptr, ...) @scanf(ptr @.read, ptr %v." + node.name + ")")
+        failed = self.value ("icmp eq i32 " + result + ", 0")
+        invalid = self.newBlock()
+        after = self.newBlock()
+        self.instruction ("br i1 " + failed + ", label %" + invalid + ", label %" + after)
+        self.open = False
+        self.startBlock (invalid)
+        self.instruction ("store float 0.0, ptr %v." + node.name)
+        self.instruction ("call i32 (ptr, ...) @scanf(ptr @.skip)")
+        self.startBlock (after)
+    
+    #Branches to one block if the condition is true & another if it isn't. A comparison gives the i1 to branch on straight away,
+    #anything else is true when it isn't 0 (as in C)
+    def branch (self, node, whenTrue, whenFalse):
+        if type (node) is Binary and node.operator in comparisons:
+            test = self.comparison (node)
+        else:
+            kind, value, constant = self.expression (node)
+            if kind == INT or kind == LONG:
+                test = self.value ("icmp ne " + types [kind] + " " + value + ", 0")
+            else:
+                test = self.value ("fcmp une " + types [kind] + " " + value + ", 0.0")
+        self.instruction ("br i1 " + test + ", label %" + whenTrue + ", label %" + whenFalse)
+        self.open = False
+    
+    #the i1 that a comparison gives. Both sides are converted to the bigger of their types first
+    def comparison (self, node):
+        left = self.expression (node.left)
+        right = self.expression (node.right)
+        kind = max (left [0], right [0])
+        a = self.convert (left, kind)
+        b = self.convert (right, kind)
+        if kind == INT or kind == LONG:
+            return self.value ("icmp " + integerComparisons [node.operator] + " " + types [kind] + " " + a + ", " + b)
+        return self.value ("fcmp " + floatComparisons [node.operator] + " " + types [kind] + " " + a + ", " + b)
+    
+    #Emits the instructions for an expression & returns its (kind, value, constant). value is the LLVM text for the result (a %t name
+    #or a constant), and constant is the number itself for a number, or None. As with C, the kind is the C type of the result
+    #Note to self: an operator on two numbers is worked out here (like BytecodeCompiler does), because LLVM would work out 0.0 / 0 as a
+    #nan without the sign bit that x86 gives it at runtime (see divide in cmodel.py), and printf would show "nan" instead of "-nan"
+    def expression (self, node):
+        if type (node) is Number:
+            kind = literalType (node.text)
+            value = literalValue (node.text)
+            if kind is None:
+                kind = LONG #too big even for a long (see BytecodeCompiler.expression)
+                value = wrap (value, LONG)
+            return kind, constantText (kind, value), value
+        
+        if type (node) is Variable:
+            kind = self.variableKind (node.name)
+            return kind, self.value ("load " + types [kind] + ", ptr %v." + node.name), None
+        
+        if type (node) is Unary:
+            kind, value, constant = self.expression (node.operand)
+            if node.operator == "+":
+                return kind, value, constant
+            if constant is not None:
+                constant = wrap (-constant, kind) if kind == INT or kind == LONG else -constant
+                return kind, constantText (kind, constant), constant
+            if kind == INT or kind == LONG:
+                return kind, self.value ("sub " + types [kind] + " 0, " + value), None
+            return kind, self.value ("fneg " + types [kind] + " " + value), None
+        
+        if node.operator in comparisons:
+            return INT, self.value ("zext i1 " + self.comparison (node) + " to i32"), None
+        
+        left = self.expression (node.left)
+        right = self.expression (node.right)
+        kind = max (left [0], right [0])
+        if self.integers and node.operator == "/" and self.isFloatDivision (node):
+            kind = FLOAT #the C code casts the left side to a float (see CGenerator.expression)
+        if left [2] is not None and right [2] is not None:
+            value = fold (node.operator, left [2], right [2], kind)
+            if value is not None:
+                return kind, constantText (kind, value), value
+        if kind <= LONG and node.operator == "/" and (right [2] == 0 or (left [2] is not None and right [2] is not None)):
+            self.trap()
+            return kind, "0", 0
+        a = self.convert (left, kind)
+        b = self.convert (right, kind)
+        if kind == INT or kind == LONG:
+            instruction = integerInstructions [node.operator]
+        else:
+            instruction = floatInstructions [node.operator]
+        return kind, self.value (instruction + " " + types [kind] + " " + a + ", " + b), None
+    
+    #Converts an expression's (kind, value, constant) to kind, the way C converts the operands of an operator. A number is converted
+    #here rather than with an instruction, as long as Python's float gets it exactly right (an integer over 2^53 would be rounded twice)
+    def convert (self, operand, kind):
+        operandKind, value, constant = operand
+        if operandKind == kind:
+            return value
+        if constant is not None and (operandKind >= FLOAT or abs (constant) <= 2 ** 53):
+            return constantText (kind, convert (constant, kind))
+        if kind == LONG:
+            return self.value ("sext i32 " + value + " to i64")
+        if operandKind == INT or operandKind == LONG:
+            return self.value ("sitofp " + types [operandKind] + " " + value + " to " + types [kind])
+        if kind == FLOAT:
+            return self.value ("fptrunc double " + value + " to float")
+        return self.value ("fpext float " + value + " to double")
+    
+    #Integer division by zero crashes a C program. LLVM is free to leave out a division like that (its result is undefined), so the
+    #IR crashes on purpose instead. Note to self: llvm.trap is SIGILL rather than the SIGFPE the C program dies of
+    def trap (self):
+        self.instruction ("call void @llvm.trap()")
+        self.instruction ("unreachable")
+        self.open = False
+    
+    #emits the expression & returns its value converted to kind
+    def operand (self, node, kind):
+        return self.convert (self.expression (node), kind)
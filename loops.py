@@ -0,0 +1,354 @@
+from tree import *
+from cmodel import *
+from flow import allStatements
+
+#Loop optimizations for -O3 (see optimize.py), done on the whole program once the other passes are finished
+#   invariant conditions  a part of a WHILE's condition that is the same every time round (eg. the n * 2 in WHILE i < n * 2) is worked
+#                         out once before the loop, into a variable of its own
+#   invariant LETs        a LET in the body whose value is the same every time round (eg. LET scale = size / 2, when size never changes
+#                         in the loop) is moved to just before the loop. Unless the loop is known to run at least once, it goes into an
+#                         IF with the loop's condition, so that it still only happens if the loop runs
+#   counting loops        a loop like WHILE i < 10 ... LET i = i + 1 ENDWHILE is recognised, and when the start & the end are both
+#                         constants the number of times it goes round is worked out (with C's float rounding, see cmodel.py)
+#   unrolling             a counting loop that goes round only a few times, with a small body, is replaced by that many copies of its body
+#A loop is left alone if there's a LABEL anywhere in its body, since a GOTO could jump into the middle of it. Like the other passes,
+#every change keeps exactly what the generated code would have printed
+#Note to self: the new variables' names have an underscore in them, which a Teeny Tiny identifier can't, so they can't clash
+
+maxUnrollCount = 8 #the most times round a loop can go & still be unrolled
+maxUnrollStatements = 64 #the most statements the copies of an unrolled loop's body can add up to
+
+#Optimizes every WHILE in the program. Returns a list of (the WHILE's line, what was done to it) for the loops that changed, a list of
+#(line, what was found out about it) for the counting loops that were recognised but left as they were, & how many loops there were
+#The blocks are done from the innermost out (allStatements() hands out every IF/WHILE before the ones in its body), so a loop's body is
+#already optimized by the time the loop itself is, & the summary of what each body does is made from the summaries of the blocks in it
+#instead of walking the whole body again for every loop around it
+def optimizeLoops (program):
+    optimizer = LoopOptimizer (program)
+    blocks = [statement for statement in allStatements (program.statements) if type (statement) is If or type (statement) is While]
+    for block in reversed (blocks):
+        block.body = optimizer.block (block.body)
+        optimizer.bodies [block] = optimizer.summary (block.body)
+    program.statements = optimizer.block (program.statements)
+    return optimizer.changes, optimizer.unchanged, optimizer.loops
+
+#What a list of statements does, which is all the loop optimizations need to know about a body. The sets of variables are bit masks
+#with a bit for each variable (see LoopOptimizer.mask), so that putting a deeply nested body's summary together from the summaries
+#of the blocks in it stays quick even when every level has variables of its own
+class Summary:
+    __slots__ = ("once", "many", "read", "labels", "gotos", "size")
+    
+    def __init__(self):
+        self.once = 0 #the variables that are set (by LET or INPUT) exactly once
+        self.many = 0 #the variables that are set more than once
+        self.read = 0 #the variables that are read
+        self.labels = False #True if there's a LABEL
+        self.gotos = False #True if there's a GOTO
+        self.size = 0 #how many statements there are, counting the ones in the bodies of IFs & WHILEs
+    
+    #Adds in what some more statements do
+    def add (self, other):
+        many = self.many | other.many | (self.once & other.once)
+        self.once = (self.once | other.once) & ~many
+        self.many = many
+        self.read |= other.read
+        self.labels = self.labels or other.labels
+        self.gotos = self.gotos or other.gotos
+        self.size += other.size
+    
+    #the variables that are set at all
+    def assigned (self):
+        return self.once | self.many
+
+class LoopOptimizer:
+    def __init__(self, program):
+        self.program = program
+        self.changes = [] #(line, list of what was done) for each loop that was changed
+        self.unchanged = [] #(line, list of what was found out) for each counting loop that was recognised but not changed
+        self.loops = 0 #how many loops there were
+        self.temporaries = 0 #how many variables have been made for invariant conditions
+        self.bits = {} #variable -> its bit in a Summary's masks
+        self.bodies = {} #IF/WHILE -> the Summary of its body, for every block that can still be looked at
+    
+    #A block of statements with each of its loops optimized
+    def block (self, statements):
+        result = []
+        for index, statement in enumerate (statements):
+            if type (statement) is While:
+                previous = statements [index - 1] if index > 0 else None
+                result.extend (self.loop (statement, previous))
+            else:
+                result.append (statement)
+        return result
+    
+    #Optimizes one loop & returns the statements to put in its place. previous is the statement just before it (or None)
+    def loop (self, node, previous):
+        self.loops += 1
+        if self.bodies [node].labels:
+            return [node]
+        done = []
+        found = [] #what's known about the loop, which on its own doesn't change it
+        before = self.hoistCondition (node, done)
+        counter = self.countingLoop (node, previous)
+        count = None
+        entered = False #True when the loop is known to run at least once
+        if counter is not None:
+            name, step, count, entered = counter
+            if count is None:
+                found.append ("counting loop over %s, step %s" % (name, step))
+            else:
+                found.append ("counting loop over %s, step %s, runs %d times" % (name, step, count))
+        if count == 0:
+            self.changes.append ((node.line, found + done + ["removed"]))
+            return before
+        
+        hoisted = self.hoistLets (node, done)
+        if count is not None and self.canUnroll (node, count):
+            done.append ("unrolled")
+            replacement = hoisted + [self.copy (statement) for i in range (count) for statement in node.body]
+        elif hoisted and not entered:
+            replacement = [If (copyExpression (node.condition), hoisted + [node], node.line)]
+            self.bodies [replacement [0]] = self.summary (replacement [0].body)
+        else:
+            replacement = hoisted + [node] #a loop that always runs at least once doesn't need an IF around what's moved out of it
+        
+        if done:
+            self.changes.append ((node.line, found + done))
+        elif found:
+            self.unchanged.append ((node.line, found))
+        return before + replacement
+    
+    #Moves the invariant parts of the loop's condition into new variables that are set just before the loop (the condition is always
+    #worked out at least once, so this never does anything the loop wouldn't have). Returns the LETs that set them
+    #Only a float is moved, since that's what the variable holds (a double would be rounded, and a comparison is cheap anyway)
+    def hoistCondition (self, node, done):
+        assigned = self.bodies [node].assigned()
+        types = expressionTypes (node.condition)
+        masks = self.expressionMasks (node.condition)
+        lets = []
+        stack = [(node, "condition")]
+        while stack:
+            parent, field = stack.pop()
+            part = getattr (parent, field)
+            if type (part) is Unary:
+                stack.append ((part, "operand"))
+            elif type (part) is Binary:
+                if types [part] == FLOAT and not (masks [part] & assigned):
+                    self.temporaries += 1
+                    name = "tt_loop" + str (self.temporaries)
+                    self.program.variables.append (name)
+                    lets.append (Let (name, part, node.line))
+                    setattr (parent, field, Variable (name))
+                else:
+                    stack.append ((part, "right"))
+                    stack.append ((part, "left"))
+        if lets:
+            done.append ("worked out " + ", ".join (let.name for let in lets) + " from the condition before the loop")
+        return lets
+    
+    #If the loop is a counting loop, returns (its counter, the step, how many times it runs, whether it runs at least once), or None if it isn't
+    #A counting loop compares a variable with an invariant (eg. WHILE i < n) & adds or takes away a constant (LET i = i + 1) exactly once, at
+    #the top level of its body. How many times it runs is only known when the end is a constant & the statement before the loop sets the
+    #counter to a constant, in which case it's worked out by going round the loop with C's rounding (giving up after maxUnrollCount times)
+    def countingLoop (self, node, previous):
+        condition = node.condition
+        if type (condition) is not Binary or condition.operator not in comparisons:
+            return None
+        body = self.bodies [node]
+        assigned = body.assigned()
+        if type (condition.left) is Variable and not (self.expressionMask (condition.right) & assigned):
+            name, bound, operator = condition.left.name, condition.right, condition.operator
+        elif type (condition.right) is Variable and not (self.expressionMask (condition.left) & assigned):
+            name, bound, operator = condition.right.name, condition.left, swapped [condition.operator]
+        else:
+            return None
+        
+        steps = [statement for statement in node.body if type (statement) is Let and statement.name == name]
+        if len (steps) != 1 or not (body.once & self.mask (name)):
+            return None
+        step = stepOf (steps [0])
+        if step is None:
+            return None
+        change = step [2] if step [1] == "+" else -step [2] #how much the counter goes up by, for the report
+        
+        end = constant (bound)
+        if end is None or type (previous) is not Let or previous.name != name or constant (previous.expression) is None:
+            return name, change, None, False
+        start = constant (previous.expression)
+        
+        #with --integers the counter may be a long long, which only goes the same way as a float while it's a whole number a float can hold
+        exact = start [0] <= LONG and step [0] <= LONG
+        if exact and (abs (start [1]) > 2**24 or (end [0] <= LONG and abs (end [1]) > 2**24)):
+            return name, change, None, False
+        value = convert (start [1], FLOAT)
+        count = 0
+        while arithmetic (operator, value, end [1], max (FLOAT, end [0])):
+            if count == maxUnrollCount:
+                return name, change, None, True
+            value = convert (arithmetic (step [1], value, step [2], max (FLOAT, step [0])), FLOAT)
+            if exact and abs (value) > 2**24:
+                return name, change, None, True
+            count += 1
+        return name, change, count, count > 0
+    
+    #Takes the invariant LETs out of the top level of the loop's body & returns them, in order. A LET can move when:
+    #   its variable isn't set anywhere else in the loop, or read by the condition or before the LET (which would see the old value)
+    #   the variables its expression reads aren't set anywhere in the loop
+    #   there's no GOTO before it (which could leave the loop before the LET, the first time round)
+    #   its expression can't crash the program (an integer division by zero)
+    def hoistLets (self, node, done):
+        body = self.bodies [node]
+        assigned = body.assigned()
+        read = self.expressionMask (node.condition)
+        jumped = False
+        hoisted = []
+        rest = [] #the statements that stay in the loop
+        summary = Summary() #what they do
+        for statement in node.body:
+            if type (statement) is Let and not jumped:
+                bit = self.mask (statement.name)
+                if body.once & bit and not (read & bit) and not (self.expressionMask (statement.expression) & assigned) and not canTrap (statement.expression):
+                    assigned &= ~bit #a LET that's moved out doesn't set its variable in the loop any more
+                    hoisted.append (statement)
+                    continue
+            rest.append (statement)
+            statementSummary = self.statementSummary (statement)
+            summary.add (statementSummary)
+            read |= statementSummary.read
+            jumped = jumped or statementSummary.gotos
+        if hoisted:
+            node.body = rest
+            self.bodies [node] = summary
+            done.append ("moved " + ", ".join ("LET " + statement.name for statement in hoisted) + " out of the loop")
+        return hoisted
+    
+    #True if a loop that runs count times is small enough to unroll
+    def canUnroll (self, node, count):
+        return count <= maxUnrollCount and count * self.bodies [node].size <= maxUnrollStatements
+    
+    #A copy of a statement from the body of a loop that's being unrolled. A copy of an IF or WHILE does the same as the block it's a copy of
+    def copy (self, statement):
+        result = copyStatement (statement)
+        if type (statement) is If or type (statement) is While:
+            self.bodies [result] = self.bodies [statement]
+        return result
+    
+    #The Summary of a list of statements
+    def summary (self, statements):
+        result = Summary()
+        for statement in statements:
+            result.add (self.statementSummary (statement))
+        return result
+    
+    #The Summary of one statement, using the one already made for the body of an IF or WHILE
+    def statementSummary (self, statement):
+        result = Summary()
+        result.size = 1
+        kind = type (statement)
+        if kind is Let:
+            result.once = self.mask (statement.name)
+            result.read = self.expressionMask (statement.expression)
+        elif kind is Input:
+            result.once = self.mask (statement.name)
+        elif kind is Print:
+            result.read = self.expressionMask (statement.expression)
+        elif kind is Label:
+            result.labels = True
+        elif kind is Goto:
+            result.gotos = True
+        elif kind is If or kind is While:
+            result.read = self.expressionMask (statement.condition)
+            result.add (self.bodies [statement])
+        return result
+    
+    #The bit for a variable in a Summary's masks
+    def mask (self, name):
+        bit = self.bits.get (name)
+        if bit is None:
+            bit = self.bits [name] = 1 << len (self.bits)
+        return bit
+    
+    #The mask of the variables an expression reads
+    def expressionMask (self, node):
+        result = 0
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if type (node) is Variable:
+                result |= self.mask (node.name)
+            elif type (node) is Binary:
+                stack.append (node.left)
+                stack.append (node.right)
+            elif type (node) is Unary:
+                stack.append (node.operand)
+        return result
+    
+    #The mask of the variables each part of an expression reads, as part -> mask
+    def expressionMasks (self, node):
+        masks = {}
+        for part in partsInOrder (node):
+            if type (part) is Variable:
+                masks [part] = self.mask (part.name)
+            elif type (part) is Binary:
+                masks [part] = masks [part.left] | masks [part.right]
+            elif type (part) is Unary:
+                masks [part] = masks [part.operand]
+            else:
+                masks [part] = 0
+        return masks
+
+#For LET i = i + c, i - c or c + i, with c a constant, returns (c's type, the operator, c), otherwise None
+def stepOf (statement):
+    expression = statement.expression
+    if type (expression) is not Binary or expression.operator not in ("+", "-"):
+        return None
+    if type (expression.left) is Variable and expression.left.name == statement.name:
+        step = constant (expression.right)
+    elif expression.operator == "+" and type (expression.right) is Variable and expression.right.name == statement.name:
+        step = constant (expression.left)
+    else:
+        return None
+    if step is None:
+        return None
+    return step [0], expression.operator, step [1]
+
+#A copy of an expression, so that the same node isn't in the tree twice
+def copyExpression (node):
+    copies = {}
+    for part in partsInOrder (node):
+        kind = type (part)
+        if kind is Binary:
+            copies [part] = Binary (part.operator, copies.pop (part.left), copies.pop (part.right))
+        elif kind is Unary:
+            copies [part] = Unary (part.operator, copies.pop (part.operand))
+        elif kind is Number:
+            copies [part] = Number (part.text)
+        else:
+            copies [part] = Variable (part.name)
+    return copies [node]
+
+#A copy of a statement (and the statements in its body)
+def copyStatement (node):
+    result = copyOne (node)
+    work = [(node, result)]
+    while work:
+        original, copy = work.pop()
+        if type (original) is If or type (original) is While:
+            for statement in original.body:
+                inner = copyOne (statement)
+                copy.body.append (inner)
+                work.append ((statement, inner))
+    return result
+
+#A copy of one statement, with an empty body if it's an IF or WHILE
+def copyOne (node):
+    kind = type (node)
+    if kind is If or kind is While:
+        return kind (copyExpression (node.condition), [], node.line)
+    if kind is Print:
+        return Print (copyExpression (node.expression), node.line)
+    if kind is Let:
+        return Let (node.name, copyExpression (node.expression), node.line)
+    if kind is PrintString:
+        return PrintString (node.text, node.line)
+    return kind (node.name, node.line) #Goto & Input
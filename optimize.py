@@ -0,0 +1,205 @@
+from tree import *
+from cmodel import *
+from flow import *
+from loops import optimizeLoops
+import math
+
+#Optimizer rewrites the expressions in the syntax tree between parsing & code generation, so that gcc gets less to do
+#Every rewrite keeps the value (and the C type) the generated code would have computed, following the C rules in cmodel.py
+#   -O1  constant folding & identity simplification
+#   -O2  also strength reduction, and removing unreachable code, unused labels & dead stores (these need the whole program, see flow.py)
+#   -O3  also loop optimizations: invariant code motion, counting loops & unrolling (these need the whole program too, see loops.py)
+
+class Optimizer:
+    def __init__(self, level):
+        self.level = level
+        self.passes = []
+        if level >= 1:
+            self.passes.append (("constant folding", self.fold))
+            self.passes.append (("identity simplification", self.simplify))
+        if level >= 2:
+            self.passes.append (("strength reduction", self.reduce))
+        
+        #passes over the whole program, which remove statements rather than expression nodes
+        self.programPasses = []
+        if level >= 2:
+            self.programPasses.append (("unreachable code", removeUnreachable))
+            self.programPasses.append (("unused labels", removeUnusedLabels))
+            self.programPasses.append (("dead stores", removeDeadStores))
+        
+        self.removed = {name: 0 for name, rule in self.passes + self.programPasses} #how many nodes (or statements) each pass has removed so far
+        self.rewritten = 0 #how many expressions strength reduction has rewritten
+        self.loops = 0 #how many loops the loop optimizations have looked at
+        self.loopChanges = [] #(line, what was done) for each loop they changed
+        self.loopsUnchanged = [] #(line, what was found out) for each counting loop they recognised but didn't change
+    
+    #Optimizes every statement in the program, then runs the passes that need to see the whole program
+    #(when statements are optimized one at a time with statement(), those passes don't run)
+    def program (self, program):
+        for statement in program.statements:
+            self.statement (statement)
+        for name, removePass in self.programPasses:
+            self.removed [name] += countRemoved (program, removePass)
+        if self.level >= 3:
+            changes, unchanged, loops = optimizeLoops (program)
+            self.loopChanges.extend (changes)
+            self.loopsUnchanged.extend (unchanged)
+            self.loops += loops
+        return program
+    
+    #Optimizes the expressions in a statement (and in the statements in its body, which are walked with a stack rather than by recursion)
+    def statement (self, node):
+        work = [node]
+        while work:
+            statement = work.pop()
+            if type (statement) is Print or type (statement) is Let:
+                statement.expression = self.optimize (statement.expression)
+            elif type (statement) is If or type (statement) is While:
+                statement.condition = self.optimize (statement.condition)
+                work.extend (reversed (statement.body))
+        return node
+    
+    #Runs each pass over an expression, keeping count of the nodes it removes
+    def optimize (self, node):
+        for name, rule in self.passes:
+            before = countNodes (node)
+            node = self.rewrite (node, rule)
+            self.removed [name] += before - countNodes (node)
+        return node
+    
+    #Applies a rule to every node of an expression, starting from the bottom so that the children are already rewritten
+    def rewrite (self, node, rule):
+        if type (node) is Binary:
+            node.left = self.rewrite (node.left, rule)
+            node.right = self.rewrite (node.right, rule)
+        elif type (node) is Unary:
+            node.operand = self.rewrite (node.operand, rule)
+        return rule (node)
+    
+    #A report of what each pass did, one line per pass
+    def report (self):
+        lines = []
+        for name, rule in self.passes:
+            line = name + ": removed " + str (self.removed [name]) + " nodes"
+            if rule == self.reduce:
+                line += ", rewrote " + str (self.rewritten) + " expressions"
+            lines.append (line)
+        for name, removePass in self.programPasses:
+            lines.append (name + ": removed " + str (self.removed [name]) + " statements")
+        if self.level >= 3:
+            lines.append ("loop optimization: changed " + str (len (self.loopChanges)) + " of " + str (self.loops) + " loops")
+            for line, done in sorted (self.loopChanges):
+                lines.append ("    WHILE on line " + str (line) + ": " + ", ".join (done))
+            if self.loopsUnchanged:
+                lines.append ("loop optimization: recognised but didn't change " + str (len (self.loopsUnchanged)) + " loops")
+                for line, found in sorted (self.loopsUnchanged):
+                    lines.append ("    WHILE on line " + str (line) + ": " + ", ".join (found))
+        return lines
+    
+    #Constant folding: an operator whose operands are both constants is replaced by its result, eg. 2 * 3 + 4 becomes 10
+    def fold (self, node):
+        if type (node) is Unary and node.operator == "+" and constant (node.operand) is not None:
+            return node.operand
+        if type (node) is not Binary:
+            return node
+        left = constant (node.left)
+        right = constant (node.right)
+        if left is None or right is None:
+            return node
+        
+        kind = max (left[0], right[0])
+        value = arithmetic (node.operator, left[1], right[1], kind)
+        if value is None:
+            return node #C doesn't define the result (eg. division by zero), so leave it for runtime
+        if node.operator in comparisons:
+            kind = INT
+        folded = makeConstant (value, kind)
+        return node if folded is None else folded
+    
+    #Identity simplification: x*1, 1*x, x/1 & x-0 are just x, as are x+0 & 0+x for integers
+    #(for a float, -0.0 + 0 is 0.0 not -0.0, which PRINT would show). A unary + does nothing either
+    def simplify (self, node):
+        if type (node) is Unary and node.operator == "+":
+            return node.operand
+        if type (node) is not Binary:
+            return node
+        
+        operator = node.operator
+        if operator == "*" and isConstant (node.right, 1) or operator == "/" and isConstant (node.right, 1) or operator == "-" and isConstant (node.right, 0):
+            keep = node.left
+        elif operator == "*" and isConstant (node.left, 1):
+            keep = node.right
+        elif operator == "+" and isConstant (node.right, 0):
+            keep = node.left
+        elif operator == "+" and isConstant (node.left, 0):
+            keep = node.right
+        else:
+            return node
+        
+        #only drop the constant if it doesn't change the type of the result (eg. x * 1.0 is a double but x is a float)
+        kind = typeOf (node)
+        if kind is None or typeOf (keep) != kind:
+            return node
+        if operator == "+" and kind != INT and kind != LONG:
+            return node
+        return keep
+    
+    #Strength reduction: swaps an operation for a cheaper one that gives exactly the same result
+    #   x * 2 becomes x + x (when 2 is an int, so the type stays the same)
+    #   x / 4.0 becomes x * 0.25 (dividing by a power of two is the same as multiplying by its reciprocal)
+    def reduce (self, node):
+        if type (node) is not Binary:
+            return node
+        
+        if node.operator == "*":
+            if type (node.left) is Variable and isConstant (node.right, 2) and literalType (node.right.text) == INT:
+                self.rewritten += 1
+                return Binary ("+", node.left, Variable (node.left.name))
+            if type (node.right) is Variable and isConstant (node.left, 2) and literalType (node.left.text) == INT:
+                self.rewritten += 1
+                return Binary ("+", node.right, Variable (node.right.name))
+        
+        elif node.operator == "/" and type (node.right) is Number and literalType (node.right.text) == DOUBLE:
+            divisor = literalValue (node.right.text)
+            mantissa, exponent = math.frexp (divisor)
+            if mantissa == 0.5 and exponent > -1020 and exponent < 1020: #a power of two whose reciprocal is also a normal double
+                self.rewritten += 1
+                return Binary ("*", node.left, Number (doubleText (1.0 / divisor)))
+        return node
+
+#How many nodes there are in an expression
+def countNodes (node):
+    if type (node) is Binary:
+        return 1 + countNodes (node.left) + countNodes (node.right)
+    if type (node) is Unary:
+        return 1 + countNodes (node.operand)
+    return 1
+
+#True if the node is a number with the given value
+def isConstant (node, value):
+    return type (node) is Number and literalValue (node.text) == value
+
+#C text for a double constant. It always has a decimal point, so C (and literalType) read it as a double
+def doubleText (value):
+    text = repr (value) #Note to self: repr() gives the shortest text that reads back as exactly the same double
+    if "e" in text and "." not in text:
+        text = text.replace ("e", ".0e")
+    return text
+
+#A node for a constant of the given type, or None if C couldn't be given that exact value & type as a literal
+def makeConstant (value, kind):
+    if kind == INT or kind == LONG:
+        text = str (abs (value))
+        if literalType (text) != kind:
+            return None
+        negative = value < 0
+    elif kind == DOUBLE:
+        if math.isinf (value) or math.isnan (value):
+            return None
+        text = doubleText (abs (value))
+        negative = math.copysign (1.0, value) < 0
+    else:
+        return None #there are no float literals
+    if negative:
+        return Unary ("-", Number (text))
+    return Number (text)
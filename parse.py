@@ -1,22 +1,36 @@
-import sys 
 from lex import*
+from tree import *
 
 #Parser object keeps track of current token & checks if the code matches the grammar 
+#Each grammar rule returns the node of the abstract syntax tree (see tree.py) for what it parsed, which a code generator then turns into code
+
+#the keyword that ends each kind of block
+blockEnds = {If: TokenType.ENDIF, While: TokenType.ENDWHILE}
+
+#the binary operators allowed in an expression, and in a comparision
+arithmeticOperators = {TokenType.PLUS, TokenType.MINUS, TokenType.ASTERISK, TokenType.SLASH}
+comparisionOperators = arithmeticOperators | {TokenType.EQEQ, TokenType.NOTEQ, TokenType.GT, TokenType.GTEQ, TokenType.LT, TokenType.LTEQ}
 
 class Parser:
-    def __init__(self, lexer, emitter):
+    def __init__(self, lexer):
         self.lexer = lexer
-        self.emitter = emitter 
         
         #Note to self: the set() function in Python is used to create a set (an unordered collection of unique, hashable elements)
         self.symbols = set() #This is all the variables that have been declared so far
+        self.variables = [] #The same variables, in the order they were declared
         self.labelsDeclared = set() #This is all the labels declared so far
-        self.labelsGotoed = set() #This is all labels goto'ed so far
+        self.labelsGotoed = {} #This is all labels goto'ed so far, with the first GOTO token for each (so an undeclared one can be reported where it's used)
+        
+        self.errors = [] #a Diagnostic (see diagnostics.py) for each error found so far
+        self.lexError = None #an error the lexer found between the current & the next token, raised once the parser gets past it
         
         self.curToken = None
         self.peekToken = None
         self.nextToken()
-        self.nextToken() #nextToken() is called twice so that it initializes current & peak
+        try:
+            self.nextToken() #nextToken() is called twice so that it initializes current & peak
+        except Diagnostic as error: #the lexer couldn't make sense of the very first token
+            self.errors.append (error)
     
     #Returns true if the current token matches 
     def checkToken (self, kind):
@@ -33,39 +47,118 @@ class Parser:
         self.nextToken()
     
     #Advances the curernt token
+    #If the lexer fails, it skips to the end of the line. The parser still gets to look at the tokens in front of the one that failed first,
+    #so that the errors come out in the order they're in the source, and the lexer's error is raised when the parser moves past it
     def nextToken (self):
         self.curToken = self.peekToken
-        self.peekToken = self.lexer.getToken() #you don't need to parse through the EOF because the lexer handles that already
+        error = self.lexError
+        self.lexError = None
+        try:
+            self.peekToken = self.lexer.getToken() #you don't need to parse through the EOF because the lexer handles that already
+        except Diagnostic as lexError:
+            self.lexError = lexError
+            self.peekToken = self.lexer.getToken() #the newline (or EOF) at the end of the line the lexer skipped
+        if error is not None:
+            raise error
+    
+    #An error at a token (the current one unless another is given)
+    def diagnostic (self, message, token = None):
+        if token is None:
+            token = self.curToken
+        return Diagnostic ("Error! " + message, token.line, token.col, token.endCol())
     
     def abort (self, message):
-        sys.exit ("Error! " + message)
+        raise self.diagnostic (message)
+    
+    #Panic mode: notes the error, then skips the rest of the line, so that parsing can carry on at the next statement & find any other errors
+    #(a later error caused only by this one, like using a variable whose LET was wrong, can still be reported)
+    def recover (self, error):
+        self.errors.append (error)
+        while not self.checkToken (TokenType.NEWLINE) and not self.checkToken (TokenType.EOF):
+            self.skipToken()
+        while self.checkToken (TokenType.NEWLINE):
+            self.skipToken()
+    
+    #Moves to the next token while recovering, noting any error the lexer found on the way
+    def skipToken (self):
+        try:
+            self.nextToken()
+        except Diagnostic as error:
+            self.errors.append (error)
         
     #Parsing Statements (Going through the grammar & implementing a function for each rule) - this line checks whether the program is made up of 0 or more statements
     # program ::= {statement}
     def program (self):
-        self.emitter.headerLine("#include <stdio.h>")
-        self.emitter.headerLine("int main(void){")
-        
+        statements = list (self.statements())
+        return Program (statements, self.variables)
+    
+    #Parses the program one top level statement at a time. Handing them out as they're parsed (instead of building the whole list)
+    #lets the code generator deal with each one straight away, so a huge program never has to be in memory all at once
+    #Once there's been an error no more statements are handed out, but the rest of the program is still parsed to find its errors,
+    #and they're all raised together in a CompileError at the end
+    def statements (self):
         #Some newlines are required in the grammar, hence we need to skip over the excess 
         while self.checkToken(TokenType.NEWLINE):
-            self.nextToken()
+            self.skipToken()
         
         #Parse through all the statements in the program
         while not self.checkToken(TokenType.EOF):
-            self.statement()
-        
-        #at the end of the C code
-        self.emitter.emitLine ("return 0;")
-        self.emitter.emitLine ("}")
+            statement = self.statement()
+            if not self.errors:
+                yield statement
         
         #Check that each label referenced in a GOTO is declared
-        for label in self.labelsGotoed:
+        for label, token in self.labelsGotoed.items():
             if label not in self.labelsDeclared:
-                self.abort ("Attempting to GOTO to undeclared variable: " + label)
+                self.errors.append (self.diagnostic ("Attempting to GOTO to undeclared variable: " + label, token))
+        
+        if self.errors:
+            raise CompileError (self.errors)
+    
+    #Adds a variable to the symbol table the first time it's declared
+    def declare (self, name):
+        if name not in self.symbols:
+            self.symbols.add(name)
+            self.variables.append(name)
+    
+    #Parses one statement (an IF or WHILE with the statements in its body). If there's an error in it, the error is noted & None is
+    #returned instead (see recover())
+    #The IFs & WHILEs whose bodies are still being parsed are kept on a stack, instead of each body being parsed by a call to statement()
+    #inside the one for the IF or WHILE, so a program can be nested much more deeply than Python's recursion limit would allow
+    def statement (self):
+        blocks = [] #the IFs & WHILEs that haven't been ended yet, innermost last
+        while True:
+            try:
+                node = self.parseStatement()
+            except Diagnostic as error:
+                self.recover (error)
+                node = None
+            
+            if type (node) is If or type (node) is While:
+                blocks.append (node)
+            elif not blocks:
+                return node
+            else:
+                blocks [-1].body.append (node)
+            
+            #Ends each block that's got to its ENDIF or ENDWHILE (or to the end of the file, which is an error), which finishes the statement
+            #it's in the body of. An error here means the whole IF or WHILE is lost, the same as an error in its first line would
+            while blocks and (self.checkToken (blockEnds [type (blocks [-1])]) or self.checkToken (TokenType.EOF)):
+                node = blocks.pop()
+                try:
+                    self.match (blockEnds [type (node)])
+                    self.nl()
+                except Diagnostic as error:
+                    self.recover (error)
+                    node = None
+                if not blocks:
+                    return node
+                blocks [-1].body.append (node)
     
     #Next rule in grammar is "statement" which allows for 7 different types of rules. 
-    def statement(self):
+    def parseStatement(self):
         #Check the first token to see what kind of token it is
+        line = self.curToken.line
         
         #'PRINT' (expression | string)
         if self.checkToken(TokenType.PRINT):
@@ -73,48 +166,22 @@ class Parser:
             
             if self.checkToken(TokenType.STRING):
                 #simple string, so just print it
-                self.emitter.emitLine ("printf (\"" + self.curToken.text + "\\n\");")
+                node = PrintString (self.curToken.text, line)
                 self.nextToken()
                 
             else:
-                #expect an expression, therefore print the result as a float
-                self.emitter.emit ("printf (\"%" + ".2f\\n\", (float)(")
-                self.expression()
-                self.emitter.emitLine ("));")
+                #expect an expression, the result will be printed as a float
+                node = Print (self.expression(), line)
         
-        # "IF" comparision "THEN" {statement} 
+        # "IF" comparision "THEN" {statement} "ENDIF" - only the first line, statement() parses the body & the ENDIF
         elif self.checkToken (TokenType.IF):
             self.nextToken()
-            self.emitter.emit ("if(")
-            self.comparision() #another grammar rule - comparision 
-            
-            self.match(TokenType.THEN)
-            self.nl()
-            self.emitter.emitLine ("){")
-            
-            #Zero or more statements in the body 
-            while not self.checkToken(TokenType.ENDIF):
-                self.statement()
-                
-            self.match(TokenType.ENDIF)
-            self.emitter.emitLine ("}")
+            return If (self.header (TokenType.THEN), [], line)
         
-        #"WHILE" comparision "REPEAT" {statement} "ENDWHILE"
+        #"WHILE" comparision "REPEAT" {statement} "ENDWHILE" - the same goes for the loop body
         elif self.checkToken (TokenType.WHILE):
             self.nextToken()
-            self.emitter.emit("while(")
-            self.comparision()
-            
-            self.match(TokenType.REPEAT)
-            self.nl()
-            self.emitter.emitLine ("){")
-            
-            #Zero or more statements in the loop body
-            while not self.checkToken(TokenType.ENDWHILE):
-                self.statement()
-            
-            self.match(TokenType.ENDWHILE)
-            self.emitter.emitLine ("}")
+            return While (self.header (TokenType.REPEAT), [], line)
         
         # "LABEL" ident 
         elif self.checkToken(TokenType.LABEL):
@@ -125,31 +192,29 @@ class Parser:
                 self.abort ("Label aready exists: " + self.curToken.text)
             self.labelsDeclared.add(self.curToken.text)
 
-            self.emitter.emitLine (self.curToken.text + ":")
+            node = Label (self.curToken.text, line)
             self.match(TokenType.IDENT)
         
         # "GOTO" ident
         elif self.checkToken(TokenType.GOTO):
             self.nextToken()
-            self.labelsGotoed.add(self.curToken.text) #Note to self: the .add() method is used in Python to add a single element to a set & if the element already exists, will ignore duplicates
-            self.emitter.emitLine ("goto " + self.curToken.text + ";")
+            label = self.curToken
+            node = Goto (label.text, line)
             self.match(TokenType.IDENT)
+            self.labelsGotoed.setdefault (label.text, label) #Note to self: setdefault() only adds the label if it isn't already there, so the first GOTO is kept
         
         # "LET" ident "=" expression 
         elif self.checkToken (TokenType.LET):
             self.nextToken()
             
             #Check if the symbols exist in the symbol table, and if not - then make sure to declare it
-            if self.curToken.text not in self.symbols:
-                self.symbols.add(self.curToken.text)
-                self.emitter.headerLine ("float " + self.curToken.text + ";")
+            name = self.curToken.text
+            self.declare (name)
             
-            self.emitter.emit(self.curToken.text + " = ")
             self.match(TokenType.IDENT)
             self.match(TokenType.EQ)
             
-            self.expression()
-            self.emitter.emitLine(";")
+            node = Let (name, self.expression(), line)
         
         
         #Note: There's a limitation to the "Teeny Tiny" language. You can't tell if the user input was the value 0 or an invalid input
@@ -158,16 +223,8 @@ class Parser:
             self.nextToken()
             
             #if the variable doesn't already exist, declare it 
-            if self.curToken.text not in self.symbols:
-                self.symbols.add (self.curToken.text) 
-                self.emitter.headerLine ("float " + self.curToken.text + ";")
-                
-            #Emit scanf but also validate the input. If it's invalid, then set the variable to 0 and clear the input
-            self.emitter.emitLine ("if(0 == scanf(\"%" + "f\", &" + self.curToken.text + ")) {")
-            self.emitter.emitLine (self.curToken.text + " = 0;")
-            self.emitter.emit ("scanf(\"%")
-            self.emitter.emitLine ("*s\");")
-            self.emitter.emitLine ("}")
+            self.declare (self.curToken.text)
+            node = Input (self.curToken.text, line)
             self.match(TokenType.IDENT)
                         
         #otherwise, it's not a valid statement so you want to print an error
@@ -175,61 +232,65 @@ class Parser:
             self.abort("Invalid statement at " + self.curToken.text + " ("+ self.curToken.kind.name + ")")
         #newline
         self.nl()
+        return node
+    
+    #The comparison & the THEN or REPEAT at the start of an IF or WHILE, and the newline after them
+    #An error here is noted, but the body is still parsed as the body, so that its ENDIF or ENDWHILE isn't reported as a stray statement too
+    def header (self, keyword):
+        try:
+            condition = self.comparision() #another grammar rule - comparision 
+            self.match(keyword)
+            self.nl()
+            return condition
+        except Diagnostic as error:
+            self.recover (error)
+            return None
     
     #comparision ::= expression (("==" | "!=" | ">" | ">=" | "<" | "<=") expression)+
+    #You can have 0 or more comparision operator & expressions
+    #(You must have atleast 1 comparision operator and another expression, but that isn't checked)
     def comparision (self):
-        self.expression()
-        
-        #You must have atleast 1 comparision operator and another expression
-        if self.isComparisionOperator():
-            self.emitter.emit(self.curToken.text)
-            self.nextToken()
-            self.expression()
-        
-        #else:
-        #    self.abort ("Expected comparision operator at: " + self.curToken.text)
-            
-        #You can have 0 or more comparision operator & expressions
-        while self.isComparisionOperator():
-            self.emitter.emit (self.curToken.text)
-            self.nextToken()
-            self.expression()
-        
-    #Checks whether its a comparision operator or not (returns True if it is & the type of comparision operator) 
-    def isComparisionOperator(self):
-        return self.checkToken (TokenType.GT) or self.checkToken (TokenType.GTEQ) or self.checkToken (TokenType.LT) or self.checkToken (TokenType.LTEQ) or self.checkToken (TokenType.EQEQ) or self.checkToken (TokenType.NOTEQ)
+        return self.operators (comparisionOperators)
     
     # expression ::= term {( "-" | "+" ) term}
+    # term ::= unary {( "/" | "*" ) unary}
     def expression (self):
-        self.term()
-        #You can have 0 or more (+/-) expressions
-        while self.checkToken (TokenType.PLUS) or self.checkToken (TokenType.MINUS):
-            self.emitter.emit(self.curToken.text)
-            self.nextToken()
-            self.term()
+        return self.operators (arithmeticOperators)
     
-    # term ::= unary {( "/" | "*" ) unary}
-    def term (self):
-        self.unary()
-        #can have 0 or more *// and expressions
-        while self.checkToken (TokenType.ASTERISK) or self.checkToken (TokenType.SLASH):
-            self.emitter.emit(self.curToken.text)
+    #Parses unary operands with any of the given binary operators between them. The comparisons are chained in the order they're written,
+    #but C groups < <= > >= before == & != (see tree.precedence) so the tree is built the way C will read the generated code
+    #Note to self: this is the "shunting-yard" way of handling precedence. It does what a function for each level of the grammar would
+    #(expression -> term -> unary) in one loop, without the calls for each level that used to be most of the time spent on an expression
+    def operators (self, kinds):
+        output = [self.unary()]
+        pending = []
+        while self.curToken.kind in kinds:
+            operator = self.curToken.text
             self.nextToken()
-            self.unary()   
+            while pending and precedence [pending[-1]] >= precedence [operator]:
+                right = output.pop()
+                output.append (Binary (pending.pop(), output.pop(), right))
+            pending.append (operator)
+            output.append (self.unary())
+        while pending:
+            right = output.pop()
+            output.append (Binary (pending.pop(), output.pop(), right))
+        return output[0]
     
     #unary ::= ["+" | "-"] primary
     def unary (self):        
         #optional unary +/-
         if self.checkToken (TokenType.PLUS) or self.checkToken (TokenType.MINUS):
-            self.emitter.emit(self.curToken.text)
+            operator = self.curToken.text
             self.nextToken()
-        self.primary()
+            return Unary (operator, self.primary())
+        return self.primary()
     
     #primary ::= number | ident
     def primary (self):
         
         if self.checkToken (TokenType.NUMBER):
-            self.emitter.emit(self.curToken.text)
+            node = Number (self.curToken.text)
             self.nextToken()
         elif self.checkToken (TokenType.IDENT):
         
@@ -237,11 +298,12 @@ class Parser:
             if self.curToken.text not in self.symbols:
                 self.abort("Referencing variable before assignment: " + self.curToken.text)
             
-            self.emitter.emit(self.curToken.text)
+            node = Variable (self.curToken.text)
             self.nextToken()
         else:
             #error
             self.abort ("Unexpected token at " + self.curToken.text)
+        return node
         
     #Implementing the nl function that can handle newlines (called at the end of the statement function) - it expects 1 newline character but allows for more 
     # nl ::= '\n'+
@@ -251,6 +313,3 @@ class Parser:
         #allows for extra newlines too 
         while self.checkToken(TokenType.NEWLINE):
             self.nextToken()
-        
-    
-            
\ No newline at end of file
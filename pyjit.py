@@ -0,0 +1,452 @@
+from tree import *
+from cmodel import *
+from lex import FastLexer
+from parse import Parser
+from optimize import Optimizer
+from flow import allStatements
+from diagnostics import CompileError
+from vm import Scanner, fold, wrap
+import argparse
+import array
+import collections
+import hashlib
+import io
+import math
+import sys
+import threading
+
+#A JIT that runs a Teeny Tiny program inside Python, for programs that are run from Python code (eg. a service) where starting gcc
+#or going through the VM for every run would be too slow
+#   lines = run ("INPUT n\nPRINT n * 2\n", [21])   gives ["42.00"]
+#The program is turned into the source code of a Python function, which Python compiles to its own bytecode. WHILE & IF become
+#Python's own while & if, and every variable is a local variable, so a program runs with no interpreter loop of its own. The function
+#is kept in a cache keyed by a hash of the source, so running the same program again doesn't compile it again
+#
+#The output is exactly the same as the VM's (& so the C code's, see vm.py): a float operation is rounded to a float by storing it
+#into a one element float array (S[0]), & C's rules for mixing ints, floats & doubles are followed when the code is generated
+#
+#GOTO & LABEL can't be written with Python's if & while, so a program that has them is cut into blocks at each LABEL, & the function
+#becomes a dispatch loop: "state" is the block to run next & a GOTO sets it & goes round the loop again. The blocks are picked with a
+#tree of ifs (state < 8, state < 4, ...), so a jump only takes a few comparisons however many blocks there are. Only the IFs & WHILEs
+#with a LABEL or GOTO inside them are cut up, the rest are still Python's own if & while
+#Note to self: Python can't nest more than 20 loops or 100 levels of indentation, so code nested deeper than that is cut up as well
+#   python3 pyjit.py file.tiny [--show]
+
+maxIndent = 40 #how deep Python's if & while can be nested in the generated code (the dispatch loop's tree of ifs goes on top)
+maxLoops = 15 #how many of Python's while loops can be nested in it
+maxCached = 256 #how many compiled programs the cache keeps
+
+#Generates the source code of a Python function "program (read, write)" from the syntax tree. read() returns the next number of input
+#(or None at the end of it) & write(text) is called with each line of output
+class PythonGenerator:
+    def __init__(self):
+        self.blocks = [[]] #the blocks of the dispatch loop, each a list of lines (indent, text, target). There's only one without GOTOs
+        self.lines = self.blocks [0] #the block being generated
+        self.indent = 0 #how far the next line is indented (inside the block)
+        self.loops = 0 #how many of Python's while loops the next line is inside
+        self.labels = {} #the block each label starts
+        self.constants = [] #the constants Python has no literal for (inf & nan), which the code gets from K
+        self.temporaries = 0 #how many temporary variables the statement being generated is using
+        self.depth = {} #IF/WHILE -> how it nests (see shapes)
+        
+        #which method handles each kind of statement
+        self.statementMethods = {
+            PrintString: self.printString,
+            Print: self.printExpression,
+            If: self.ifStatement,
+            While: self.whileStatement,
+            Label: self.label,
+            Goto: self.goto,
+            Let: self.let,
+            Input: self.input,
+        }
+    
+    #Generates the whole program & returns its source code
+    def program (self, program):
+        self.shapes (program.statements)
+        for statement in program.statements:
+            self.statement (statement)
+        
+        lines = ["def program (read, write):", "    S = array ('f', [0.0])"]
+        for name in program.variables:
+            lines.append ("    v_" + name + " = 0.0")
+        if len (self.blocks) == 1:
+            self.writeLines (lines, self.blocks [0], 1)
+            return "\n".join (lines) + "\n"
+        
+        self.lines.append ((0, "return", None))
+        self.numbers = {id (block): number for number, block in enumerate (self.blocks)}
+        lines.append ("    state = 0")
+        lines.append ("    while True:")
+        self.dispatch (lines, 0, len (self.blocks), 2)
+        return "\n".join (lines) + "\n"
+    
+    #Works out how deeply each IF/WHILE nests & whether it has a LABEL or GOTO inside, for isNative
+    #(allStatements() hands out every IF/WHILE before the ones in its body, so going through them backwards does the bodies first)
+    def shapes (self, statements):
+        depth = {} #IF/WHILE -> (how many levels of IF/WHILE it is, how many levels of WHILE, True if there's no LABEL or GOTO in it)
+        blocks = [statement for statement in allStatements (statements) if type (statement) is If or type (statement) is While]
+        for block in reversed (blocks):
+            levels = loops = 0
+            clean = True
+            for statement in block.body:
+                if type (statement) is If or type (statement) is While:
+                    levels = max (levels, depth [statement][0])
+                    loops = max (loops, depth [statement][1])
+                    clean = clean and depth [statement][2]
+                elif type (statement) is Label or type (statement) is Goto:
+                    clean = False
+            depth [block] = (levels + 1, loops + (type (block) is While), clean)
+        self.depth = depth
+    
+    #True if an IF/WHILE can be Python's own if or while where the next line goes
+    def isNative (self, node):
+        levels, loops, clean = self.depth [node]
+        return clean and self.indent + levels <= maxIndent and self.loops + loops <= maxLoops
+    
+    #Adds a line of code. target is a block (or a label's name) whose number goes in place of the %d in the text
+    def line (self, text, target = None):
+        self.lines.append ((self.indent, text, target))
+    
+    #Adds the lines that go to a block (or a label) next
+    def jump (self, target):
+        self.line ("state = %d", target)
+        self.line ("continue")
+    
+    #Starts a block that the block before it carries on into, & returns it
+    def newBlock (self):
+        block = []
+        self.jump (block)
+        self.startBlock (block)
+        return block
+    
+    #Starts generating into a block
+    def startBlock (self, block):
+        self.blocks.append (block)
+        self.lines = block
+    
+    #writes the lines of a block into the function's source code, indented by indent levels
+    def writeLines (self, lines, block, indent):
+        for level, text, target in block:
+            if target is not None:
+                if type (target) is str:
+                    target = self.labels [target]
+                text = text % self.numbers [id (target)]
+            lines.append ("    " * (indent + level) + text)
+    
+    #Writes the tree of ifs that picks the block to run from the blocks numbered from start up to (but not including) end
+    def dispatch (self, lines, start, end, indent):
+        if end - start == 1:
+            self.writeLines (lines, self.blocks [start], indent)
+            return
+        middle = (start + end) // 2
+        lines.append ("    " * indent + "if state < %d:" % middle)
+        self.dispatch (lines, start, middle, indent + 1)
+        lines.append ("    " * indent + "else:")
+        self.dispatch (lines, middle, end, indent + 1)
+    
+    #The method for an IF or WHILE generates what comes before its body, and returns the body with a function that finishes the block
+    #once the body's been generated. They're walked here with a stack instead of by recursion, so deeply nested code can be generated
+    def statement (self, node):
+        work = [node]
+        while work:
+            node = work.pop()
+            if callable (node):
+                node()
+                continue
+            self.temporaries = 0 #no partial results are kept between statements
+            block = self.statementMethods [type (node)] (node)
+            if block is not None:
+                body, finish = block
+                work.append (finish)
+                work.extend (reversed (body))
+    
+    # "PRINT" string
+    def printString (self, node):
+        self.line ("write (%r)" % node.text)
+    
+    # "PRINT" expression - the value is rounded to a float, like the (float) cast in the C code. A nan with its sign bit set is "-nan"
+    #to printf, but Python leaves the sign off
+    def printExpression (self, node):
+        kind, text, value = self.expression (node.expression)
+        if text is None:
+            value = f32 (convert (value, FLOAT))
+            self.line ("write (%r)" % ("-nan" if value != value and math.copysign (1.0, value) < 0 else "%.2f" % value))
+            return
+        if kind == DOUBLE:
+            self.line ("S [0] = " + text)
+            text = "S [0]"
+        if text == "S [0]":
+            self.line ("p = S [0]")
+            text = "p"
+        self.line ("write ('%%.2f' %% %s if %s == %s or copysign (1.0, %s) > 0 else '-nan')" % (text, text, text, text))
+    
+    # "IF" comparison "THEN" {statement} "ENDIF"
+    #Python's own if when it can be, otherwise the block jumps past the body when the condition is false
+    def ifStatement (self, node):
+        condition = self.condition (node.condition)
+        if self.isNative (node):
+            self.line ("if " + condition + ":")
+            return node.body, self.nativeBody()
+        
+        after = []
+        self.line ("if not (" + condition + "):")
+        self.indent += 1
+        self.jump (after)
+        self.indent -= 1
+        def finish ():
+            self.jump (after)
+            self.startBlock (after)
+        return node.body, finish
+    
+    # "WHILE" comparison "REPEAT" {statement} "ENDWHILE"
+    #Python's own while when it can be (with the lines that work out the condition at the top of a "while True" if it needs any),
+    #otherwise a block that tests the condition, with a jump back to it at the end of the body
+    def whileStatement (self, node):
+        if self.isNative (node):
+            start = len (self.lines)
+            condition = self.condition (node.condition)
+            setup = self.lines [start:]
+            if not setup:
+                self.line ("while " + condition + ":")
+            else:
+                del self.lines [start:]
+                self.line ("while True:")
+                for level, text, target in setup:
+                    self.lines.append ((level + 1, text, target))
+                self.indent += 1
+                self.line ("if not (" + condition + "):")
+                self.indent += 1
+                self.line ("break")
+                self.indent -= 2
+            self.loops += 1
+            finish = self.nativeBody()
+            def finishLoop ():
+                finish()
+                self.loops -= 1
+            return node.body, finishLoop
+        
+        top = self.newBlock()
+        after = []
+        condition = self.condition (node.condition)
+        self.line ("if not (" + condition + "):")
+        self.indent += 1
+        self.jump (after)
+        self.indent -= 1
+        def finish ():
+            self.jump (top)
+            self.startBlock (after)
+        return node.body, finish
+    
+    #Indents the body of a Python if or while, & returns the function that ends it (with a "pass" if the body had no lines)
+    def nativeBody (self):
+        self.indent += 1
+        start = len (self.lines)
+        def finish ():
+            if len (self.lines) == start:
+                self.line ("pass")
+            self.indent -= 1
+        return finish
+    
+    # "LABEL" ident - starts a new block, which is where a GOTO goes
+    def label (self, node):
+        self.labels [node.name] = self.newBlock()
+    
+    # "GOTO" ident
+    def goto (self, node):
+        self.jump (node.name)
+    
+    # "LET" ident "=" expression - the value is rounded to a float as it's stored, since every variable is a float
+    def let (self, node):
+        kind, text, value = self.expression (node.expression)
+        if text is None:
+            text = self.constant (f32 (value))
+        elif kind == DOUBLE:
+            self.line ("S [0] = " + text)
+            text = "S [0]"
+        if text != "v_" + node.name:
+            self.line ("v_" + node.name + " = " + text)
+    
+    # "INPUT" ident - at the end of the input the variable is left alone, like scanf does
+    def input (self, node):
+        self.line ("p = read ()")
+        self.line ("if p is not None:")
+        self.indent += 1
+        self.line ("S [0] = p")
+        self.line ("v_" + node.name + " = S [0]")
+        self.indent -= 1
+    
+    #Generates the lines that work out a condition & returns the Python expression that tests it
+    def condition (self, node):
+        if type (node) is Binary and node.operator in comparisons:
+            left, right, kind = self.operands (node)
+            if left [1] is None and right [1] is None:
+                return str (bool (self.fold (node.operator, left [2], right [2], kind)))
+            return self.place (left, kind) + " " + node.operator + " " + self.place (right, kind)
+        kind, text, value = self.expression (node)
+        if text is None:
+            return str (value != 0)
+        return text + " != 0"
+    
+    #Generates the lines that work out an expression, returning its (kind, text, value): text is a Python expression that's a
+    #variable, a temporary or S [0] (which has to be used before anything else is put in it). A constant expression is worked out
+    #here, so it has no text (None) & its value instead
+    def expression (self, node):
+        if type (node) is Number:
+            kind = literalType (node.text)
+            if kind is None:
+                kind = LONG #too big even for a long, like the VM
+            return kind, None, literalValue (node.text)
+        
+        if type (node) is Variable:
+            return FLOAT, "v_" + node.name, None
+        
+        if type (node) is Unary:
+            kind, text, value = self.expression (node.operand)
+            if node.operator == "+":
+                return kind, text, value
+            if text is None:
+                if kind == INT or kind == LONG:
+                    return kind, None, wrap (-value, kind)
+                return kind, None, -value
+            if text == "S [0]":
+                self.line ("S [0] = -S [0]")
+                return kind, text, None
+            return kind, self.temporary ("-" + text), None
+        
+        left, right, operands = self.operands (node)
+        kind = INT if node.operator in comparisons else operands #both sides are converted to the bigger of their types
+        if left [1] is None and right [1] is None:
+            return kind, None, self.fold (node.operator, left [2], right [2], operands)
+        
+        a = self.place (left, operands)
+        b = self.place (right, operands)
+        if node.operator == "/":
+            if right [1] is not None:
+                value = "%s / %s if %s else divide (%s, %s)" % (a, b, b, a, b)
+            elif right [2] != 0:
+                value = a + " / " + b
+            else:
+                value = "divide (%s, %s)" % (a, b)
+        else:
+            value = a + " " + node.operator + " " + b
+        if operands == FLOAT and node.operator not in comparisons:
+            self.line ("S [0] = " + value)
+            return kind, "S [0]", None
+        return kind, self.temporary (value), None #Note to self: an int operand here can only be the 0 or 1 of a comparison, like in the VM
+    
+    #Generates both sides of a binary operator, returning them & the type they're both converted to
+    #If the left side ends up in S [0] & the right side needs lines of its own, the left side is moved into a temporary first
+    #(the right side's lines are generated on their own first, so they can go after that)
+    def operands (self, node):
+        left = self.expression (node.left)
+        lines = self.lines
+        self.lines = []
+        right = self.expression (node.right)
+        rightLines = self.lines
+        self.lines = lines
+        if left [1] == "S [0]" and rightLines:
+            left = (left [0], self.temporary ("S [0]"), None)
+        self.lines.extend (rightLines)
+        return left, right, max (left [0], right [0])
+    
+    #Puts a value in a new temporary variable & returns its name
+    def temporary (self, value):
+        self.temporaries += 1
+        name = "t" + str (self.temporaries)
+        self.line (name + " = " + value)
+        return name
+    
+    #the Python text for an operand converted to kind the way C converts the operands of an operator
+    def place (self, operand, kind):
+        operandKind, text, value = operand
+        if text is None:
+            return self.constant (float (convert (value, kind)))
+        return text
+    
+    #the Python text for a constant. Python has no literal for inf & nan, so those are kept in K
+    def constant (self, value):
+        if math.isinf (value) or math.isnan (value):
+            self.constants.append (value)
+            return "K [%d]" % (len (self.constants) - 1)
+        return repr (value)
+    
+    #works out an operator on two constants. Integer division by zero crashes a C program, so it becomes a trap() that does the same
+    def fold (self, operator, left, right, kind):
+        value = fold (operator, left, right, kind)
+        if value is None:
+            self.line ("trap ()")
+            return 0
+        return value
+
+#what the generated code does for an integer division by zero, which crashes a C program
+def trap ():
+    raise ZeroDivisionError ("Error! Integer division by zero")
+
+#Compiled programs, most recently used last, keyed by a hash of the source & the optimization level
+cache = collections.OrderedDict()
+cacheLock = threading.Lock()
+
+#Returns the compiled program(read, write) function for some Teeny Tiny source code, from the cache if it's been compiled before
+#A program with errors raises CompileError (see diagnostics.py), like teenytiny.py
+def compileProgram (source, optimize = 0):
+    key = hashlib.sha256 (source.encode()).hexdigest() + ":" + str (optimize)
+    with cacheLock:
+        if key in cache:
+            cache.move_to_end (key)
+            return cache [key]
+    
+    program = Parser (FastLexer (source)).program()
+    Optimizer (optimize).program (program)
+    generator = PythonGenerator()
+    code = compile (generator.program (program), "<teenytiny>", "exec")
+    namespace = {"array": array.array, "copysign": math.copysign, "divide": divide, "trap": trap, "K": generator.constants}
+    exec (code, namespace)
+    function = namespace ["program"]
+    
+    with cacheLock:
+        cache [key] = function
+        if len (cache) > maxCached:
+            cache.popitem (last = False)
+    return function
+
+#Runs a Teeny Tiny program & returns the lines it printed. inputs is what INPUT reads: a string of input text (read the way scanf reads
+#it) or a list of numbers, one per INPUT. An integer division by zero raises ZeroDivisionError
+def run (source, inputs = (), optimize = 0):
+    program = compileProgram (source, optimize)
+    if type (inputs) is not str:
+        inputs = "".join (str (value) + "\n" for value in inputs)
+    output = []
+    program (Scanner (io.StringIO (inputs)).readFloat, output.append)
+    return output
+
+#The Python source code the JIT generates for a Teeny Tiny program, to see what it does
+def pythonSource (source, optimize = 0):
+    program = Parser (FastLexer (source)).program()
+    Optimizer (optimize).program (program)
+    return PythonGenerator().program (program)
+
+def main ():
+    argParser = argparse.ArgumentParser (description = "Run a Teeny Tiny program with the Python JIT")
+    argParser.add_argument ("source", help = "the Teeny Tiny source file")
+    argParser.add_argument ("-O", dest = "optimize", type = int, default = 0, choices = range (4), help = "optimization level, as for teenytiny.py")
+    argParser.add_argument ("--show", action = "store_true", help = "print the Python code the program turns into instead of running it")
+    args = argParser.parse_args()
+    with open (args.source, 'r') as inputFile:
+        source = inputFile.read()
+    
+    try:
+        if args.show:
+            sys.stdout.write (pythonSource (source, args.optimize))
+            return
+        program = compileProgram (source, args.optimize)
+    except CompileError as error:
+        sys.exit ("\n".join (error.report (args.source)))
+    try:
+        program (Scanner (sys.stdin).readFloat, lambda text: sys.stdout.write (text + "\n"))
+    except ZeroDivisionError as error:
+        sys.stdout.flush()
+        sys.exit (str (error))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#The C runtime that --fast-io (see teenytiny.py) puts in front of main(). PRINT & INPUT normally turn into a printf or scanf each,
+#which have to work through their format strings every time; these do the same job directly:
+#   tt_setup        gives stdout a big buffer when it isn't a terminal (on a terminal it's left line buffered, so prompts still show up)
+#   tt_printFloat   prints a float exactly like printf ("%.2f\n") does, including the rounding (ties go to the even digit, like glibc)
+#   tt_printInteger prints an integer variable's value like printf ("%lld.00\n") (see --integers)
+#   tt_readFloat    reads a number for INPUT the way scanf ("%f") does, setting the variable to 0 & skipping the word if it isn't one.
+#                   It copies how glibc's scanf decides how much of the input to take (it takes everything that could still have been
+#                   the start of a number, so "1e" is read as 1, a lone "-" is a mistake that skips the word after it, and "infx" eats
+#                   the "x" too), then hands just that to strtof. It reads stdin with read() so it doesn't wait for a whole buffer of
+#                   input from a terminal
+#Strings that are printed one after another are joined into one fwrite by the code generator (see CGenerator.flushStrings)
+#
+#Note to self: a float times 100 is always exact as a double (a float has 24 bits, 100 needs 5 more), so the hundredths can be
+#rounded as an integer without any error creeping in. Numbers too big for that (and inf & nan) are still handed to printf
+#The names all have an underscore in them, which a Teeny Tiny identifier can't, so they can't clash with the program's variables
+#read() & isatty() are POSIX, so the --fast-io code is for Linux, macOS & the like
+
+fastIOPrelude = """#include <math.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+static char tt_outputBuffer [1 << 16];
+static char tt_inputBuffer [(1 << 16) + 1];
+static size_t tt_inputStart, tt_inputEnd;
+static int tt_inputDone;
+static void tt_setup (void) {
+    if (!isatty (1)) setvbuf (stdout, tt_outputBuffer, _IOFBF, sizeof tt_outputBuffer);
+}
+static void tt_printNumber (int negative, unsigned long long whole, unsigned int cents) {
+    char text [32];
+    char *p = text + sizeof text;
+    *--p = '\\n';
+    *--p = '0' + cents % 10;
+    *--p = '0' + cents / 10;
+    *--p = '.';
+    do {
+        *--p = '0' + whole % 10;
+        whole /= 10;
+    } while (whole);
+    if (negative) *--p = '-';
+    fwrite (p, 1, text + sizeof text - p, stdout);
+}
+static void tt_printInteger (long long value) {
+    tt_printNumber (value < 0, value < 0 ? 0ULL - (unsigned long long) value : (unsigned long long) value, 0);
+}
+static void tt_printFloat (float value) {
+    double scaled = (double) value * 100.0;
+    if (!(scaled < 1e18 && scaled > -1e18)) {
+        printf ("%.2f\\n", value);
+        return;
+    }
+    int negative = signbit (value) != 0;
+    if (negative) scaled = -scaled;
+    unsigned long long hundredths = (unsigned long long) scaled;
+    double rest = scaled - (double) hundredths;
+    if (rest > 0.5 || (rest == 0.5 && (hundredths & 1))) hundredths++;
+    tt_printNumber (negative, hundredths / 100, hundredths % 100);
+}
+static int tt_isSpace (char c) {
+    return c == ' ' || c == '\\t' || c == '\\n' || c == '\\v' || c == '\\f' || c == '\\r';
+}
+static int tt_readMore (void) {
+    if (tt_inputDone) return 0;
+    if (tt_inputStart > 0) {
+        memmove (tt_inputBuffer, tt_inputBuffer + tt_inputStart, tt_inputEnd - tt_inputStart);
+        tt_inputEnd -= tt_inputStart;
+        tt_inputStart = 0;
+    }
+    if (tt_inputEnd == sizeof tt_inputBuffer - 1) return 0;
+    ssize_t count = read (0, tt_inputBuffer + tt_inputEnd, sizeof tt_inputBuffer - 1 - tt_inputEnd);
+    if (count <= 0) {
+        tt_inputDone = 1;
+        return 0;
+    }
+    tt_inputEnd += count;
+    return 1;
+}
+static void tt_skipSpace (void) {
+    for (;;) {
+        while (tt_inputStart < tt_inputEnd && tt_isSpace (tt_inputBuffer [tt_inputStart])) tt_inputStart++;
+        if (tt_inputStart < tt_inputEnd || !tt_readMore()) return;
+    }
+}
+static size_t tt_wordEnd (void) {
+    size_t end = tt_inputStart;
+    for (;;) {
+        while (end < tt_inputEnd && !tt_isSpace (tt_inputBuffer [end])) end++;
+        if (end < tt_inputEnd) return end;
+        size_t length = end - tt_inputStart;
+        int more = tt_readMore();
+        end = tt_inputStart + length;
+        if (!more) return end;
+    }
+}
+static int tt_isDigit (char c, int hex) {
+    return (c >= '0' && c <= '9') || (hex && ((c | 32) >= 'a' && (c | 32) <= 'f'));
+}
+static char *tt_matchWord (char *p, const char *word, int *matched) {
+    while (*word && (*p | 32) == *word) p++, word++;
+    *matched = !*word;
+    return p;
+}
+static void tt_readFloat (float *value) {
+    tt_skipSpace();
+    if (tt_inputStart == tt_inputEnd) return;
+    tt_wordEnd();
+    tt_inputBuffer [tt_inputEnd] = 0;
+    char *start = tt_inputBuffer + tt_inputStart;
+    char *p = start + (*start == '+' || *start == '-');
+    char *number = p;
+    int matched = 1;
+    if ((*p | 32) == 'i' || (*p | 32) == 'n') {
+        int infinity = (*p | 32) == 'i';
+        p = tt_matchWord (p, infinity ? "inf" : "nan", &matched);
+        if (matched && infinity && (*p | 32) == 'i') p = tt_matchWord (p, "inity", &matched);
+        if (!matched && *p) p++;
+    } else {
+        int hex = 0, digits = 0, dot = 0, exponent = 0;
+        if (*p == '0') {
+            p++;
+            if ((*p | 32) == 'x') p++, hex = 1;
+            else digits = 1;
+        }
+        for (;; p++) {
+            if (tt_isDigit (*p, hex && !exponent)) digits = 1;
+            else if (exponent && (p [-1] | 32) == (hex ? 'p' : 'e') && (*p == '+' || *p == '-')) continue;
+            else if (digits && !exponent && (*p | 32) == (hex ? 'p' : 'e')) exponent = dot = 1;
+            else if (!dot && *p == '.') dot = 1;
+            else break;
+        }
+        matched = p != number && !(hex && p == number + 2);
+    }
+    tt_inputStart = p - tt_inputBuffer;
+    if (matched) {
+        char next = *p;
+        char *stop;
+        *p = 0;
+        float converted = strtof (start, &stop);
+        *p = next;
+        matched = stop != start;
+        if (matched) *value = converted;
+    }
+    if (!matched) {
+        *value = 0;
+        tt_skipSpace();
+        tt_inputStart = tt_wordEnd();
+    }
+}"""
@@ -0,0 +1,151 @@
+from teenytiny import compileFile, compileSource
+from client import defaultSocket
+from diagnostics import CompileError
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import sys
+
+#A compile server, so that a build system that compiles lots of small programs doesn't pay for starting Python & importing the compiler every time
+#It listens on a Unix socket & serves any number of clients at once. The requests are compiled by a pool of worker processes, which are forked
+#after the compiler has been imported, so none of them ever import it again. The protocol is described in client.py
+#   python3 server.py [--socket PATH] [-j N]
+
+maxRequest = 256 * 1024 * 1024 #the longest request line (ie. the biggest source) the server will read
+
+#Compiles one request & returns the response. This runs in a worker process
+def compileRequest (message):
+    code = io.StringIO()
+    try:
+        if "path" in message:
+            report = compileFile (message ["path"], code, message ["optimize"])
+        else:
+            report = compileSource (message ["source"], code, message ["optimize"])
+        if "output" in message:
+            writeOutput (message ["output"], code.getvalue())
+    except CompileError as error:
+        return {"status": "error", "errors": error.report (message.get ("path", "<source>")), "diagnostics": [diagnostic.asDict() for diagnostic in error.diagnostics]}
+    except (OSError, ValueError) as error: #eg. a file that can't be read, or isn't UTF-8 text (a UnicodeDecodeError is a ValueError)
+        return {"status": "error", "errors": [str (error)]}
+    except Exception as error: #anything else is still answered, so the client isn't left without a response
+        return {"status": "error", "errors": ["internal compiler error: " + type (error).__name__ + ": " + str (error)]}
+    
+    response = {"status": "ok", "report": report}
+    if "output" not in message:
+        response ["code"] = code.getvalue()
+    return response
+
+#Replaces the output file with the C code. It's only touched once the compile has worked, so an error leaves the last good output in place
+#Note to self: the old file is removed rather than truncated, because truncating a file that was just written makes the filesystem flush it to disk first (see copyOut in cache.py)
+def writeOutput (path, code):
+    with contextlib.suppress (FileNotFoundError):
+        os.remove (path)
+    with open (path, 'w') as outputFile:
+        outputFile.write (code)
+
+#Reads a request line, or returns an error message if it isn't one the server understands
+def parseRequest (line):
+    try:
+        message = json.loads (line)
+    except ValueError as error:
+        return None, "Error! Bad request: " + str (error)
+    if type (message) is not dict or type (message.get ("path", "")) is not str or type (message.get ("source", "")) is not str or type (message.get ("output", "")) is not str:
+        return None, "Error! Bad request: expected a JSON object with a \"path\" or \"source\" string"
+    if ("path" in message) == ("source" in message):
+        return None, "Error! Bad request: give either a \"path\" or a \"source\""
+    message.setdefault ("optimize", 0)
+    if type (message ["optimize"]) is not int or message ["optimize"] not in (0, 1, 2, 3): #Note to self: True == 1 & 1.0 == 1 in Python
+        return None, "Error! Bad request: \"optimize\" must be 0, 1, 2 or 3"
+    return message, None
+
+class CompileServer:
+    def __init__(self, socketPath, jobs = None):
+        self.socketPath = socketPath
+        self.pool = concurrent.futures.ProcessPoolExecutor (max_workers = jobs)
+        self.served = 0 #how many requests have been answered
+    
+    #Answers the requests on one connection, one after the other, until the client closes it
+    #Note to self: asyncio runs one of these for every connection, so while a request waits for a worker the other clients are still served
+    async def handle (self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError: #the line was longer than maxRequest, & what's left of it can't be read as a request
+                    writer.write (json.dumps ({"status": "error", "errors": ["Error! Request too big"]}).encode() + b"\n")
+                    break
+                if not line:
+                    break
+                message, error = parseRequest (line)
+                if error is not None:
+                    response = {"status": "error", "errors": [error]}
+                else:
+                    response = await loop.run_in_executor (self.pool, compileRequest, message)
+                writer.write (json.dumps (response).encode() + b"\n")
+                await writer.drain()
+                self.served += 1
+        except ConnectionError: #the client went away before reading its response
+            pass
+        finally:
+            writer.close()
+    
+    #Listens on the socket until the server is stopped
+    async def serve (self):
+        self.removeStaleSocket()
+        #only the user who started the server can send it paths to read & write. The socket is made with no permissions for anyone else
+        #Note to self: setting them with chmod afterwards would leave a moment when another user could connect, so the umask is set first
+        umask = os.umask (0o077)
+        try:
+            server = await asyncio.start_unix_server (self.handle, path = self.socketPath, limit = maxRequest)
+        finally:
+            os.umask (umask)
+        
+        #compile something straight away, so the first real request doesn't have to wait for a worker to start
+        await asyncio.get_running_loop().run_in_executor (self.pool, compileRequest, {"source": "", "optimize": 0})
+        print ("Compile server listening on " + self.socketPath, flush = True)
+        
+        #kill (SIGTERM) stops the server the same way Ctrl+C does, so the socket file is still cleaned up
+        asyncio.get_running_loop().add_signal_handler (signal.SIGTERM, asyncio.current_task().cancel)
+        async with server:
+            await server.serve_forever()
+    
+    #A socket file is left behind if a server is killed. It's only removed if nothing answers on it, so a running server isn't stolen from
+    def removeStaleSocket (self):
+        if not os.path.exists (self.socketPath):
+            return
+        with socket.socket (socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect (self.socketPath)
+            except OSError:
+                os.unlink (self.socketPath)
+                return
+        sys.exit ("Error! A compile server is already running on " + self.socketPath)
+    
+    def close (self):
+        self.pool.shutdown (cancel_futures = True)
+        if os.path.exists (self.socketPath):
+            os.unlink (self.socketPath)
+
+def main ():
+    argParser = argparse.ArgumentParser (description = "Serve Teeny Tiny compiles over a Unix socket (see client.py)")
+    argParser.add_argument ("--socket", default = defaultSocket(), help = "where to listen (default: " + defaultSocket() + ")")
+    argParser.add_argument ("-j", "--jobs", type = int, default = None, help = "number of worker processes (default: one per core)")
+    args = argParser.parse_args()
+    
+    compileServer = CompileServer (args.socket, args.jobs)
+    try:
+        asyncio.run (compileServer.serve())
+    except (KeyboardInterrupt, asyncio.CancelledError): #the server was stopped with Ctrl+C or kill
+        pass
+    finally:
+        compileServer.close()
+
+if __name__ == "__main__":
+    main()
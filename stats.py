@@ -0,0 +1,155 @@
+from lex import *
+from tree import *
+import collections
+import contextlib
+import os
+import time
+
+#CompileStats records what a compile did (see --stats in teenytiny.py): how long each phase took, how many tokens of each kind
+#the lexer made, how many statements of each kind there are, how deeply they're nested & how big the C code is
+#It's only made when it's asked for, and the compiler checks for None before using it, so a compile without it costs the same as before
+
+#the phases, in the order they run
+phases = ("lex", "parse", "optimize", "codegen", "write")
+
+#stats.phase, or (when there are no stats) something that can be used the same way but does nothing
+def phaseTimer (stats):
+    if stats is None:
+        return lambda phase: contextlib.nullcontext()
+    return stats.phase
+
+class CompileStats:
+    def __init__(self):
+        self.seconds = {phase: 0.0 for phase in phases}
+        self.tokenCounts = collections.Counter() #TokenType -> how many
+        self.statementCounts = collections.Counter() #node class name (eg. "Let") -> how many, including the ones in bodies
+        self.maxDepth = 0 #how many IFs & WHILEs deep the deepest statement is
+        self.outputBytes = 0
+        self.cacheHit = False #True when the output was copied from the compile cache, so none of the phases ran
+        self.loadSeconds = 0.0 #how long looking it up & copying it took
+        self.running = [] #the phases that have started & not ended yet, innermost last
+        self.started = 0.0 #when the time of the innermost running phase was last added up
+    
+    #Phases can run inside each other (the parser asks the lexer for each token), and the time is given to the innermost one only,
+    #so that the parse time doesn't include the lexing. Note to self: these are plain methods rather than a context manager because
+    #the lexer calls them for every token, and "with" would cost more than the lexing itself
+    def enter (self, phase):
+        now = time.perf_counter()
+        if self.running:
+            self.seconds [self.running [-1]] += now - self.started
+        self.running.append (phase)
+        self.started = now
+    
+    def leave (self):
+        now = time.perf_counter()
+        self.seconds [self.running.pop()] += now - self.started
+        self.started = now
+    
+    #times everything inside a "with" as one phase
+    @contextlib.contextmanager
+    def phase (self, phase):
+        self.enter (phase)
+        try:
+            yield
+        finally:
+            self.leave()
+    
+    #Wraps a lexer so that each token is counted & the time spent making it goes to the lex phase
+    def watch (self, lexer):
+        return WatchedLexer (lexer, self)
+    
+    #Counts the statements in the program & how deeply they're nested
+    def countStatements (self, statements):
+        pending = [(statements, 0)]
+        while pending:
+            body, depth = pending.pop()
+            for statement in body:
+                self.statementCounts [type (statement).__name__] += 1
+                if type (statement) is If or type (statement) is While:
+                    self.maxDepth = max (self.maxDepth, depth + 1)
+                    pending.append ((statement.body, depth + 1))
+    
+    #Wraps a file-like output so that the bytes written to it are counted. A path is left as it is, and countFile() measures the file instead
+    def countOutput (self, output):
+        if hasattr (output, 'write'):
+            return CountingOutput (output, self)
+        return output
+    
+    def countFile (self, output):
+        if not hasattr (output, 'write'):
+            self.outputBytes = os.path.getsize (output)
+    
+    #Records that the output was copied from the compile cache instead of being compiled
+    def loadedFromCache (self, seconds, output):
+        self.cacheHit = True
+        self.loadSeconds = seconds
+        self.countFile (output)
+    
+    def total (self):
+        return sum (self.seconds.values())
+    
+    #A human readable report, as a list of lines
+    def report (self):
+        if self.cacheHit:
+            lines = ["cache hit: the code was loaded from the cache in %.4fs, so nothing was compiled" % self.loadSeconds]
+            if self.outputBytes:
+                lines.append ("C code: %d bytes" % self.outputBytes)
+            return lines
+        total = self.total()
+        tokens = sum (self.tokenCounts.values())
+        statements = sum (self.statementCounts.values())
+        lines = ["%-10s %9s" % ("phase", "seconds")]
+        for phase in phases:
+            share = 100.0 * self.seconds [phase] / total if total else 0.0
+            lines.append ("%-10s %8.4fs %5.1f%%" % (phase, self.seconds [phase], share))
+        lines.append ("%-10s %8.4fs" % ("total", total))
+        if self.seconds ["lex"]:
+            lines.append ("%d tokens (%.0f tokens/s): " % (tokens, tokens / self.seconds ["lex"]) + ", ".join ("%s %d" % (kind.name, count) for kind, count in self.tokenCounts.most_common()))
+        if self.seconds ["parse"]:
+            lines.append ("%d statements (%.0f statements/s): " % (statements, statements / self.seconds ["parse"]) + ", ".join ("%s %d" % (kind, count) for kind, count in self.statementCounts.most_common()))
+        lines.append ("deepest nesting: %d, C code: %d bytes" % (self.maxDepth, self.outputBytes))
+        return lines
+    
+    #The same as report(), for --stats=json
+    def asDict (self):
+        return {
+            "seconds": dict (self.seconds, total = self.total()),
+            "tokens": {kind.name: count for kind, count in self.tokenCounts.most_common()},
+            "statements": dict (self.statementCounts.most_common()),
+            "maxDepth": self.maxDepth,
+            "outputBytes": self.outputBytes,
+            "cacheHit": self.cacheHit,
+            "loadSeconds": self.loadSeconds,
+        }
+
+#Hands out the tokens of another lexer, counting them by kind & timing them as the lex phase
+class WatchedLexer:
+    def __init__(self, lexer, stats):
+        self.lexer = lexer
+        self.stats = stats
+    
+    def getToken (self):
+        self.stats.enter ("lex")
+        try:
+            token = self.lexer.getToken()
+        finally:
+            self.stats.leave()
+        self.stats.tokenCounts [token.kind] += 1
+        return token
+
+#Passes writes through to a file-like output, counting the bytes
+class CountingOutput:
+    def __init__(self, output, stats):
+        self.output = output
+        self.stats = stats
+    
+    def write (self, text):
+        self.stats.outputBytes += len (text.encode())
+        return self.output.write (text)
+    
+    def writelines (self, lines):
+        for line in lines:
+            self.write (line)
+    
+    def flush (self):
+        self.output.flush()
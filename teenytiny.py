@@ -3,31 +3,247 @@
 #to use the open function, you must delcare a variable for it first, and the open() function can take up to 3 parameters: filename, mode, encoding
 
 
-
 from lex import * #the * instructs Python to implement all public names (functions, classes, variables, etc.) from the lex module into the curernt namespace
 from emit import *
 from parse import * 
+from cgen import *
+from llvmgen import *
+from optimize import *
+from cache import *
+from vm import *
+from incremental import *
+from stats import *
+from infer import *
+import argparse
+import cProfile
+import json
+import os
 import sys
+import time
 
 
-def main ():
-    print ("Teeny Tiny Compiler")
+#Compiles one Teeny Tiny source file to C. output is the path to write the C code to, or a file-like object
+#With a CompileCache, a source that was compiled before with the same options is copied from the cache instead
+#Returns the optimizer's report (a list of lines), which is empty at -O0 or when the output came from the cache
+#With a CompileStats (see stats.py), what each phase of the compile did is recorded in it (or that it was a cache hit & how long that took)
+#With integers, the variables that only ever hold whole numbers are made long long integers in the C code (see infer.py)
+#With fastIO, PRINT & INPUT use a small buffered runtime instead of printf & scanf (see runtime.py)
+#target is what to compile to, one of the keys of extensions (eg. "llvm" writes LLVM IR instead of C, see llvmgen.py)
+def compileFile (sourcePath, output, optimize = 0, stream = False, cache = None, stats = None, integers = False, fastIO = False, target = "c"):
+    if cache is None:
+        return generateC (sourcePath, output, optimize, stream, stats, integers, fastIO, target)
     
-    if len(sys.argv) != 2: #Note to self: sys.argv is a list of command-line arguments as strings. You run the program via the command line
-        sys.exit ("Error: Compiler needs some source as argument")
-    with open (sys.argv[1], 'r') as inputFile:
-        source = inputFile.read()
+    start = time.perf_counter()
+    key = cache.key (sourcePath, (optimize, stream, integers, fastIO, target))
+    if cache.fetch (key, extensions [target], output):
+        if stats is not None:
+            stats.loadedFromCache (time.perf_counter() - start, output)
+        return []
+    with cache.store (key, extensions [target]) as temporary:
+        report = generateC (sourcePath, temporary, optimize, stream, stats, integers, fastIO, target)
+        copyOut (temporary, output)
+    return report
+
+#the file extension of each target's output
+extensions = {"c": ".c", "llvm": ".ll"}
+
+#the code generator for a target
+def codeGenerator (emitter, target, integers = (), fastIO = False):
+    if target == "llvm":
+        return LLVMGenerator (emitter, integers)
+    return CGenerator (emitter, integers, fastIO)
+
+#Runs the lexer, parser, optimizer & code generator over a source file
+#Note to self: type inference needs to see every LET before any C is generated, so it's only done for a whole program, not with stream
+def generateC (sourcePath, output, optimize, stream, stats = None, integers = False, fastIO = False, target = "c"):
+    optimizer = Optimizer (optimize)
+    if stream:
+        phase = phaseTimer (stats)
+        
+        #Nothing holds the whole program: the lexer reads the file line by line & the emitter spools the C code to a temporary file
+        with open (sourcePath, 'r') as inputFile:
+            lexer = StreamLexer(inputFile)
+            if stats is not None:
+                lexer = stats.watch (lexer)
+                output = stats.countOutput (output)
+            emitter = StreamEmitter (output)
+            parser = Parser (lexer)
+            generator = codeGenerator (emitter, target, fastIO = fastIO)
+            
+            #each top level statement is turned into C as soon as it's parsed, so only one statement's tree is ever in memory
+            generator.begin()
+            with phase ("parse"):
+                for statement in parser.statements():
+                    with phase ("optimize"):
+                        statement = optimizer.statement (statement)
+                    with phase ("codegen"):
+                        generator.statement (statement)
+                    if stats is not None:
+                        stats.countStatements ([statement])
+            generator.end()
+            with phase ("write"):
+                emitter.writeFile()
+            if stats is not None:
+                stats.countFile (output)
+    else:
+        with open (sourcePath, 'r') as inputFile:
+            source = inputFile.read()
+        return compileSource (source, output, optimize, stats, integers, fastIO, target)
+    return optimizer.report()
+
+#Compiles Teeny Tiny source code that's already in a string (eg. sent to server.py) & returns the optimizer's report
+def compileSource (source, output, optimize = 0, stats = None, integers = False, fastIO = False, target = "c"):
+    optimizer = Optimizer (optimize)
+    phase = phaseTimer (stats)
     
     #Initialize the lexer, emitter and parser 
-    lexer = Lexer(source)
-    emitter = Emitter ("out.c")
-    parser = Parser (lexer, emitter)
+    lexer = FastLexer(source)
+    if stats is not None:
+        lexer = stats.watch (lexer) #counts the tokens & times the lexing
+        output = stats.countOutput (output)
+    emitter = Emitter (output)
+    parser = Parser (lexer)
     
+    with phase ("parse"):
+        program = parser.program() #Start the parser, which builds the syntax tree
+    with phase ("optimize"):
+        optimizer.program (program) #Simplify the tree (does nothing at -O0)
+        variables = integerVariables (program) if integers else set() #Find the variables that can be integers
+    with phase ("codegen"):
+        codeGenerator (emitter, target, variables, fastIO).program (program) #Generate the C code (or LLVM IR) from the tree
+    with phase ("write"):
+        emitter.writeFile() #Write the output to file
+    if stats is not None:
+        stats.countStatements (program.statements)
+        stats.countFile (output)
+    report = optimizer.report()
+    if integers:
+        report.append ("type inference: %d of %d variables are integers" % (len (variables), len (program.variables)))
+    return report
+
+#Runs a Teeny Tiny source file in the bytecode VM (see vm.py) instead of compiling it to C
+#An integer division by zero raises ZeroDivisionError, like VM.run
+def runFile (sourcePath, optimize = 0, inputFile = None, outputFile = None):
+    with open (sourcePath, 'r') as inputSource:
+        source = inputSource.read()
+    program = Parser (FastLexer (source)).program()
+    Optimizer (optimize).program (program)
+    runProgram (program, inputFile, outputFile)
+
+#Recompiles the source every time the file changes, re-parsing only the statements that changed (see incremental.py)
+def watchFile (sourcePath, output, optimize, log):
+    compiler = IncrementalCompiler (optimize)
+    modified = None
+    while True:
+        if os.stat (sourcePath).st_mtime_ns != modified:
+            modified = os.stat (sourcePath).st_mtime_ns
+            with open (sourcePath, 'r') as inputFile:
+                source = inputFile.read()
+            start = time.perf_counter()
+            try:
+                compiler.update (source)
+            except CompileError as error:
+                for line in error.report (sourcePath):
+                    print (line, file = log)
+            else:
+                compiler.writeFile (output)
+                print ("Recompiled %d of %d statements in %.1fms" % (compiler.reparsed, len (compiler.chunks), (time.perf_counter() - start) * 1000), file = log)
+        time.sleep (0.1)
+
+def main ():
+    #Note to self: argparse reads sys.argv (the list of command-line arguments as strings) & prints a usage message if they're wrong
+    argParser = argparse.ArgumentParser (description = "Compile a Teeny Tiny program to C (or LLVM IR)")
+    argParser.add_argument ("source", help = "the Teeny Tiny source file")
+    argParser.add_argument ("-o", "--output", help = "where to write the code (default: out.c, or out.ll with --target llvm, use - for stdout)")
+    argParser.add_argument ("--target", default = "c", choices = sorted (extensions), help = "what to compile to: C for gcc (the default), or LLVM IR for llc or lli")
+    argParser.add_argument ("-O", dest = "optimize", type = int, default = 0, choices = range (4), help = "optimization level: 1 folds constants & simplifies identities, 2 also reduces strength & removes dead code, 3 also optimizes loops")
+    argParser.add_argument ("--stream", action = "store_true", help = "lex the source a line at a time and spool the C code to disk, so memory stays bounded for huge programs")
+    argParser.add_argument ("--watch", action = "store_true", help = "keep running & recompile whenever the source changes, re-parsing only the statements that changed (-O0 & -O1 only)")
+    argParser.add_argument ("--run", action = "store_true", help = "run the program in the bytecode VM straight away instead of writing C code")
+    argParser.add_argument ("--cache", metavar = "DIR", help = "reuse the C code from an earlier compile of the same source, kept in this directory")
+    argParser.add_argument ("--cache-size", type = int, default = 256, metavar = "MB", help = "how big the cache can grow before old entries are deleted (default: 256)")
+    argParser.add_argument ("--stats", nargs = "?", const = "text", choices = ("text", "json"), help = "report the time each phase took, the tokens & statements of each kind, the deepest nesting & the size of the C code")
+    argParser.add_argument ("--profile", metavar = "FILE", help = "run the compile under cProfile & save the profile to FILE (read it with: python3 -m pstats FILE)")
+    argParser.add_argument ("--integers", action = "store_true", help = "make the variables that only ever hold whole numbers long long integers instead of floats, so they're exact & faster")
+    argParser.add_argument ("--fast-io", action = "store_true", help = "print & read numbers with a small buffered runtime instead of printf & scanf, for programs that PRINT or INPUT a lot (the output is the same)")
+    args = argParser.parse_args()
+    if args.watch and args.optimize > 1:
+        argParser.error ("--watch only supports -O0 and -O1")
+    if (args.stats or args.profile) and (args.run or args.watch):
+        argParser.error ("--stats & --profile only work when compiling to C")
+    if args.integers and (args.run or args.watch or args.stream):
+        argParser.error ("--integers needs the whole program compiled to C at once, so it doesn't work with --run, --watch or --stream")
+    if args.fast_io and (args.run or args.watch):
+        argParser.error ("--fast-io only works when compiling to C, and not with --watch")
+    if args.target != "c" and (args.run or args.watch or args.fast_io):
+        argParser.error ("--target " + args.target + " doesn't work with --run, --watch or --fast-io")
+    if args.output is None:
+        args.output = "out" + extensions [args.target]
     
-    parser.program() #Start the parser
-    emitter.writeFile() #Write the output to file
-    
-    print ("Compiling completed.")
+    #every error in the program is reported (one per line, as file:line:col: message) before exiting
+    try:
+        build (args)
+    except CompileError as error:
+        sys.exit ("\n".join (error.report (args.source)))
+    except ZeroDivisionError as error:
+        sys.exit (str (error)) #only --run can get here, when the program divides an integer by zero
 
-main()
+#Does what the command-line arguments ask for
+def build (args):
+    if args.run:
+        runFile (args.source, args.optimize)
+        return
+    
+    #when the C code goes to stdout, the progress messages go to stderr so that they don't end up mixed into it
+    if args.output == "-":
+        output = sys.stdout
+        log = sys.stderr
+    else:
+        output = args.output
+        log = sys.stdout
+    print ("Teeny Tiny Compiler", file = log)
+    
+    if args.watch:
+        try:
+            watchFile (args.source, output, args.optimize, log)
+        except KeyboardInterrupt: #Ctrl+C is how watching stops
+            pass
+        return
+    
+    cache = None
+    if args.cache:
+        cache = CompileCache (args.cache, args.cache_size * 1024 * 1024)
+    
+    stats = None
+    if args.stats:
+        stats = CompileStats()
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        report = compileFile (args.source, output, args.optimize, args.stream, cache, stats, args.integers, args.fast_io, args.target)
+    finally:
+        #the profile is saved even if the compile fails, since that can be what's being looked into
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats (args.profile)
+    
+    for line in report:
+        print (line, file = log)
+    if cache is not None:
+        print (cache.report(), file = log)
+    if args.stats == "json":
+        print (json.dumps (stats.asDict(), indent = 2), file = log)
+    elif stats is not None:
+        for line in stats.report():
+            print (line, file = log)
+    if profiler is not None:
+        print ("Profile saved to " + args.profile, file = log)
+        if cache is not None and cache.hits:
+            print ("The output came from the cache, so the profile only covers looking it up", file = log)
+    print ("Compiling completed.", file = log)
 
+#Note to self: __name__ is only "__main__" when this file is run as a script, so other modules (eg. batch.py) can import compileFile without compiling anything
+if __name__ == "__main__":
+    main()
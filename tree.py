@@ -0,0 +1,118 @@
+#The abstract syntax tree (AST) that the Parser builds & the code generators walk
+#Every grammar rule gets its own kind of node. Statements remember the line they started on so that later passes can report where things are
+#Note to self: __slots__ gives every node a fixed set of fields instead of a per-instance __dict__, which keeps a big tree small in memory
+
+#program ::= {statement}
+class Program:
+    __slots__ = ("statements", "variables")
+    
+    def __init__(self, statements, variables):
+        self.statements = statements #the top level statements, in order
+        self.variables = variables #every variable in the order it was first declared (by LET or INPUT)
+
+#"PRINT" string
+class PrintString:
+    __slots__ = ("text", "line")
+    
+    def __init__(self, text, line):
+        self.text = text
+        self.line = line
+
+#"PRINT" expression
+class Print:
+    __slots__ = ("expression", "line")
+    
+    def __init__(self, expression, line):
+        self.expression = expression
+        self.line = line
+
+#"IF" comparison "THEN" nl {statement} "ENDIF"
+class If:
+    __slots__ = ("condition", "body", "line")
+    
+    def __init__(self, condition, body, line):
+        self.condition = condition
+        self.body = body #list of statements
+        self.line = line
+
+#"WHILE" comparison "REPEAT" nl {statement} "ENDWHILE"
+class While:
+    __slots__ = ("condition", "body", "line")
+    
+    def __init__(self, condition, body, line):
+        self.condition = condition
+        self.body = body #list of statements
+        self.line = line
+
+#"LABEL" ident
+class Label:
+    __slots__ = ("name", "line")
+    
+    def __init__(self, name, line):
+        self.name = name
+        self.line = line
+
+#"GOTO" ident
+class Goto:
+    __slots__ = ("name", "line")
+    
+    def __init__(self, name, line):
+        self.name = name
+        self.line = line
+
+#"LET" ident "=" expression
+class Let:
+    __slots__ = ("name", "expression", "line")
+    
+    def __init__(self, name, expression, line):
+        self.name = name
+        self.expression = expression
+        self.line = line
+
+#"INPUT" ident
+class Input:
+    __slots__ = ("name", "line")
+    
+    def __init__(self, name, line):
+        self.name = name
+        self.line = line
+
+#A number exactly as it was written in the source (eg. "007" or "1.50"), so that the generated code can use the same text
+class Number:
+    __slots__ = ("text",)
+    
+    def __init__(self, text):
+        self.text = text
+
+#A variable being read
+class Variable:
+    __slots__ = ("name",)
+    
+    def __init__(self, name):
+        self.name = name
+
+#["+" | "-"] primary
+class Unary:
+    __slots__ = ("operator", "operand")
+    
+    def __init__(self, operator, operand):
+        self.operator = operator
+        self.operand = operand
+
+#Arithmetic (+ - * /) & comparisons (== != > >= < <=), with the operator's text
+class Binary:
+    __slots__ = ("operator", "left", "right")
+    
+    def __init__(self, operator, left, right):
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+#How tightly each binary operator binds. These are C's precedences, which the grammar's rules already follow,
+#except that C binds < <= > >= tighter than == & != (the grammar lets them be chained in any order)
+precedence = {
+    "==": 1, "!=": 1,
+    "<": 2, "<=": 2, ">": 2, ">=": 2,
+    "+": 3, "-": 3,
+    "*": 4, "/": 4,
+}
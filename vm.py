@@ -0,0 +1,514 @@
+from tree import *
+from cmodel import *
+import array
+import math
+import re
+import struct
+import sys
+
+#A bytecode compiler & virtual machine, so that a Teeny Tiny program can be run straight away without going through gcc
+#
+#The VM is register based: every variable, every constant & every temporary value gets a register, and an instruction names
+#the registers it reads & writes (eg. "ADDF 3 0 5" is R[3] = R[0] + R[5] rounded to a float). That means "LET x = x + 1" is a single
+#instruction instead of the 4 (load, load, add, store) a stack machine would need, which matters a lot when every instruction costs
+#a trip around a Python loop. Each instruction is 4 ints (opcode & 3 operands) in one flat array, and the constants are the starting
+#values of their registers, so the whole program is two arrays & a list of the strings it prints
+#
+#Programs give exactly the same output as the C code from CGenerator: values are rounded to floats (single precision) wherever the
+#C code would round them, & C's rules for mixing ints, floats & doubles are followed (see cmodel.py). An expression that only uses
+#numbers is worked out when it's compiled (C's integer arithmetic can only ever see numbers, since every variable is a float)
+
+#The opcodes. d is the register written to, a & b are registers read from, t is the index of an instruction to jump to
+MOVE = 0        #d a        R[d] = R[a]
+NEGATE = 1      #d a        R[d] = -R[a]
+TOFLOAT = 2     #d a        R[d] = R[a] rounded to a float
+ADDF = 3        #d a b      float arithmetic, the result is rounded to a float
+SUBF = 4
+MULF = 5
+DIVF = 6
+ADDD = 7        #d a b      double arithmetic
+SUBD = 8
+MULD = 9
+DIVD = 10
+EQ = 11         #d a b      R[d] = 1 if R[a] == R[b] else 0 (and so on for the other comparisons)
+NE = 12
+LT = 13
+LE = 14
+GT = 15
+GE = 16
+JUMP = 17       #t
+JUMPIF = 18     #a t        jump if R[a] isn't 0
+JUMPIFNOT = 19  #a t        jump if R[a] is 0
+JUMPEQ = 20     #a b t      jump if R[a] == R[b] (and so on)
+JUMPNE = 21
+JUMPLT = 22
+JUMPLE = 23
+JUMPGT = 24
+JUMPGE = 25
+JUMPNOTEQ = 26  #a b t      jump unless R[a] == R[b] (and so on). Note to self: "not a < b" isn't "a >= b" when one of them is a nan
+JUMPNOTNE = 27
+JUMPNOTLT = 28
+JUMPNOTLE = 29
+JUMPNOTGT = 30
+JUMPNOTGE = 31
+PRINT = 32      #a          prints R[a] rounded to a float, with 2 decimal places
+PRINTSTRING = 33 #s         prints strings[s]
+INPUT = 34      #d          reads a float into R[d] the way scanf does
+TRAP = 35       #           integer division by zero, which crashes a C program
+HALT = 36
+
+#the opcodes for each operator
+floatOpcodes = {"+": ADDF, "-": SUBF, "*": MULF, "/": DIVF}
+doubleOpcodes = {"+": ADDD, "-": SUBD, "*": MULD, "/": DIVD}
+compareOpcodes = {"==": EQ, "!=": NE, "<": LT, "<=": LE, ">": GT, ">=": GE}
+jumpIfOpcodes = {"==": JUMPEQ, "!=": JUMPNE, "<": JUMPLT, "<=": JUMPLE, ">": JUMPGT, ">=": JUMPGE}
+jumpUnlessOpcodes = {"==": JUMPNOTEQ, "!=": JUMPNOTNE, "<": JUMPNOTLT, "<=": JUMPNOTLE, ">": JUMPNOTGT, ">=": JUMPNOTGE}
+
+#A compiled program
+class Bytecode:
+    def __init__(self, code, registers, strings, variables):
+        self.code = code #array of ints, 4 per instruction
+        self.registers = registers #array of doubles, the starting value of every register (the constants' registers hold the constants)
+        self.strings = strings #the strings printed by PRINTSTRING
+        self.variables = variables #the register of each variable
+
+
+#BytecodeCompiler turns the abstract syntax tree into Bytecode
+class BytecodeCompiler:
+    def __init__(self):
+        self.code = array.array ('i')
+        self.registers = array.array ('d')
+        self.strings = []
+        self.variables = {} #the register of each variable
+        self.constants = {} #the register of each constant, keyed by the bytes of its value (so that 0.0 & -0.0 are kept apart)
+        self.temporaries = [] #registers used for the partial results of expressions
+        self.depth = 0 #how many of the temporaries are in use
+        self.labels = {} #the instruction each label is at
+        self.gotos = [] #(instruction, label) for every GOTO, which are filled in once all the labels are known
+        
+        #which method handles each kind of statement
+        self.statementMethods = {
+            PrintString: self.printString,
+            Print: self.printExpression,
+            If: self.ifStatement,
+            While: self.whileStatement,
+            Label: self.label,
+            Goto: self.goto,
+            Let: self.let,
+            Input: self.input,
+        }
+    
+    #Compiles the whole program
+    def program (self, program):
+        for name in program.variables:
+            self.variable (name)
+        for statement in program.statements:
+            self.statement (statement)
+        self.emit (HALT)
+        for instruction, name in self.gotos:
+            self.code [instruction * 4 + 1] = self.labels [name]
+        return Bytecode (self.code, self.registers, self.strings, self.variables)
+    
+    #adds an instruction & returns its index
+    def emit (self, opcode, a = 0, b = 0, c = 0):
+        self.code.extend ((opcode, a, b, c))
+        return len (self.code) // 4 - 1
+    
+    #the index the next instruction will have
+    def here (self):
+        return len (self.code) // 4
+    
+    #points the jump instruction at target. Note to self: the target is always the last operand that the jump uses
+    def patch (self, instruction, target):
+        opcode = self.code [instruction * 4]
+        if opcode == JUMP:
+            self.code [instruction * 4 + 1] = target
+        elif opcode == JUMPIF or opcode == JUMPIFNOT:
+            self.code [instruction * 4 + 2] = target
+        else:
+            self.code [instruction * 4 + 3] = target
+    
+    #adds a register with a starting value & returns its number
+    def register (self, value = 0.0):
+        self.registers.append (value)
+        return len (self.registers) - 1
+    
+    def variable (self, name):
+        if name not in self.variables:
+            self.variables [name] = self.register()
+        return self.variables [name]
+    
+    #the register holding a constant, which is shared by every use of the same value
+    def constant (self, value):
+        key = struct.pack ('d', value)
+        if key not in self.constants:
+            self.constants [key] = self.register (value)
+        return self.constants [key]
+    
+    #the register for the next partial result. Temporaries are handed out & given back like a stack, so only as many are needed as
+    #the deepest expression has partial results
+    def temporary (self):
+        if self.depth == len (self.temporaries):
+            self.temporaries.append (self.register())
+        self.depth += 1
+        return self.temporaries [self.depth - 1]
+    
+    #The method for an IF or WHILE compiles what comes before its body, and returns the body with a function that finishes the block
+    #once the body's been compiled. They're walked here with a stack instead of by recursion, so deeply nested code can be compiled
+    def statement (self, node):
+        work = [node]
+        while work:
+            node = work.pop()
+            if callable (node):
+                node()
+                self.depth = 0
+                continue
+            block = self.statementMethods [type (node)] (node)
+            if block is None:
+                self.depth = 0 #no partial results are kept between statements
+            else:
+                body, finish = block
+                work.append (finish)
+                work.extend (reversed (body))
+    
+    # "PRINT" string
+    def printString (self, node):
+        self.strings.append (node.text)
+        self.emit (PRINTSTRING, len (self.strings) - 1)
+    
+    # "PRINT" expression - PRINT rounds the value to a float itself, like the (float) cast in the C code
+    def printExpression (self, node):
+        self.emit (PRINT, self.operand (node.expression, FLOAT))
+    
+    # "IF" comparision "THEN" {statement} "ENDIF"
+    def ifStatement (self, node):
+        skip = self.condition (node.condition, False)
+        def finish ():
+            if skip is not None:
+                self.patch (skip, self.here())
+        return node.body, finish
+    
+    # "WHILE" comparision "REPEAT" {statement} "ENDWHILE"
+    #The condition is tested at the bottom of the loop, so each time around the loop only takes one jump
+    def whileStatement (self, node):
+        start = self.emit (JUMP)
+        top = self.here()
+        def finish ():
+            self.patch (start, self.here())
+            repeat = self.condition (node.condition, True)
+            if repeat is not None:
+                self.patch (repeat, top)
+        return node.body, finish
+    
+    # "LABEL" ident
+    def label (self, node):
+        self.labels [node.name] = self.here()
+    
+    # "GOTO" ident
+    def goto (self, node):
+        self.gotos.append ((self.emit (JUMP), node.name))
+    
+    # "LET" ident "=" expression - the value is rounded to a float as it's stored, since every variable is a float
+    def let (self, node):
+        target = self.variable (node.name)
+        kind, register, value = self.expression (node.expression, target)
+        if register is None:
+            self.emit (MOVE, target, self.constant (f32 (value)))
+        elif kind == DOUBLE:
+            self.emit (TOFLOAT, target, register)
+        elif register != target:
+            self.emit (MOVE, target, register)
+    
+    # "INPUT" ident
+    def input (self, node):
+        self.emit (INPUT, self.variable (node.name))
+    
+    #Emits a jump that is taken when the condition is the same as when (True or False) & returns it so that it can be patched,
+    #or None if the condition is a constant that never takes the jump
+    def condition (self, node, when):
+        if type (node) is Binary and node.operator in comparisons:
+            left = self.expression (node.left)
+            right = self.expression (node.right)
+            kind = max (left [0], right [0])
+            if left [1] is None and right [1] is None:
+                value = self.fold (node.operator, left [2], right [2], kind)
+                register = None
+            else:
+                opcodes = jumpIfOpcodes if when else jumpUnlessOpcodes
+                return self.emit (opcodes [node.operator], self.place (left, kind), self.place (right, kind))
+        else:
+            kind, register, value = self.expression (node)
+        
+        if register is None:
+            if (value != 0) == when:
+                return self.emit (JUMP)
+            return None
+        return self.emit (JUMPIF if when else JUMPIFNOT, register)
+    
+    #Compiles an expression, returning its (kind, register, value). A constant expression is worked out here, so it has no register
+    #(None) & its value instead. target is the register the result should go into, if that doesn't take an extra instruction
+    def expression (self, node, target = None):
+        if type (node) is Number:
+            kind = literalType (node.text)
+            if kind is None:
+                kind = LONG #too big even for a long. Note to self: gcc makes it a wider type (& warns about it), which this won't match
+            return kind, None, literalValue (node.text)
+        
+        if type (node) is Variable:
+            return FLOAT, self.variables [node.name], None
+        
+        if type (node) is Unary:
+            kind, register, value = self.expression (node.operand)
+            if node.operator == "+":
+                return kind, register, value
+            if register is None:
+                if kind == INT or kind == LONG:
+                    return kind, None, wrap (-value, kind)
+                return kind, None, -value
+            destination = self.result (target)
+            self.emit (NEGATE, destination, register)
+            return kind, destination, None
+        
+        depth = self.depth
+        left = self.expression (node.left)
+        right = self.expression (node.right)
+        operands = max (left [0], right [0]) #both sides are converted to the bigger of their types
+        kind = INT if node.operator in comparisons else operands
+        if left [1] is None and right [1] is None:
+            self.depth = depth
+            return kind, None, self.fold (node.operator, left [2], right [2], operands)
+        
+        a = self.place (left, operands)
+        b = self.place (right, operands)
+        self.depth = depth #the partial results of the two sides aren't needed once this has been worked out
+        if node.operator in comparisons:
+            opcode = compareOpcodes [node.operator]
+        elif operands == FLOAT:
+            opcode = floatOpcodes [node.operator]
+        else:
+            opcode = doubleOpcodes [node.operator] #Note to self: an int operand here can only be the 0 or 1 of a comparison, which a double holds exactly
+        destination = self.result (target)
+        self.emit (opcode, destination, a, b)
+        return kind, destination, None
+    
+    #the register to put a result in
+    def result (self, target):
+        if target is not None:
+            return target
+        return self.temporary()
+    
+    #the register holding a compiled expression's value, converted to kind the way C converts the operands of an operator
+    def place (self, operand, kind):
+        operandKind, register, value = operand
+        if register is None:
+            return self.constant (float (convert (value, kind)))
+        return register
+    
+    #compiles the expression & returns the register holding it (which is a constant's register for a constant)
+    def operand (self, node, kind):
+        return self.place (self.expression (node), kind)
+    
+    #works out an operator on two constants. Integer division by zero crashes a C program, so it becomes a TRAP that does the same
+    def fold (self, operator, left, right, kind):
+        value = fold (operator, left, right, kind)
+        if value is None:
+            self.emit (TRAP)
+            return 0
+        return value
+
+#Works out "left operator right" on two constants, which have been converted to kind. Returns None for an integer division that
+#crashes a C program (by zero, or the smallest int by -1). Integer overflow wraps around, the way the machine does
+def fold (operator, left, right, kind):
+    value = arithmetic (operator, left, right, kind)
+    if value is not None or kind >= FLOAT or operator in comparisons:
+        return value
+    if operator == "/":
+        return None
+    left = convert (left, kind)
+    right = convert (right, kind)
+    if operator == "+": return wrap (left + right, kind)
+    if operator == "-": return wrap (left - right, kind)
+    return wrap (left * right, kind)
+
+#wraps an integer around to fit an int or a long, the way two's complement arithmetic does
+def wrap (value, kind):
+    bits = 32 if kind == INT else 64
+    value &= (1 << bits) - 1
+    if value >= 1 << (bits - 1):
+        value -= 1 << bits
+    return value
+
+
+#Scanner reads numbers from the input the way scanf("%f") does: it skips whitespace (including newlines) & reads the longest
+#prefix of what follows that is a number, leaving the rest of the input for the next read
+#Note to self: this follows what glibc does with the odd cases: an exponent with no digits ("1e") is read but ignored, and whatever
+#looked like the start of a number ("-", "0x", "infin") is used up before the read fails
+number = re.compile (r"""
+    (?P<hex>[+-]?0[xX](?:[0-9a-fA-F]+\.?[0-9a-fA-F]*|\.[0-9a-fA-F]+)(?:[pP][+-]?\d+)?)(?:[pP][+-]?)?
+    | (?P<decimal>[+-]?(?!0[xX])(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)(?:[eE][+-]?)?
+    | (?P<special>[+-]?(?:infinity|inf(?!i)|nan))
+""", re.IGNORECASE | re.VERBOSE)
+partial = re.compile (r"[+-]?(?:0x\.?|\.|i(?:n(?:f(?:i(?:n(?:i(?:t)?)?)?)?)?)?|na?)?", re.IGNORECASE)
+word = re.compile (r"\S+")
+
+class Scanner:
+    def __init__(self, inputFile):
+        self.inputFile = inputFile
+        self.line = ""
+        self.pos = 0
+    
+    #moves past whitespace, reading more lines as needed. Returns False at the end of the input
+    def skipSpace (self):
+        while True:
+            while self.pos < len (self.line) and self.line [self.pos].isspace():
+                self.pos += 1
+            if self.pos < len (self.line):
+                return True
+            self.line = self.inputFile.readline()
+            self.pos = 0
+            if not self.line:
+                return False
+    
+    #Returns the number read, 0.0 if the input wasn't a number (whatever was there is skipped, like the generated scanf("%*s") does)
+    #or None at the end of the input, when scanf leaves the variable alone
+    def readFloat (self):
+        if not self.skipSpace():
+            return None
+        found = number.match (self.line, self.pos)
+        if found:
+            self.pos = found.end()
+            if found.group ("hex"):
+                return float.fromhex (found.group ("hex"))
+            return float (found.group ("decimal") or found.group ("special"))
+        self.pos = partial.match (self.line, self.pos).end()
+        if self.skipSpace(): #the generated scanf("%*s") skips the next word, even if that's on another line
+            self.pos = word.match (self.line, self.pos).end()
+        return 0.0
+
+
+#VM runs Bytecode
+class VM:
+    def __init__(self, bytecode):
+        self.bytecode = bytecode
+    
+    #Runs the program, reading INPUT from inputFile & writing PRINT output to outputFile. Returns the registers as they were at the end
+    #An integer division by zero (which crashes the C program) raises ZeroDivisionError, after what was printed before it is flushed
+    def run (self, inputFile = None, outputFile = None):
+        if inputFile is None:
+            inputFile = sys.stdin
+        if outputFile is None:
+            outputFile = sys.stdout
+        
+        #Note to self: the arrays are compact, but reading from an array makes a new Python object every time. Lists of tuples
+        #& floats that already exist are much quicker to run from
+        code = self.bytecode.code
+        instructions = [tuple (code [pc:pc + 4]) for pc in range (0, len (code), 4)]
+        R = list (self.bytecode.registers)
+        strings = self.bytecode.strings
+        write = outputFile.write
+        scanner = Scanner (inputFile)
+        single = array.array ('f', [0.0]) #storing into a float array rounds to a float, like C does (& gives inf if it's too big)
+        
+        pc = 0
+        while True:
+            opcode, a, b, c = instructions [pc]
+            pc += 1
+            #the most common instructions are tested first
+            if opcode == ADDF:
+                single [0] = R [b] + R [c]
+                R [a] = single [0]
+            elif opcode == SUBF:
+                single [0] = R [b] - R [c]
+                R [a] = single [0]
+            elif opcode == MULF:
+                single [0] = R [b] * R [c]
+                R [a] = single [0]
+            elif opcode == JUMPLT:
+                if R [a] < R [b]: pc = c
+            elif opcode == JUMPNOTLT:
+                if not R [a] < R [b]: pc = c
+            elif opcode == JUMPGT:
+                if R [a] > R [b]: pc = c
+            elif opcode == JUMPNOTGT:
+                if not R [a] > R [b]: pc = c
+            elif opcode == JUMPLE:
+                if R [a] <= R [b]: pc = c
+            elif opcode == JUMPNOTLE:
+                if not R [a] <= R [b]: pc = c
+            elif opcode == JUMPGE:
+                if R [a] >= R [b]: pc = c
+            elif opcode == JUMPNOTGE:
+                if not R [a] >= R [b]: pc = c
+            elif opcode == JUMPEQ:
+                if R [a] == R [b]: pc = c
+            elif opcode == JUMPNOTEQ:
+                if not R [a] == R [b]: pc = c
+            elif opcode == JUMPNE:
+                if R [a] != R [b]: pc = c
+            elif opcode == JUMPNOTNE:
+                if not R [a] != R [b]: pc = c
+            elif opcode == MOVE:
+                R [a] = R [b]
+            elif opcode == JUMP:
+                pc = a
+            elif opcode == PRINT:
+                single [0] = R [a]
+                value = single [0]
+                if value != value and math.copysign (1.0, value) < 0:
+                    write ("-nan\n") #Python leaves the sign off a nan, printf doesn't
+                else:
+                    write ("%.2f\n" % value)
+            elif opcode == DIVF:
+                try:
+                    single [0] = R [b] / R [c]
+                except ZeroDivisionError:
+                    single [0] = divide (R [b], R [c])
+                R [a] = single [0]
+            elif opcode == ADDD:
+                R [a] = R [b] + R [c]
+            elif opcode == SUBD:
+                R [a] = R [b] - R [c]
+            elif opcode == MULD:
+                R [a] = R [b] * R [c]
+            elif opcode == DIVD:
+                try:
+                    R [a] = R [b] / R [c]
+                except ZeroDivisionError:
+                    R [a] = divide (R [b], R [c])
+            elif opcode == TOFLOAT:
+                single [0] = R [b]
+                R [a] = single [0]
+            elif opcode == NEGATE:
+                R [a] = -R [b]
+            elif opcode == PRINTSTRING:
+                write (strings [a] + "\n")
+            elif opcode == INPUT:
+                value = scanner.readFloat()
+                if value is not None:
+                    single [0] = value
+                    R [a] = single [0]
+            elif opcode == JUMPIF:
+                if R [a] != 0: pc = b
+            elif opcode == JUMPIFNOT:
+                if R [a] == 0: pc = b
+            elif opcode == EQ:
+                R [a] = int (R [b] == R [c])
+            elif opcode == NE:
+                R [a] = int (R [b] != R [c])
+            elif opcode == LT:
+                R [a] = int (R [b] < R [c])
+            elif opcode == LE:
+                R [a] = int (R [b] <= R [c])
+            elif opcode == GT:
+                R [a] = int (R [b] > R [c])
+            elif opcode == GE:
+                R [a] = int (R [b] >= R [c])
+            elif opcode == HALT:
+                return R
+            elif opcode == TRAP:
+                outputFile.flush()
+                raise ZeroDivisionError ("Error! Integer division by zero")
+
+#Compiles a parsed program & runs it
+def runProgram (program, inputFile = None, outputFile = None):
+    return VM (BytecodeCompiler().program (program)).run (inputFile, outputFile)